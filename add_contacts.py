@@ -1,10 +1,15 @@
 """
 Script to add contacts to the AI Moses database
+
+Usage:
+    python add_contacts.py                      # the contacts listed below
+    python add_contacts.py phone.csv book.vcf   # bulk import CSV / vCard exports
 """
-from src.database import Database
+import argparse
+import time
 
-# Initialize database
-db = Database()
+from src.database import Database
+from src.contact_import import read_contacts, import_contacts
 
 # Define your contacts here
 # Format: (phone_number, name, relationship, tone, topics)
@@ -17,26 +22,49 @@ contacts = [
     # ("+1234567890", "Name", "relationship", "tone", "topics"),
 ]
 
-def add_all_contacts():
-    """Add all contacts to the database"""
+FIELDS = ("phone_number", "name", "relationship", "tone", "topics")
+
+
+def report(source, result, elapsed):
+    print(f"✅ {source}: imported {result['imported']} contacts in {elapsed:.2f}s")
+    if result['failed']:
+        print(f"❌ {result['failed']} rows skipped:")
+        for error in result['errors']:
+            print(f"   line {error['line']}: {error['error']}")
+
+
+def add_all_contacts(db):
+    """Add all contacts listed above to the database"""
     print("Adding contacts to database...\n")
-    
-    for phone, name, relationship, tone, topics in contacts:
-        success = db.add_caller_profile(
-            phone_number=phone,
-            name=name,
-            relationship=relationship,
-            tone=tone,
-            topics=topics
-        )
-        
-        if success:
-            print(f"✅ Added: {name} ({phone}) - {relationship}")
-        else:
-            print(f"❌ Failed to add: {name}")
-    
-    print(f"\n✨ Done! Added {len(contacts)} contacts.")
-    print("You can view them on the dashboard at http://localhost:5000")
+    records = ((i, dict(zip(FIELDS, contact))) for i, contact in enumerate(contacts, 1))
+    start = time.perf_counter()
+    report("contact list", import_contacts(db, records), time.perf_counter() - start)
+
+
+def import_files(db, paths, fmt=None):
+    """Stream each CSV / vCard file into the database"""
+    for path in paths:
+        start = time.perf_counter()
+        with open(path, encoding='utf-8-sig', errors='replace', newline='') as f:
+            result = import_contacts(db, read_contacts(f, fmt=fmt, filename=path))
+        report(path, result, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add contacts to the AI Moses database")
+    parser.add_argument('files', nargs='*', help="CSV or vCard (.vcf) address book exports")
+    parser.add_argument('--format', choices=['csv', 'vcard'], help="skip format detection")
+    parser.add_argument('--db', default="ai_moses.db", help="database path")
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    if args.files:
+        import_files(db, args.files, args.format)
+    else:
+        add_all_contacts(db)
+
+    print("\n✨ Done! You can view contacts on the dashboard at http://localhost:5000")
+
 
 if __name__ == "__main__":
-    add_all_contacts()
+    main()
@@ -0,0 +1,97 @@
+"""
+Measure answer latency and audio time-to-first-byte with the fake TTS backend
+
+Usage:
+    python -m benchmarks.bench_audio_ttfb [--calls 20] [--llm-delay 0.4]
+        [--tts-first-chunk 0.3] [--tts-chunk 0.05]
+
+Runs entirely offline: TTS_BACKEND=fake replaces ElevenLabs and the LLM is
+replaced by a fixed reply returned after --llm-delay seconds. Compares the
+old blocking path (LLM, then full TTS render to disk, then TwiML) with the
+streaming path (TwiML first, then GET /audio/<call_sid>).
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+REPLY = "Hey, it's Moses's assistant. He's heads-down coding right now, but I'll make sure he gets your message."
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def _report(name, values):
+    print(f"  {name:<28} p50 {statistics.median(values) * 1000:8.1f} ms"
+          f"   p95 {_percentile(values, 95) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure audio time-to-first-byte")
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--llm-delay", type=float, default=0.4)
+    parser.add_argument("--tts-first-chunk", type=float, default=0.3)
+    parser.add_argument("--tts-chunk", type=float, default=0.05)
+    args = parser.parse_args()
+
+    os.environ["TTS_BACKEND"] = "fake"
+    os.environ["FAKE_TTS_FIRST_CHUNK_DELAY"] = str(args.tts_first_chunk)
+    os.environ["FAKE_TTS_CHUNK_DELAY"] = str(args.tts_chunk)
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+    workdir = tempfile.mkdtemp(prefix="ai-moses-bench-")
+    os.chdir(workdir)
+    os.makedirs(os.path.join("src", "static", "audio"))
+
+    from src import main as app_module
+
+    def fake_llm(**kwargs):
+        time.sleep(args.llm_delay)
+        return REPLY
+
+    app_module.voice_agent.generate_response = fake_llm
+    client = app_module.app.test_client()
+
+    blocking_total = []
+    answer = []
+    first_byte = []
+    full_audio = []
+
+    for i in range(args.calls):
+        # Old path: everything has to finish before TwiML goes back
+        start = time.perf_counter()
+        text = fake_llm()
+        app_module.voice_agent.text_to_speech(text, os.path.join("src", "static", "audio", f"blocking_{i}.mp3"))
+        blocking_total.append(time.perf_counter() - start)
+
+        # Streaming path
+        call_sid = f"CABENCH{i:04d}"
+        start = time.perf_counter()
+        resp = client.post("/incoming-call", data={"From": "+15550000000", "CallSid": call_sid})
+        answer.append(time.perf_counter() - start)
+        assert resp.status_code == 200, resp.data
+
+        audio = client.get(f"/audio/{call_sid}", buffered=False)
+        chunks = iter(audio.response)
+        next(chunks)
+        first_byte.append(time.perf_counter() - start)
+        for _ in chunks:
+            pass
+        full_audio.append(time.perf_counter() - start)
+
+    print(f"{args.calls} calls, LLM {args.llm_delay * 1000:.0f} ms, "
+          f"TTS first chunk {args.tts_first_chunk * 1000:.0f} ms\n")
+    print("blocking (before)")
+    _report("TwiML returned", blocking_total)
+    print("streaming (after)")
+    _report("TwiML returned", answer)
+    _report("first audio byte", first_byte)
+    _report("last audio byte", full_audio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark call_history lookups before and after the index migration
+
+Usage:
+    python -m benchmarks.bench_call_lookups [--sizes 10000 100000 1000000]
+
+For each size a scratch database is filled at schema version 1 (no secondary
+indexes) and lookups are timed; the remaining migrations are then applied and
+the same lookups are timed again.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.database import Database
+
+CALLS_PER_PHONE = 20
+LOOKUPS = 200
+
+
+def _phone(i, rows):
+    return f"+1555{i % max(rows // CALLS_PER_PHONE, 1):07d}"
+
+
+def _fill(db, rows):
+    for start in range(0, rows, 10000):
+        batch = [
+            (_phone(i, rows), f"CA{i:032x}", "Incoming call", "Hello", "2026-01-01T00:00:00")
+            for i in range(start, min(start + 10000, rows))
+        ]
+        with db.transaction() as conn:
+            conn.executemany("""
+                INSERT INTO call_history (phone_number, call_sid, incoming_text, ai_response, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            """, batch)
+
+
+def _time_us(fn, calls):
+    start = time.perf_counter()
+    for args in calls:
+        fn(*args)
+    return (time.perf_counter() - start) / len(calls) * 1e6
+
+
+def _measure(db, rows):
+    rng = random.Random(rows)
+    phones = [(_phone(rng.randrange(rows), rows),) for _ in range(LOOKUPS)]
+    sids = [(f"CA{rng.randrange(rows):032x}", "summary", "/static/audio/x.mp3") for _ in range(LOOKUPS)]
+    return {
+        "get_call_history": _time_us(db.get_call_history, phones),
+        "update_call_summary": _time_us(db.update_call_summary, sids),
+    }
+
+
+def run(sizes):
+    results = []
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+
+            db = Database(path, schema_version=1)
+            _fill(db, rows)
+            before = _measure(db, rows)
+            db.close()
+
+            db = Database(path)
+            after = _measure(db, rows)
+            db.close()
+
+        for name in before:
+            results.append((rows, name, before[name], after[name]))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark call_history lookups")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'lookup':<20} {'no index (us)':>14} {'indexed (us)':>13} {'speedup':>8}")
+    for rows, name, before, after in run(args.sizes):
+        print(f"{rows:>10}  {name:<20} {before:>14.1f} {after:>13.1f} {before / after:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark caller resolution with many contacts and organization / number-range rules
+
+Usage:
+    python -m benchmarks.bench_caller_match [--contacts 100000] [--rules 300000]
+
+Fills a scratch database with contacts stored under assorted spellings and
+with prefix and range rules, then times:
+  load:     compiling every rule into the trie (first lookup in a process)
+  apply:    picking up 1000 changed rules incrementally
+  trie:     NumberRules.match() alone
+  exact / rule / unknown:  Database.get_caller_profile() with the profile
+            cache disabled, for a contact, a rule-covered number and a miss
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.database import Database
+from src.profile_cache import ProfileCache
+
+LOOKUPS = 20000
+SPELLINGS = ("+1{}", "1{}", "{}", "({}) {}-{}")
+
+
+def _spell(rng, digits):
+    style = rng.choice(SPELLINGS)
+    if style.count("{}") == 3:
+        return style.format(digits[:3], digits[3:6], digits[6:])
+    return style.format(digits)
+
+
+def _fill(db, contacts, rules, rng):
+    with db.transaction() as conn:
+        conn.executemany("""
+            INSERT OR IGNORE INTO contacts (phone_number, phone_e164, name, relationship, tone, topics)
+            VALUES (?, ?, ?, 'friend', 'warm', '')
+        """, [(_spell(rng, f"2{i:09d}"), f"+12{i:09d}", f"Contact {i}") for i in range(contacts)])
+
+    batch = []
+    for i in range(rules):
+        if i % 2:
+            # Company blocks of 100 numbers
+            low = f"+13{i:07d}00"
+            pattern = f"{low}-{low[:-2]}99"
+        else:
+            pattern = f"+4{i:07d}*"
+        batch.append((pattern, f"Org {i}", "work", "professional", ""))
+    db.upsert_contact_rules(batch)
+
+
+def _time_us(fn, args):
+    start = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def run(contacts, rules):
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        db = Database(path)
+        _fill(db, contacts, rules, rng)
+        db.profile_cache = ProfileCache(max_size=0)
+
+        start = time.perf_counter()
+        db.number_rules.refresh(force=True)
+        load = time.perf_counter() - start
+
+        changed = [(f"+4{i:07d}*", f"Renamed {i}", "work", "formal", "") for i in range(0, 2000, 2)]
+        db.upsert_contact_rules(changed)
+        start = time.perf_counter()
+        db.number_rules.refresh(force=True)
+        apply = time.perf_counter() - start
+
+        exact = [_spell(rng, f"2{rng.randrange(contacts):09d}") for _ in range(LOOKUPS)]
+        covered = [f"+13{rng.randrange(1, rules, 2):07d}{rng.randrange(100):02d}" if n % 2
+                   else f"+4{rng.randrange(0, rules, 2):07d}{rng.randrange(1000):03d}" for n in range(LOOKUPS)]
+        unknown = [f"+15{rng.randrange(10 ** 9):09d}" for _ in range(LOOKUPS)]
+
+        assert all(db.get_caller_profile(number).get("rule") for number in covered[:1000])
+        results = {
+            "trie": _time_us(db.number_rules.match, covered),
+            "exact": _time_us(db.get_caller_profile, exact),
+            "rule": _time_us(db.get_caller_profile, covered),
+            "unknown": _time_us(db.get_caller_profile, unknown),
+        }
+        stats = db.number_rules.stats()
+        db.close()
+    return load, apply, results, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark caller profile resolution")
+    parser.add_argument("--contacts", type=int, default=100000)
+    parser.add_argument("--rules", type=int, default=300000)
+    args = parser.parse_args()
+
+    load, apply, results, stats = run(args.contacts, args.rules)
+    print(f"{args.contacts} contacts, {stats['rules']} rules ({stats['prefixes']} trie prefixes)\n")
+    print(f"load all rules        {load * 1000:>9.1f} ms")
+    print(f"apply 1000 changes    {apply * 1000:>9.1f} ms")
+    for name, us in results.items():
+        print(f"{name:<21} {us:>9.1f} us/lookup")
+
+
+if __name__ == "__main__":
+    main()
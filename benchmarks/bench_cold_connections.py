@@ -0,0 +1,93 @@
+"""
+Benchmark first-audio latency of calls arriving after idle gaps, with and without keep-alive pings
+
+Usage:
+    python -m benchmarks.bench_cold_connections [--calls 5] [--gap 3] [--idle-timeout 2]
+        [--connect-delay 0.15] [--ping 1]
+
+Starts the OpenAI and ElevenLabs stubs from benchmarks/stubs.py with a
+per-connection setup delay (standing in for DNS, TCP and TLS) and an idle
+timeout shorter than the gap between calls, so every connection has gone
+cold by the next call. Compares:
+  cold:  the shared pool alone; each call reconnects to both providers
+  warm:  with http_pool.start_keepalive() pinging idle providers
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import elevenlabs_stub, openai_stub
+
+PROMPT = dict(caller_name="Sarah", caller_relationship="friend", caller_tone="friendly", status="At the gym")
+
+
+def _first_audio(agent):
+    start = time.perf_counter()
+    first = None
+    for _ in agent.stream_spoken_response(**PROMPT):
+        if first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+def _requests(metrics, connection):
+    text = metrics.render()
+    return sum(float(line.rsplit(' ', 1)[1]) for line in text.splitlines()
+               if line.startswith('ai_moses_http_requests_total{') and f'connection="{connection}"' in line)
+
+
+def _run(agent, metrics, calls, gap):
+    before = {c: _requests(metrics, c) for c in ('new', 'reused')}
+    latencies = []
+    for _ in range(calls):
+        time.sleep(gap)
+        latencies.append(_first_audio(agent))
+    counts = {c: _requests(metrics, c) - before[c] for c in ('new', 'reused')}
+    return latencies, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold vs kept-alive provider connections")
+    parser.add_argument("--calls", type=int, default=5)
+    parser.add_argument("--gap", type=float, default=3, help="idle seconds before each call")
+    parser.add_argument("--idle-timeout", type=float, default=2, help="stub closes idle connections after this")
+    parser.add_argument("--connect-delay", type=float, default=0.15, help="seconds to set up a connection")
+    parser.add_argument("--ping", type=float, default=1, help="keep-alive ping interval")
+    args = parser.parse_args()
+
+    stub = dict(first_delay=0.3, item_delay=0.02, connect_delay=args.connect_delay, idle_timeout=args.idle_timeout)
+    with openai_stub(**stub) as llm, elevenlabs_stub(**stub) as tts:
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-stub",
+            "OPENAI_BASE_URL": f"{llm.url}/v1",
+            "ELEVENLABS_API_KEY": "stub",
+            "ELEVENLABS_BASE_URL": tts.url,
+            "ELEVENLABS_VOICE_ID": "stub-voice",
+            "TTS_BACKEND": "elevenlabs",
+            # Fresh cache so every call pays for synthesis
+            "TTS_CACHE_DIR": tempfile.mkdtemp(prefix="ai-moses-bench-cache-"),
+            "TTS_CACHE_MAX_BYTES": "0",
+        })
+        from src.http_pool import http_pool
+        from src.metrics import metrics
+        from src.voice_agent import VoiceAgent
+        agent = VoiceAgent()
+
+        results = {"cold": _run(agent, metrics, args.calls, args.gap)}
+        http_pool.start_keepalive(interval=args.ping)
+        results["warm"] = _run(agent, metrics, args.calls, args.gap)
+        http_pool.stop_keepalive()
+
+    print(f"{args.calls} calls per mode, {args.gap:.1f}s apart; stubs close idle connections after "
+          f"{args.idle_timeout:.1f}s and take {args.connect_delay * 1000:.0f} ms to open one\n")
+    print(f"{'mode':<6} {'first audio p50 (ms)':>21} {'max (ms)':>9} {'new conns':>10} {'reused':>7}")
+    for mode, (latencies, counts) in results.items():
+        print(f"{mode:<6} {statistics.median(latencies) * 1000:>21.1f} {max(latencies) * 1000:>9.1f} "
+              f"{counts['new']:>10.0f} {counts['reused']:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
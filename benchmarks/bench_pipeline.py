@@ -0,0 +1,85 @@
+"""
+Benchmark sentence-level LLM -> TTS pipelining against local stub servers
+
+Usage:
+    python -m benchmarks.bench_pipeline [--runs 10] [--llm-first 0.4] [--llm-token 0.03]
+        [--tts-first 0.3] [--tts-chunk 0.02]
+
+Starts the OpenAI and ElevenLabs stubs from benchmarks/stubs.py, points a
+real VoiceAgent at them and compares:
+  sequential: generate_response(), then stream_speech() of the whole reply
+  pipelined:  stream_spoken_response(), TTS per sentence while the LLM streams
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import elevenlabs_stub, openai_stub
+
+PROMPT = dict(caller_name="Sarah", caller_relationship="friend", caller_tone="friendly", status="At the gym")
+
+
+def _timed(audio):
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in audio:
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+
+def _sequential(agent):
+    start = time.perf_counter()
+    text = agent.generate_response(**PROMPT)
+    first, total, size = _timed(agent.stream_speech(text))
+    llm = time.perf_counter() - start - total
+    return llm + first, llm + total, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM/TTS pipelining")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--llm-first", type=float, default=0.4, help="seconds to first token")
+    parser.add_argument("--llm-token", type=float, default=0.03, help="seconds per token")
+    parser.add_argument("--tts-first", type=float, default=0.3, help="seconds to first audio byte")
+    parser.add_argument("--tts-chunk", type=float, default=0.02, help="seconds per 4KB audio chunk")
+    args = parser.parse_args()
+
+    with openai_stub(first_delay=args.llm_first, item_delay=args.llm_token) as llm, \
+            elevenlabs_stub(first_delay=args.tts_first, item_delay=args.tts_chunk) as tts:
+        os.environ.update({
+            "OPENAI_API_KEY": "sk-stub",
+            "OPENAI_BASE_URL": f"{llm.url}/v1",
+            "ELEVENLABS_API_KEY": "stub",
+            "ELEVENLABS_BASE_URL": tts.url,
+            "ELEVENLABS_VOICE_ID": "stub-voice",
+            "TTS_BACKEND": "elevenlabs",
+            # Fresh cache so every run pays for synthesis
+            "TTS_CACHE_DIR": tempfile.mkdtemp(prefix="ai-moses-bench-cache-"),
+            "TTS_CACHE_MAX_BYTES": "0",
+        })
+        from src.voice_agent import VoiceAgent
+        agent = VoiceAgent()
+
+        results = {"sequential": [], "pipelined": []}
+        for _ in range(args.runs):
+            results["sequential"].append(_sequential(agent))
+            results["pipelined"].append(_timed(agent.stream_spoken_response(**PROMPT)))
+
+    print(f"{args.runs} runs, LLM {args.llm_first * 1000:.0f} ms + {args.llm_token * 1000:.0f} ms/token, "
+          f"TTS {args.tts_first * 1000:.0f} ms + {args.tts_chunk * 1000:.0f} ms/chunk\n")
+    print(f"{'mode':<12} {'first audio (ms)':>17} {'last audio (ms)':>16} {'bytes':>8}")
+    for mode, rows in results.items():
+        first = statistics.median(r[0] for r in rows) * 1000
+        total = statistics.median(r[1] for r in rows) * 1000
+        size = statistics.median(r[2] for r in rows)
+        print(f"{mode:<12} {first:>17.1f} {total:>16.1f} {size:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Fake Twilio Media Streams client for latency and concurrency tests
+
+Usage:
+    python -m benchmarks.fake_twilio_media [--calls 50] [--turns 3] [--wav caller.wav]
+        [--url ws://127.0.0.1:5001/media-stream] [--barge-in]
+
+Each simulated call connects to the media stream server, sends the
+connected/start events Twilio sends, then streams 20 ms μ-law frames in
+real time: silence, with the recorded utterance (an 8 kHz mono 16-bit WAV,
+or a synthetic voiced burst) played once per turn. Marks are echoed back
+after the received audio would have finished playing, like Twilio does.
+
+Reported per turn: time from the end of the caller's speech to the first
+reply audio frame (includes end-of-turn silence detection). With --barge-in
+the caller talks over each reply and the time until the server's `clear`
+is reported as well.
+
+Without --url an in-process server is started with offline backends
+(stub OpenAI server, STT_BACKEND=fake, TTS_BACKEND=fake).
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+import wave
+
+import numpy as np
+
+FRAME_SECONDS = 0.02
+FRAME_BYTES = 160
+SILENCE = b'\xff' * FRAME_BYTES
+
+
+def load_utterance(path):
+    from src.media_stream import ulaw_encode
+
+    if path:
+        with wave.open(path, 'rb') as wav:
+            if wav.getframerate() != 8000 or wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                raise SystemExit("--wav must be 8 kHz mono 16-bit PCM")
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+    else:
+        t = np.arange(int(8000 * 1.2)) / 8000
+        samples = (4000 * np.sin(2 * np.pi * 220 * t) + 2000 * np.sin(2 * np.pi * 610 * t)).astype(np.int16)
+    data = ulaw_encode(samples)
+    data += SILENCE[:(-len(data)) % FRAME_BYTES]
+    return [data[i:i + FRAME_BYTES] for i in range(0, len(data), FRAME_BYTES)]
+
+
+class FakeCall:
+    def __init__(self, url, utterance, turns, barge_in):
+        self.url = url
+        self.utterance = utterance
+        self.turns = turns
+        self.barge_in = barge_in
+        self.call_sid = f"CA{uuid.uuid4().hex}"
+        self.stream_sid = f"MZ{uuid.uuid4().hex}"
+        self.turn_latencies = []
+        self.barge_in_latencies = []
+        self.error = None
+        self._speaking = []
+        self._playback_until = 0.0
+        self._reply_audio = asyncio.Event()
+        self._reply_done = asyncio.Event()
+        self._cleared = asyncio.Event()
+
+    async def run(self):
+        from websockets.asyncio.client import connect
+
+        try:
+            async with connect(self.url, max_size=2 ** 20) as ws:
+                self.ws = ws
+                await ws.send(json.dumps({'event': 'connected', 'protocol': 'Call', 'version': '1.0.0'}))
+                await ws.send(json.dumps({'event': 'start', 'sequenceNumber': '1', 'start': {
+                    'streamSid': self.stream_sid, 'callSid': self.call_sid, 'tracks': ['inbound'],
+                    'customParameters': {'From': '+15550000000'},
+                    'mediaFormat': {'encoding': 'audio/x-mulaw', 'sampleRate': 8000, 'channels': 1},
+                }, 'streamSid': self.stream_sid}))
+
+                receiver = asyncio.create_task(self._receive())
+                sender = asyncio.create_task(self._send_frames())
+                try:
+                    await asyncio.wait_for(self._reply_done.wait(), 30)  # greeting
+                    for _ in range(self.turns):
+                        await self._turn()
+                finally:
+                    sender.cancel()
+                    receiver.cancel()
+                await ws.send(json.dumps({'event': 'stop', 'streamSid': self.stream_sid}))
+        except Exception as e:
+            self.error = e
+
+    async def _turn(self):
+        self._reply_audio.clear()
+        self._reply_done.clear()
+        self._cleared.clear()
+        self._speaking.extend(self.utterance)
+        while self._speaking:
+            await asyncio.sleep(FRAME_SECONDS)
+        speech_ended = time.perf_counter()
+
+        await asyncio.wait_for(self._reply_audio.wait(), 30)
+        self.turn_latencies.append(time.perf_counter() - speech_ended)
+
+        if self.barge_in:
+            await asyncio.sleep(0.2)
+            started = time.perf_counter()
+            self._speaking.extend(self.utterance[:10])
+            await asyncio.wait_for(self._cleared.wait(), 10)
+            self.barge_in_latencies.append(time.perf_counter() - started)
+            # The barge-in utterance becomes a turn of its own; let it be answered
+            self._reply_done.clear()
+            self._reply_audio.clear()
+        await asyncio.wait_for(self._reply_done.wait(), 60)
+
+    async def _send_frames(self):
+        seq = 1
+        next_at = time.perf_counter()
+        while True:
+            frame = self._speaking.pop(0) if self._speaking else SILENCE
+            seq += 1
+            await self.ws.send(json.dumps({'event': 'media', 'sequenceNumber': str(seq), 'streamSid': self.stream_sid,
+                                           'media': {'track': 'inbound', 'chunk': str(seq),
+                                                     'payload': base64.b64encode(frame).decode('ascii')}}))
+            next_at += FRAME_SECONDS
+            await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+
+    async def _receive(self):
+        async for message in self.ws:
+            data = json.loads(message)
+            event = data.get('event')
+            now = time.perf_counter()
+            if event == 'media':
+                audio_seconds = len(base64.b64decode(data['media']['payload'])) / 8000
+                self._playback_until = max(self._playback_until, now) + audio_seconds
+                self._reply_audio.set()
+            elif event == 'clear':
+                self._playback_until = now
+                self._cleared.set()
+            elif event == 'mark':
+                asyncio.create_task(self._echo_mark(data['mark']['name']))
+
+    async def _echo_mark(self, name):
+        await asyncio.sleep(max(0.0, self._playback_until - time.perf_counter()))
+        await self.ws.send(json.dumps({'event': 'mark', 'streamSid': self.stream_sid, 'mark': {'name': name}}))
+        self._reply_done.set()
+
+
+def start_local_server():
+    """Run a MediaStreamServer with offline backends on a background event loop"""
+    from benchmarks.stubs import openai_stub
+
+    llm = openai_stub(first_delay=0.3, item_delay=0.02).__enter__()
+    os.environ.update({
+        'OPENAI_API_KEY': 'sk-stub',
+        'OPENAI_BASE_URL': f"{llm.url}/v1",
+        'STT_BACKEND': 'fake',
+        'TTS_BACKEND': 'fake',
+        'TTS_CACHE_DIR': tempfile.mkdtemp(prefix='ai-moses-bench-cache-'),
+    })
+    os.chdir(tempfile.mkdtemp(prefix='ai-moses-bench-'))
+
+    from src.media_stream import MediaStreamServer
+
+    server = MediaStreamServer()
+    ready = threading.Event()
+    port = []
+
+    def on_ready(ws_server):
+        port.append(next(iter(ws_server.sockets)).getsockname()[1])
+        ready.set()
+
+    threading.Thread(
+        target=lambda: asyncio.run(server.serve('127.0.0.1', 0, ready=on_ready)), daemon=True
+    ).start()
+    ready.wait(10)
+    return f"ws://127.0.0.1:{port[0]}/media-stream", server
+
+
+def _summary(name, values):
+    if not values:
+        return f"  {name:<24} n/a"
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(round(0.95 * (len(values) - 1))))]
+    return (f"  {name:<24} n={len(values):<5} p50 {statistics.median(values) * 1000:7.0f} ms"
+            f"   p95 {p95 * 1000:7.0f} ms   max {values[-1] * 1000:7.0f} ms")
+
+
+async def run_calls(url, calls, turns, utterance, barge_in, stagger):
+    fake_calls = [FakeCall(url, utterance, turns, barge_in) for _ in range(calls)]
+
+    async def delayed(i, call):
+        await asyncio.sleep(i * stagger)
+        await call.run()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(delayed(i, call) for i, call in enumerate(fake_calls)))
+    return fake_calls, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Twilio Media Streams load client")
+    parser.add_argument('--url', help="media stream server URL (default: start one locally)")
+    parser.add_argument('--calls', type=int, default=20, help="concurrent calls")
+    parser.add_argument('--turns', type=int, default=2, help="caller turns per call")
+    parser.add_argument('--wav', help="8 kHz mono 16-bit WAV to replay as the caller")
+    parser.add_argument('--barge-in', action='store_true', help="talk over each reply")
+    parser.add_argument('--stagger', type=float, default=0.05, help="seconds between call starts")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if not url:
+        url, server = start_local_server()
+
+    utterance = load_utterance(args.wav)
+    calls, elapsed = asyncio.run(run_calls(url, args.calls, args.turns, utterance, args.barge_in, args.stagger))
+
+    errors = [c.error for c in calls if c.error]
+    print(f"{args.calls} concurrent calls x {args.turns} turns in {elapsed:.1f}s, {len(errors)} failed")
+    print(_summary("end of speech -> reply", [v for c in calls for v in c.turn_latencies]))
+    if args.barge_in:
+        print(_summary("barge-in -> clear", [v for c in calls for v in c.barge_in_latencies]))
+    if server is not None:
+        print(f"  server barge-ins: {server.barge_ins}")
+    for error in errors[:5]:
+        print(f"  error: {error!r}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,357 @@
+"""
+Webhook load test against the Flask app with offline OpenAI / ElevenLabs stand-ins
+
+Usage:
+    python -m benchmarks.load_webhooks [--concurrency 20] [--duration 30]
+        [--mix call=7,sms=2,status_retry=1] [--llm-first 0.4] [--llm-token 0.02]
+        [--tts-first 0.3] [--tts-chunk 0.02] [--jitter 0.2] [--error-rate 0.01]
+        [--out results.json] [--baseline previous.json] [--url http://host:5000]
+
+Without --url the app is started in-process on a threaded WSGI server, with
+the stub servers from benchmarks/stubs.py standing in for the OpenAI chat
+API and ElevenLabs TTS, in a scratch directory (fresh database and audio).
+
+Each worker replays Twilio traffic until --duration runs out:
+  call:          POST /incoming-call, GET the <Play> audio like Twilio does,
+                 then POST /call-status completed
+  sms:           POST /incoming-sms
+  status_retry:  POST /call-status again for a finished call (Twilio retries)
+
+Reported: throughput, client-side latency per webhook (p50/p95/p99), and
+server-side latency per stage and per dependency from the app's /metrics
+histograms (difference between the start and end of the run). Results are
+written as JSON; --baseline prints p95 changes against an earlier file.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+
+import requests
+
+from benchmarks.stubs import elevenlabs_stub, openai_stub
+
+DEFAULT_MIX = 'call=7,sms=2,status_retry=1'
+_BUCKET_LINE = re.compile(r'^ai_moses_(\w+)_bucket\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def summarize(values, errors=0):
+    return {
+        'count': len(values),
+        'errors': errors,
+        'mean_ms': round(sum(values) / len(values) * 1000, 2) if values else None,
+        'p50_ms': _ms(percentile(values, 0.50)),
+        'p95_ms': _ms(percentile(values, 0.95)),
+        'p99_ms': _ms(percentile(values, 0.99)),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+# -- server-side histograms -------------------------------------------------
+
+def scrape(base_url):
+    """/metrics -> {(metric, key): {le: cumulative count}}, keyed by stage or dependency.operation"""
+    text = requests.get(f"{base_url}/metrics", timeout=10).text
+    buckets = defaultdict(dict)
+    for line in text.splitlines():
+        match = _BUCKET_LINE.match(line)
+        if not match:
+            continue
+        metric, labels, value = match.groups()
+        labels = dict(_LABEL.findall(labels))
+        if metric == 'stage_seconds':
+            key = labels['stage']
+        elif metric == 'dependency_seconds':
+            key = f"{labels['dependency']}.{labels['operation']}"
+        else:
+            continue
+        le = float('inf') if labels['le'] == '+Inf' else float(labels['le'])
+        # Sum across routes / outcomes
+        counts = buckets[(metric, key)]
+        counts[le] = counts.get(le, 0) + float(value)
+    return buckets
+
+
+def histogram_quantile(q, counts):
+    """Prometheus-style quantile estimate from cumulative bucket counts"""
+    bounds = sorted(counts)
+    total = counts[bounds[-1]] if bounds else 0
+    if total <= 0:
+        return None
+    rank = q * total
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in bounds:
+        count = counts[bound]
+        if count >= rank:
+            if bound == float('inf'):
+                return previous_bound
+            span = count - previous_count
+            fraction = (rank - previous_count) / span if span else 0
+            return previous_bound + (bound - previous_bound) * fraction
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def server_breakdown(before, after):
+    result = {'stages': {}, 'dependencies': {}}
+    for (metric, key), counts in sorted(after.items()):
+        base = before.get((metric, key), {})
+        delta = {le: count - base.get(le, 0) for le, count in counts.items()}
+        total = delta.get(float('inf'), 0)
+        if total <= 0:
+            continue
+        section = 'stages' if metric == 'stage_seconds' else 'dependencies'
+        result[section][key] = {
+            'count': int(total),
+            'p50_ms': _ms(histogram_quantile(0.50, delta)),
+            'p95_ms': _ms(histogram_quantile(0.95, delta)),
+            'p99_ms': _ms(histogram_quantile(0.99, delta)),
+        }
+    return result
+
+
+# -- traffic ---------------------------------------------------------------
+
+class Worker(threading.Thread):
+    def __init__(self, base_url, mix, callers, deadline, seed, recorder):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.scenarios, self.weights = zip(*mix.items())
+        self.callers = callers
+        self.deadline = deadline
+        self.random = random.Random(seed)
+        self.recorder = recorder
+        self.session = requests.Session()
+        self.finished_calls = []
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            scenario = self.random.choices(self.scenarios, self.weights)[0]
+            if scenario == 'status_retry' and not self.finished_calls:
+                scenario = 'call'
+            getattr(self, f"_{scenario}")()
+
+    def _post(self, name, path, form):
+        start = time.perf_counter()
+        try:
+            response = self.session.post(f"{self.base_url}{path}", data=form, timeout=60)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(name, time.perf_counter() - start, ok)
+        return response if ok else None
+
+    def _call(self):
+        call_sid = f"CA{uuid.uuid4().hex}"
+        caller = self.random.choice(self.callers)
+        response = self._post('incoming_call', '/incoming-call', {'From': caller, 'CallSid': call_sid})
+        if response is None:
+            return
+
+        # Fetch the clip the TwiML points at, as Twilio's media fetch would
+        match = re.search(r'<Play>([^<]+)</Play>', response.text)
+        if match:
+            url = match.group(1).replace('&amp;', '&')
+            start = time.perf_counter()
+            first = None
+            try:
+                with self.session.get(url, stream=True, timeout=60) as audio:
+                    ok = audio.status_code == 200
+                    for _ in audio.iter_content(4096):
+                        if first is None:
+                            first = time.perf_counter() - start
+            except requests.RequestException:
+                ok = False
+            if first is not None:
+                self.recorder.record('audio_first_byte', first, ok)
+            self.recorder.record('audio_complete', time.perf_counter() - start, ok)
+
+        if self._post('call_status', '/call-status', {'CallSid': call_sid, 'CallStatus': 'completed'}):
+            self.finished_calls.append(call_sid)
+
+    def _sms(self):
+        self._post('incoming_sms', '/incoming-sms', {
+            'From': self.random.choice(self.callers),
+            'MessageSid': f"SM{uuid.uuid4().hex}",
+            'Body': "Hey, are you free later?",
+        })
+
+    def _status_retry(self):
+        call_sid = self.random.choice(self.finished_calls)
+        self._post('call_status_retry', '/call-status', {'CallSid': call_sid, 'CallStatus': 'completed'})
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, seconds, ok):
+        with self._lock:
+            if ok:
+                self.latencies[name].append(seconds)
+            else:
+                self.errors[name] += 1
+
+
+# -- harness ---------------------------------------------------------------
+
+def start_local_app(args):
+    """Start the stubs and the Flask app in-process; returns (base_url, stubs)"""
+    stub_options = dict(jitter=args.jitter, error_rate=args.error_rate, seed=args.seed)
+    llm = openai_stub(first_delay=args.llm_first, item_delay=args.llm_token, **stub_options).__enter__()
+    tts = elevenlabs_stub(first_delay=args.tts_first, item_delay=args.tts_chunk, **stub_options).__enter__()
+    os.environ.update({
+        'OPENAI_API_KEY': 'sk-stub',
+        'OPENAI_BASE_URL': f"{llm.url}/v1",
+        'ELEVENLABS_API_KEY': 'stub',
+        'ELEVENLABS_BASE_URL': tts.url,
+        'ELEVENLABS_VOICE_ID': 'stub-voice',
+        'TTS_BACKEND': 'elevenlabs',
+        'TTS_CACHE_DIR': tempfile.mkdtemp(prefix='ai-moses-load-cache-'),
+    })
+    os.chdir(tempfile.mkdtemp(prefix='ai-moses-load-'))
+    os.makedirs(os.path.join('src', 'static', 'audio'), exist_ok=True)
+
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from src.main import create_app
+    app = create_app()
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", (llm, tts)
+
+
+def seed_contacts(base_url, callers, known_fraction, seed):
+    """Register a share of the caller pool as contacts, the rest stay unknown"""
+    rng = random.Random(seed)
+    known = [c for c in callers if rng.random() < known_fraction]
+    rows = ['phone_number,name,relationship,tone,topics']
+    rows += [f"{c},Caller {i},friend,friendly,work" for i, c in enumerate(known)]
+    requests.post(f"{base_url}/contacts/bulk", data='\n'.join(rows).encode(),
+                  headers={'Content-Type': 'text/csv'}, timeout=60)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in ('call', 'sms', 'status_retry'):
+            raise SystemExit(f"unknown scenario in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def print_report(results, baseline=None):
+    print(f"\n{results['requests']} requests in {results['duration_s']:.1f}s "
+          f"({results['throughput_rps']:.1f} req/s) at concurrency {results['config']['concurrency']}, "
+          f"{results['errors']} errors")
+
+    def table(title, rows, base_rows):
+        if not rows:
+            return
+        print(f"\n{title:<28} {'n':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}" + ("  p95 vs base" if base_rows else ''))
+        for name, row in rows.items():
+            line = f"  {name:<26} {row['count']:>7} " + ' '.join(
+                f"{row[k]:>9.1f}" if row[k] is not None else f"{'-':>9}" for k in ('p50_ms', 'p95_ms', 'p99_ms'))
+            base = (base_rows or {}).get(name)
+            if base and base.get('p95_ms') and row['p95_ms'] is not None:
+                line += f"  {(row['p95_ms'] / base['p95_ms'] - 1) * 100:+7.1f}%"
+            print(line)
+
+    base = baseline or {}
+    table("webhook (client side)", results['client'], base.get('client'))
+    table("stage (server side)", results['server']['stages'], base.get('server', {}).get('stages'))
+    table("dependency (server side)", results['server']['dependencies'], base.get('server', {}).get('dependencies'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay Twilio webhooks against the app and report latency")
+    parser.add_argument('--url', help="running app to test (default: start one locally with stubs)")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--duration', type=float, default=30, help="seconds of traffic")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="scenario weights, e.g. call=7,sms=2,status_retry=1")
+    parser.add_argument('--callers', type=int, default=200, help="distinct caller numbers")
+    parser.add_argument('--known', type=float, default=0.6, help="share of callers registered as contacts")
+    parser.add_argument('--llm-first', type=float, default=0.4, help="stub LLM seconds to first token")
+    parser.add_argument('--llm-token', type=float, default=0.02, help="stub LLM seconds per token")
+    parser.add_argument('--tts-first', type=float, default=0.3, help="stub TTS seconds to first chunk")
+    parser.add_argument('--tts-chunk', type=float, default=0.02, help="stub TTS seconds per 4KB chunk")
+    parser.add_argument('--jitter', type=float, default=0.2, help="+/- fraction applied to stub delays")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of stub requests failing with 500")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help="results JSON path (default: webhook-load-<time>.json)")
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    # Resolve paths before a local run moves into its scratch directory
+    out = os.path.abspath(args.out or f"webhook-load-{datetime.now():%Y%m%d-%H%M%S}.json")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    mix = parse_mix(args.mix)
+    base_url = args.url.rstrip('/') if args.url else start_local_app(args)[0]
+    callers = [f"+1555{i:07d}" for i in range(args.callers)]
+    seed_contacts(base_url, callers, args.known, args.seed)
+
+    before = scrape(base_url)
+    recorder = Recorder()
+    deadline = time.monotonic() + args.duration
+    started = time.perf_counter()
+    workers = [Worker(base_url, mix, callers, deadline, args.seed * 1000 + i, recorder)
+               for i in range(args.concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    after = scrape(base_url)
+
+    webhooks = ('incoming_call', 'incoming_sms', 'call_status', 'call_status_retry')
+    requests_made = sum(len(recorder.latencies[n]) + recorder.errors[n] for n in webhooks)
+    results = {
+        'started_at': datetime.now().isoformat(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('out', 'baseline')},
+        'duration_s': round(elapsed, 3),
+        'requests': requests_made,
+        'errors': sum(recorder.errors.values()),
+        'throughput_rps': round(requests_made / elapsed, 2),
+        'client': {name: summarize(recorder.latencies[name], recorder.errors[name])
+                   for name in sorted(set(recorder.latencies) | set(recorder.errors))},
+        'server': server_breakdown(before, after),
+    }
+
+    print_report(results, baseline)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""
+Smoke check that the Flask app and the ASGI app answer calls the same way
+
+Usage:
+    python -m benchmarks.smoke_entrypoints
+
+The webhooks exist twice, in src/main.py and src/asgi.py, sharing the
+services built in src/main.py. This drives both through the same Twilio
+requests, with the stub servers from benchmarks/stubs.py standing in for
+OpenAI and ElevenLabs, in a scratch directory, and fails if either one
+answers with the static fallback message or if their TwiML differs:
+  greeting:  a contact with a pre-rendered greeting (GreetingPool.lookup)
+  degraded:  a contact whose greeting is out of date while the OpenAI
+             circuit is open (GreetingPool.fallback)
+  sms:       POST /incoming-sms
+  conversation:  a <Gather> call started on one entry point and continued
+             and ended on the other, as when a call's webhooks land on
+             different workers; its transcript must reach call_history
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+from benchmarks.stubs import elevenlabs_stub, openai_stub
+
+GREETING = "Hi Ann, Moses is driving and will call you back."
+STALE_GREETING = "Hi Bob, Moses is driving and will call you back."
+
+
+def _seed(main):
+    """Two contacts with stored greetings for the current status, Bob's rendered from old details"""
+    # Nothing may re-render the seeded greetings while the checks run
+    main.greeting_pool.stop()
+    activity = main.status_manager.get_current_status()['activity']
+    main.db.add_caller_profile('+15550000001', 'Ann', 'friend', 'warm', '')
+    main.db.add_caller_profile('+15550000002', 'Bob', 'friend', 'warm', '')
+    main.db.save_greeting('+15550000001', ('Ann', 'friend', 'warm', activity), GREETING, None)
+    main.db.save_greeting('+15550000002', ('Robert', 'friend', 'warm', activity), STALE_GREETING, None)
+    main.greeting_pool.load(force=True)
+
+
+def _requests():
+    call = {'CallSid': 'CAsmoke', 'From': '+15550000001', 'To': '+15551110000', 'CallStatus': 'ringing'}
+    return [
+        ('greeting', '/incoming-call', call, GREETING),
+        ('degraded', '/incoming-call', dict(call, CallSid='CAsmoke2', From='+15550000002'), STALE_GREETING),
+        ('sms', '/incoming-sms', {'From': '+15550000001', 'Body': 'hello', 'MessageSid': 'SMsmoke'}, None),
+    ]
+
+
+def _flask_post(client, path, form):
+    response = client.post(path, data=form)
+    return response.status_code, response.get_data(as_text=True)
+
+
+async def _asgi_posts(app, requests):
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://localhost') as client:
+        results = []
+        for _, path, form, _ in requests:
+            response = await client.post(path, data=form)
+            results.append((response.status_code, response.text))
+        return results
+
+
+async def _asgi_post(app, path, form):
+    import httpx
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://localhost') as client:
+        response = await client.post(path, data=form)
+        return response.status_code, response.text
+
+
+def _conversation(main, asgi, flask_client):
+    """Start on Flask, take a turn on ASGI, end on Flask; returns failures"""
+    call = {'CallSid': 'CAsmokeconv', 'From': '+15550000001'}
+    flask_client.post('/incoming-call/conversation', data=call)
+    asyncio.run(_asgi_post(asgi.app, '/conversation/turn', dict(call, SpeechResult='Is Moses around?')))
+    flask_client.post('/call-status', data=dict(call, CallStatus='completed'))
+    row = main.db.get_call('CAsmokeconv')
+    transcript = (row or {}).get('ai_response') or ''
+    ok = 'Caller: Is Moses around?' in transcript and transcript.count('AI: ') == 2
+    print(f"{'conversation':<10} both   {'ok' if ok else 'FAIL'}")
+    return [] if ok else [f"conversation: transcript {transcript!r}"]
+
+
+def run():
+    from src import asgi, main
+    from src.voice_agent import FALLBACK_RESPONSE
+
+    _seed(main)
+    requests = _requests()
+    flask_client = main.app.test_client()
+    failures = []
+    for degraded in (False, True):
+        breaker = main.voice_agent.llm_guard.breaker
+        if degraded:
+            for _ in range(breaker.failure_threshold):
+                breaker.failure()
+        cases = [case for case in requests if (case[0] == 'degraded') == degraded]
+        flask_results = [_flask_post(flask_client, path, form) for _, path, form, _ in cases]
+        asgi_results = asyncio.run(_asgi_posts(asgi.app, cases))
+        for (name, _, _, expected), flask_result, asgi_result in zip(cases, flask_results, asgi_results):
+            for entry_point, (status, body) in (('flask', flask_result), ('asgi', asgi_result)):
+                ok = status == 200 and FALLBACK_RESPONSE not in body and (expected is None or expected in body)
+                print(f"{name:<10} {entry_point:<6} {status}  {'ok' if ok else 'FAIL'}")
+                if not ok:
+                    failures.append(f"{name} via {entry_point}: {status} {body[:200]!r}")
+            if name != 'sms' and flask_result != asgi_result:
+                failures.append(f"{name}: Flask and ASGI TwiML differ")
+    main.voice_agent.llm_guard.breaker.success()
+    return failures + _conversation(main, asgi, flask_client)
+
+
+def main():
+    with openai_stub(first_delay=0.01, item_delay=0) as llm, elevenlabs_stub(first_delay=0.01, item_delay=0) as tts:
+        os.environ.update({
+            'OPENAI_API_KEY': 'sk-stub',
+            'OPENAI_BASE_URL': f"{llm.url}/v1",
+            'ELEVENLABS_API_KEY': 'stub',
+            'ELEVENLABS_BASE_URL': tts.url,
+            'ELEVENLABS_VOICE_ID': 'stub-voice',
+            'TTS_BACKEND': 'elevenlabs',
+            'TTS_CACHE_DIR': tempfile.mkdtemp(prefix='ai-moses-smoke-cache-'),
+        })
+        os.chdir(tempfile.mkdtemp(prefix='ai-moses-smoke-'))
+        os.makedirs(os.path.join('src', 'static', 'audio'), exist_ok=True)
+        failures = run()
+
+    for failure in failures:
+        print(failure)
+    print('FAILED' if failures else 'OK')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
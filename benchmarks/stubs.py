@@ -0,0 +1,217 @@
+"""
+Local stand-ins for the OpenAI chat API and ElevenLabs TTS
+
+Both servers speak just enough of the real wire protocol for the official
+SDKs to work against them (point OPENAI_BASE_URL / ELEVENLABS_BASE_URL at
+the server URL). Latency, jitter and error rate are configurable so
+benchmarks can reproduce slow or flaky providers offline.
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPLY = (
+    "Hey, you've reached Moses's assistant. He's in the middle of something right now. "
+    "I'll let him know you called and he'll get back to you soon. "
+    "Is there anything you'd like me to pass along?"
+)
+
+
+class StubConfig:
+    """
+    first_delay: seconds before the first token / audio byte
+    item_delay: seconds between subsequent tokens / audio chunks
+    jitter: +/- fraction applied to every delay (0.2 = +/-20%)
+    error_rate: probability a request fails with HTTP 500
+    connect_delay: seconds added to the first request on a new connection
+        (stands in for DNS, TCP and TLS setup)
+    idle_timeout: seconds after which an idle keep-alive connection is closed
+    """
+
+    def __init__(self, first_delay=0.3, item_delay=0.02, jitter=0.0, error_rate=0.0, seed=None,
+                 connect_delay=0.0, idle_timeout=None):
+        self.first_delay = first_delay
+        self.item_delay = item_delay
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.connect_delay = connect_delay
+        self.idle_timeout = idle_timeout
+        self.connections = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def sleep(self, seconds):
+        if seconds <= 0:
+            return
+        with self._lock:
+            factor = 1 + self._random.uniform(-self.jitter, self.jitter)
+        time.sleep(seconds * factor)
+
+    def should_fail(self):
+        with self._lock:
+            self.requests += 1
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+            return failed
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = None
+
+    def setup(self):
+        super().setup()
+        with self.config._lock:
+            self.config.connections += 1
+        self.config.sleep(self.config.connect_delay)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        # Keep-alive pings
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def _error(self):
+        payload = json.dumps({'error': {'message': 'stub failure', 'type': 'server_error'}}).encode()
+        self.send_response(500)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class OpenAIStubHandler(_Handler):
+    """POST /v1/chat/completions, streaming (SSE) and non-streaming"""
+
+    def do_POST(self):
+        body = self._body()
+        if self.config.should_fail():
+            return self._error()
+
+        tokens = [t + ' ' for t in STUB_REPLY.split(' ')]
+        created = int(time.time())
+        model = body.get('model', 'stub')
+
+        if not body.get('stream'):
+            self.config.sleep(self.config.first_delay + self.config.item_delay * (len(tokens) - 1))
+            payload = json.dumps({
+                'id': 'chatcmpl-stub', 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': STUB_REPLY}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(tokens), 'total_tokens': len(tokens)},
+            }).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self._start_chunked('text/event-stream')
+        self.config.sleep(self.config.first_delay)
+        for i, token in enumerate(tokens):
+            if i:
+                self.config.sleep(self.config.item_delay)
+            event = {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'delta': {'content': token}, 'finish_reason': None}],
+            }
+            self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        done = {
+            'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+            'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}],
+        }
+        self._write_chunk(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        self._end_chunked()
+
+
+class ElevenLabsStubHandler(_Handler):
+    """POST /v1/text-to-speech/<voice_id>[/stream]: fake mp3 bytes, ~200 per character"""
+
+    chunk_bytes = 4096
+
+    def do_POST(self):
+        body = self._body()
+        if self.config.should_fail():
+            return self._error()
+
+        total = max(len(body.get('text', '')) * 200, self.chunk_bytes)
+        self._start_chunked('audio/mpeg')
+        self.config.sleep(self.config.first_delay)
+        sent = 0
+        while sent < total:
+            if sent:
+                self.config.sleep(self.config.item_delay)
+            size = min(self.chunk_bytes, total - sent)
+            self._write_chunk((b'\xff\xfb\x90\x64' + bytes(size))[:size])
+            sent += size
+        self._end_chunked()
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Hundreds of concurrent calls connect at once; the default backlog of 5 refuses them
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-stream (cancelled replies) are expected
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """Run a stub handler on 127.0.0.1 in a background thread"""
+
+    def __init__(self, handler, config=None, port=0):
+        self.config = config or StubConfig()
+        handler_class = type(handler.__name__, (handler,), {'config': self.config, 'timeout': self.config.idle_timeout})
+        self.httpd = _QuietServer(('127.0.0.1', port), handler_class)
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def openai_stub(**config):
+    return StubServer(OpenAIStubHandler, StubConfig(**config))
+
+
+def elevenlabs_stub(**config):
+    return StubServer(ElevenLabsStubHandler, StubConfig(**config))
@@ -0,0 +1,26 @@
+"""
+Gunicorn Configuration
+Production server settings, read automatically when gunicorn is started from the project root:
+    gunicorn
+"""
+
+import os
+
+wsgi_app = 'src.main:create_app(start=False)'
+bind = os.getenv('BIND', '0.0.0.0:5000')
+# Conversation sessions and the greeting pool live in the database, so a
+# call's webhooks may land on any worker
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+# Twilio gives up on a webhook after 15s
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+# Import the app and migrate the schema once, in the master; workers are
+# forked from it fully imported and only start their own background work
+preload_app = os.getenv('GUNICORN_PRELOAD', '1') == '1'
+
+
+def post_worker_init(worker):
+    from src import main
+    main.init_worker()
@@ -0,0 +1,377 @@
+"""
+ASGI Module
+Async serving mode: Twilio voice/SMS webhooks on an event loop, every other route on the Flask app
+
+Run instead of the Flask / gunicorn server:
+    uvicorn src.asgi:app --host 0.0.0.0 --port 5000 --proxy-headers
+
+/incoming-call, /incoming-call/conversation, /conversation/turn,
+/incoming-sms and live /audio/<call_sid> streams are handled here with the
+async OpenAI and ElevenLabs clients, and their database work runs on a small
+thread pool (AsyncDatabase). A call waiting on a provider therefore holds no
+thread, and one process can keep hundreds of calls in flight. The TwiML,
+JSON errors, metrics and fallbacks are the same as in the Flask routes in
+src/main.py. Everything else, including /call-status, finished clips and the
+dashboard, is passed to the Flask app on a WSGI thread pool.
+"""
+
+import asyncio
+import json
+import os
+import time
+from urllib.parse import parse_qsl
+
+from a2wsgi import WSGIMiddleware
+
+from . import main
+from .database import AsyncDatabase
+from .http_pool import http_pool
+from .metrics import metrics
+from .resilience import Deadline
+from .session_store import USER, ASSISTANT
+from .twilio_handler import handle_incoming_call, handle_incoming_sms, handle_conversation_turn
+from .voice_agent import FALLBACK_RESPONSE
+
+# Threads serving the routes that stay on the Flask app
+WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 16))
+
+flask_app = WSGIMiddleware(main.create_app(), workers=WSGI_WORKERS)
+db = AsyncDatabase(main.db)
+voice_agent = main.voice_agent
+
+
+class WebhookRequest:
+    """The parts of an HTTP request the webhook handlers use"""
+
+    def __init__(self, scope, body=b''):
+        self.scope = scope
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        self.form = {}
+        if self.headers.get('content-type', '').split(';')[0].strip() == 'application/x-www-form-urlencoded':
+            for key, value in parse_qsl(body.decode('utf-8'), keep_blank_values=True):
+                # Like werkzeug's form.get(): the first value wins
+                self.form.setdefault(key, value)
+
+    @property
+    def host_url(self):
+        host = self.headers.get('host')
+        if not host:
+            server_host, server_port = self.scope.get('server') or ('localhost', 80)
+            host = f"{server_host}:{server_port}"
+        return f"{self.scope.get('scheme', 'http')}://{host}/"
+
+
+def _json(data, status):
+    # Same bytes as flask.jsonify outside debug mode
+    return json.dumps(data, separators=(',', ':')) + '\n', status, {'Content-Type': 'application/json'}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# WEBHOOKS
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def incoming_call(request):
+    """Async /incoming-call (see main.incoming_call)"""
+    try:
+        deadline = Deadline(main.ANSWER_DEADLINE_SECONDS)
+        phone_number = request.form.get('From')
+        call_sid = request.form.get('CallSid')
+
+        caller = await db.get_caller_profile(phone_number)
+        current_status = await db.run(main.status_manager.get_current_status)
+        activity = current_status.get('activity')
+
+        # lookup() may read newly rendered greetings from SQLite: keep it off the loop
+        greeting = await db.run(main.greeting_pool.lookup, caller, activity)
+        if greeting is not None:
+            await db.log_call(
+                phone_number=phone_number,
+                call_sid=call_sid,
+                incoming_text="Incoming call",
+                ai_response=greeting['text']
+            )
+            audio_url = None
+            if greeting['audio_filename']:
+                audio_url = f"{request.host_url}static/audio/greetings/{greeting['audio_filename']}"
+            return handle_incoming_call(request, greeting['text'], audio_url)
+
+        if not (voice_agent.can_speak_now and voice_agent.llm_guard.available):
+            return await _degraded_answer(request, phone_number, call_sid, caller, activity, deadline)
+
+        prompt = dict(
+            caller_name=caller.get('name'),
+            caller_relationship=caller.get('relationship'),
+            caller_tone=caller.get('tone'),
+            status=activity
+        )
+
+        async def log_response(ai_response_text):
+            await db.log_call(
+                phone_number=phone_number,
+                call_sid=call_sid,
+                incoming_text="Incoming call",
+                ai_response=ai_response_text
+            )
+
+        async def produce(stream):
+            audio_deadline = Deadline(main.FIRST_AUDIO_DEADLINE_SECONDS)
+            if main.LLM_STREAMING:
+                audio = voice_agent.astream_spoken_response(on_text=log_response, deadline=audio_deadline, **prompt)
+            else:
+                ai_response_text = await voice_agent.agenerate_response(deadline=audio_deadline, **prompt)
+                await log_response(ai_response_text)
+                audio = voice_agent.astream_speech(ai_response_text)
+            async for chunk in audio:
+                stream.write(chunk)
+
+        audio_path = await db.run(main.audio_store.allocate, 'response', call_sid, call_sid=call_sid)
+        main.audio_streams.start_task(call_sid, produce, path=audio_path)
+
+        return handle_incoming_call(request, None, f"{request.host_url}audio/{call_sid}")
+
+    except Exception as e:
+        print(f"Error handling incoming call: {e}")
+        return handle_incoming_call(request, FALLBACK_RESPONSE)
+
+
+async def _degraded_answer(request, phone_number, call_sid, caller, activity, deadline):
+    """Async main._degraded_answer: cached greeting, then <Say> of LLM text, then the static message"""
+    greeting = await db.run(main.greeting_pool.fallback, caller, activity)
+    audio_url = None
+    if greeting is not None:
+        stage, text = 'cached', greeting['text']
+        if greeting['audio_filename']:
+            audio_url = f"{request.host_url}static/audio/greetings/{greeting['audio_filename']}"
+    else:
+        text = await voice_agent.agenerate_response(
+            caller_name=caller.get('name'),
+            caller_relationship=caller.get('relationship'),
+            caller_tone=caller.get('tone'),
+            status=activity,
+            deadline=deadline
+        )
+        stage = 'static' if text == FALLBACK_RESPONSE else 'say'
+
+    metrics.inc('fallbacks_total', stage=stage)
+    await db.log_call(
+        phone_number=phone_number,
+        call_sid=call_sid,
+        incoming_text="Incoming call",
+        ai_response=text
+    )
+    return handle_incoming_call(request, text, audio_url)
+
+
+async def incoming_call_conversation(request):
+    """Async /incoming-call/conversation"""
+    try:
+        phone_number = request.form.get('From')
+        call_sid = request.form.get('CallSid')
+
+        session = await db.run(main.sessions.start, call_sid, phone_number, await _caller_prompt(phone_number))
+        return await _conversation_reply(request, session)
+
+    except Exception as e:
+        print(f"Error handling conversation call: {e}")
+        return _json({'error': str(e)}, 500)
+
+
+async def conversation_turn(request):
+    """Async /conversation/turn"""
+    try:
+        call_sid = request.form.get('CallSid')
+        speech = (request.form.get('SpeechResult') or '').strip()
+
+        session = await db.run(main.sessions.get, call_sid)
+        if session is None:
+            phone_number = request.form.get('From')
+            session = await db.run(main.sessions.start, call_sid, phone_number, await _caller_prompt(phone_number))
+
+        if not speech:
+            return handle_conversation_turn(main.CONVERSATION_GOODBYE, None, None, end_call=True)
+
+        await db.run(main.sessions.add_turn, session, USER, speech)
+        return await _conversation_reply(request, session)
+
+    except Exception as e:
+        print(f"Error handling conversation turn: {e}")
+        return _json({'error': str(e)}, 500)
+
+
+async def _caller_prompt(phone_number):
+    caller = await db.get_caller_profile(phone_number)
+    current_status = await db.run(main.status_manager.get_current_status)
+    return dict(
+        caller_name=caller.get('name'),
+        caller_relationship=caller.get('relationship'),
+        caller_tone=caller.get('tone'),
+        status=current_status.get('activity')
+    )
+
+
+async def _conversation_reply(request, session):
+    ai_response_text = await voice_agent.agenerate_response(
+        conversation_history=session.history(),
+        deadline=Deadline(main.ANSWER_DEADLINE_SECONDS),
+        **session.prompt
+    )
+    await db.run(main.sessions.add_turn, session, ASSISTANT, ai_response_text)
+
+    audio_url = None
+    if voice_agent.can_speak_now:
+        audio_key = f"{session.call_sid}-{len(session.turns)}"
+        audio_path = await db.run(main.audio_store.allocate, 'response', audio_key, call_sid=session.call_sid)
+
+        async def produce(stream):
+            async for chunk in voice_agent.astream_speech(ai_response_text):
+                stream.write(chunk)
+
+        main.audio_streams.start_task(audio_key, produce, path=audio_path)
+        audio_url = f"{request.host_url}audio/{audio_key}"
+
+    return handle_conversation_turn(ai_response_text, audio_url, f"{request.host_url}conversation/turn")
+
+
+async def incoming_sms(request):
+    """Async /incoming-sms"""
+    try:
+        phone_number = request.form.get('From')
+        message_body = request.form.get('Body')
+
+        caller = await db.get_caller_profile(phone_number)
+        current_status = await db.run(main.status_manager.get_current_status)
+
+        ai_response_text = await voice_agent.agenerate_response(
+            caller_name=caller.get('name'),
+            caller_relationship=caller.get('relationship'),
+            caller_tone=caller.get('tone'),
+            status=current_status.get('activity'),
+            deadline=Deadline(main.ANSWER_DEADLINE_SECONDS)
+        )
+
+        await db.log_call(
+            phone_number=phone_number,
+            call_sid=request.form.get('MessageSid'),
+            incoming_text=f"[SMS] {message_body}",
+            ai_response=ai_response_text
+        )
+
+        return handle_incoming_sms(ai_response_text)
+
+    except Exception as e:
+        print(f"Error handling incoming SMS: {e}")
+        return _json({'error': str(e)}, 500)
+
+
+async def stream_audio(request, call_sid):
+    """Live /audio/<call_sid> streams; finished ones (None) are served from disk by Flask"""
+    stream = main.audio_streams.get(call_sid)
+    if stream is None or stream.error is not None:
+        return None
+    return stream.aiter_chunks(), 200, {'Content-Type': 'audio/mpeg'}
+
+
+# Native routes, named like the Flask endpoints so metrics line up
+ROUTES = {
+    ('POST', '/incoming-call'): ('incoming_call', incoming_call),
+    ('POST', '/incoming-call/conversation'): ('incoming_call_conversation', incoming_call_conversation),
+    ('POST', '/conversation/turn'): ('conversation_turn', conversation_turn),
+    ('POST', '/incoming-sms'): ('incoming_sms', incoming_sms),
+}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ASGI APPLICATION
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] != 'http':
+        # Media Streams websockets are served by src.media_stream
+        return await send({'type': 'websocket.close', 'code': 1000})
+
+    method, path = scope['method'], scope['path']
+    params = {}
+    route = ROUTES.get((method, path))
+    if route is None and method == 'GET' and path.startswith('/audio/') and '/' not in path[len('/audio/'):]:
+        route = ('stream_audio', stream_audio)
+        params['call_sid'] = path[len('/audio/'):]
+    if route is None:
+        return await flask_app(scope, receive, send)
+
+    endpoint, handler = route
+    request = WebhookRequest(scope, await _read_body(receive) if method == 'POST' else b'')
+    started = time.perf_counter()
+    with metrics.bind(route=endpoint, call_sid=request.form.get('CallSid') or params.get('call_sid')):
+        response = await handler(request, **params)
+    if response is None:
+        return await flask_app(scope, _replay(b''), send)
+
+    body, status, headers = response
+    metrics.observe('request_seconds', time.perf_counter() - started, route=endpoint)
+    metrics.inc('requests_total', route=endpoint, status=str(status))
+    await _send_response(send, body, status, headers)
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return body
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+def _replay(body):
+    """receive() for handing an already-read request on to the Flask app"""
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        return {'type': 'http.disconnect'}
+    return receive
+
+
+async def _send_response(send, body, status, headers):
+    raw_headers = [(k.lower().encode('latin-1'), str(v).encode('latin-1')) for k, v in headers.items()]
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    if isinstance(body, bytes):
+        raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+        return
+
+    # Streamed body (live audio): an async iterator of chunks
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    async for chunk in body:
+        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+async def _lifespan(receive, send):
+    keepalive = None
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Keep the async clients' connections warm, as init_worker() does for the sync ones
+            keepalive = asyncio.ensure_future(http_pool.akeepalive())
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if keepalive is not None:
+                keepalive.cancel()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 AI Moses Voice Agent (async) on http://0.0.0.0:5000")
+    uvicorn.run(app, host='0.0.0.0', port=5000, proxy_headers=True)
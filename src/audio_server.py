@@ -0,0 +1,127 @@
+"""
+Audio Server Module
+Serves generated clips with conditional GET, byte ranges, long-lived caching of content-addressed clips and an in-memory hot set
+"""
+
+import io
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from flask import send_file
+from werkzeug.security import safe_join
+
+# Greeting clips are named by a hash of their content and never rewritten, so
+# clients may keep them for a year. Other clips (call responses, summaries)
+# can be rewritten under the same name and are revalidated on every use.
+CLIP_MAX_AGE = int(os.getenv('AUDIO_CLIP_MAX_AGE', 365 * 86400))
+CONTENT_ADDRESSED = re.compile(r'greeting_[0-9a-f]+\.mp3')
+# In-memory copies of frequently fetched clips (0 disables)
+HOT_CACHE_BYTES = int(os.getenv('AUDIO_HOT_CACHE_BYTES', 32 * 1024 * 1024))
+HOT_ITEM_MAX_BYTES = int(os.getenv('AUDIO_HOT_ITEM_MAX_BYTES', 1024 * 1024))
+# Recently requested paths remembered so a clip is only cached on its second fetch
+DOORKEEPER_SIZE = 4096
+
+
+class AudioServer:
+    """
+    send(filename) answers with the clip under `root`.
+
+    Responses carry an ETag and Last-Modified from the file's stat, honour
+    If-None-Match / If-Modified-Since and Range. Content-addressed clips
+    (greeting_<digest>.mp3) are marked immutable for `max_age`; the rest
+    are sent with no-cache, so clients revalidate them against the ETag.
+    Cold clips go out through the WSGI file wrapper (sendfile under
+    gunicorn, or X-Sendfile when USE_X_SENDFILE is set). A clip requested a
+    second time (greetings, popular summaries) is kept in a byte-bounded LRU
+    and served from memory until it changes on disk or is evicted.
+    """
+
+    def __init__(self, root, hot_cache_bytes=HOT_CACHE_BYTES, hot_item_max_bytes=HOT_ITEM_MAX_BYTES,
+                 max_age=CLIP_MAX_AGE):
+        self.root = os.path.abspath(root)
+        self.hot_cache_bytes = hot_cache_bytes
+        self.hot_item_max_bytes = hot_item_max_bytes
+        self.max_age = max_age
+        self._hot = OrderedDict()
+        self._hot_bytes = 0
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def send(self, filename):
+        """Response for the clip, or None if there is no such finished clip"""
+        path = safe_join(self.root, filename)
+        if path is None or filename.endswith('.part'):
+            return None
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        data = self._cached(path, stat)
+        immutable = CONTENT_ADDRESSED.fullmatch(os.path.basename(path)) is not None
+        response = send_file(
+            io.BytesIO(data) if data is not None else path,
+            mimetype='audio/mpeg',
+            conditional=True,
+            etag=f"{stat.st_mtime_ns:x}-{stat.st_size:x}",
+            last_modified=stat.st_mtime,
+            max_age=self.max_age if immutable else None,
+        )
+        if immutable:
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response
+
+    def _cached(self, path, stat):
+        """Clip bytes from (or newly admitted to) the hot set; None to stream from disk"""
+        if not self.hot_cache_bytes or stat.st_size > self.hot_item_max_bytes:
+            return None
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._hot.get(path)
+            if entry is not None and entry[0] == version:
+                self._hot.move_to_end(path)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            if path not in self._seen:
+                self._seen[path] = True
+                if len(self._seen) > DOORKEEPER_SIZE:
+                    self._seen.popitem(last=False)
+                return None
+
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        if len(data) != stat.st_size:
+            return None
+
+        with self._lock:
+            old = self._hot.pop(path, None)
+            if old is not None:
+                self._hot_bytes -= len(old[1])
+            self._hot[path] = (version, data)
+            self._hot_bytes += len(data)
+            while self._hot_bytes > self.hot_cache_bytes:
+                _, (_, evicted) = self._hot.popitem(last=False)
+                self._hot_bytes -= len(evicted)
+        return data
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._hot),
+                'bytes': self._hot_bytes,
+                'max_bytes': self.hot_cache_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+            }
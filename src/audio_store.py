@@ -0,0 +1,289 @@
+"""
+Audio Store Module
+Sharded layout, manifest and retention sweeps for generated response and summary clips
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+
+AUDIO_RETENTION_DAYS = float(os.getenv('AUDIO_RETENTION_DAYS', 30))
+# Total size budget; the oldest clips go first once it is exceeded (0 = unlimited)
+AUDIO_MAX_BYTES = int(os.getenv('AUDIO_MAX_BYTES', 2 * 1024 ** 3))
+AUDIO_SWEEP_INTERVAL = float(os.getenv('AUDIO_SWEEP_INTERVAL_SECONDS', 3600))
+# Nothing younger than this is treated as an orphan (renders and calls in flight)
+ORPHAN_GRACE_SECONDS = float(os.getenv('AUDIO_ORPHAN_GRACE_SECONDS', 3600))
+SWEEP_BATCH = 500
+
+# Managed kinds -> sub-directory of the store root
+KINDS = {'response': 'responses', 'summary': 'summaries'}
+# Pre-rendered greetings (GreetingPool): content-addressed, listed in the greetings table
+GREETINGS_DIR = 'greetings'
+_GREETING_NAME = re.compile(r'^greeting_[0-9a-f]+\.mp3(\.part)?$')
+# Clips written before the store existed sat directly in the root, named
+# response_<CallSid>[_<timestamp>].mp3 or summary_<CallSid>.mp3; CallSids
+# may contain underscores themselves (simulated calls are SIM_<id>)
+_LEGACY_NAME = re.compile(r'^(response|summary)_(.+)\.mp3$')
+_TIMESTAMP_SUFFIX = re.compile(r'^(.+)_\d+$')
+
+
+class AudioStore:
+    """
+    Clips live under <root>/<kind>/<shard>/ with a two-character hash shard,
+    so no directory grows past a few hundred entries per thousand calls.
+
+    allocate() records an `audio_files` row (path, kind, CallSid) before the
+    file is written, so a file without a row is an orphan. sweep() fills in
+    sizes, removes clips past the retention age, then the oldest ones while
+    the store is over its byte budget, then orphans: files with no row and
+    rows whose call_history entry is gone. Removed summaries have their
+    call_history.summary_audio_path cleared so the dashboard never links a
+    missing file. Greeting clips are not in the manifest; those no row of
+    the greetings table refers to any more are removed once past the grace
+    period.
+    """
+
+    def __init__(self, db, root, url_prefix='/static/audio/',
+                 retention_days=AUDIO_RETENTION_DAYS, max_bytes=AUDIO_MAX_BYTES,
+                 sweep_interval=AUDIO_SWEEP_INTERVAL, grace=ORPHAN_GRACE_SECONDS):
+        self.db = db
+        self.root = root
+        self.url_prefix = url_prefix
+        self.retention = retention_days * 86400 if retention_days else None
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.grace = grace
+        self.last_sweep = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _relative(self, kind, key):
+        key = re.sub(r'[^\w.-]', '_', str(key))
+        shard = hashlib.sha1(key.encode('utf-8')).hexdigest()[:2]
+        return f"{KINDS[kind]}/{shard}/{kind}_{key}.mp3"
+
+    def path_for(self, kind, key):
+        return os.path.join(self.root, self._relative(kind, key))
+
+    def url_for(self, path):
+        """Public URL of a clip in the store"""
+        return self.url_prefix + os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def allocate(self, kind, key, call_sid=None):
+        """Record a clip about to be written and return the path to write it to"""
+        rel = self._relative(kind, key)
+        with self.db.transaction() as conn:
+            conn.execute("""
+                INSERT INTO audio_files (path, kind, call_sid, bytes, created_at)
+                VALUES (?, ?, ?, NULL, ?)
+                ON CONFLICT (path) DO UPDATE SET bytes = NULL, created_at = excluded.created_at
+            """, (rel, kind, call_sid, time.time()))
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='audio-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Audio sweep error: {e}")
+            self._stop.wait(self.sweep_interval)
+
+    def sweep(self, now=None):
+        """One retention pass; returns counts of what was removed"""
+        now = time.time() if now is None else now
+        stats = {'adopted': self._adopt_legacy(), 'expired': 0, 'evicted': 0, 'orphans': 0, 'greetings': 0,
+                 'bytes_freed': 0}
+        self._record_sizes(now, stats)
+
+        if self.retention:
+            self._remove_where("created_at < ?", (now - self.retention,), stats, 'expired')
+
+        if self.max_bytes:
+            conn = self.db._connect()
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM audio_files").fetchone()[0]
+            while total > self.max_bytes:
+                rows = conn.execute("""
+                    SELECT path, kind, bytes FROM audio_files
+                    WHERE bytes IS NOT NULL ORDER BY created_at LIMIT ?
+                """, (SWEEP_BATCH,)).fetchall()
+                if not rows:
+                    break
+                victims = []
+                for row in rows:
+                    victims.append(row)
+                    total -= row[2]
+                    if total <= self.max_bytes:
+                        break
+                self._remove(victims, stats, 'evicted')
+
+        # Clips whose call has been deleted or archived away. Skipped in a
+        # sweep that adopted legacy clips, so those are only judged by the
+        # next one, against call_history as it is then.
+        if not stats['adopted']:
+            self._remove_where("""
+                call_sid IS NOT NULL AND created_at < ?
+                AND NOT EXISTS (SELECT 1 FROM call_history WHERE call_history.call_sid = audio_files.call_sid)
+            """, (now - self.grace,), stats, 'orphans')
+        self._remove_unlisted(now, stats)
+        self._remove_old_greetings(now, stats)
+
+        self.last_sweep = dict(stats, finished_at=time.time())
+        return stats
+
+    def _remove_where(self, condition, params, stats, reason):
+        conn = self.db._connect()
+        while True:
+            rows = conn.execute(f"""
+                SELECT path, kind, bytes FROM audio_files WHERE {condition} LIMIT ?
+            """, params + (SWEEP_BATCH,)).fetchall()
+            if not rows:
+                return
+            self._remove(rows, stats, reason)
+
+    def _remove(self, rows, stats, reason):
+        """Delete (path, kind, bytes) clips and their rows, clearing summary links"""
+        for path, kind, size in rows:
+            try:
+                os.remove(os.path.join(self.root, path))
+                stats['bytes_freed'] += size or 0
+            except FileNotFoundError:
+                pass
+        with self.db.transaction() as conn:
+            conn.executemany("DELETE FROM audio_files WHERE path = ?", [(row[0],) for row in rows])
+            conn.executemany("""
+                UPDATE call_history SET summary_audio_path = NULL WHERE summary_audio_path = ?
+            """, [(self.url_prefix + row[0],) for row in rows if row[1] == 'summary'])
+        stats[reason] += len(rows)
+
+    def _record_sizes(self, now, stats):
+        """Fill in sizes of finished clips; drop rows for renders that never produced a file"""
+        conn = self.db._connect()
+        rows = conn.execute("SELECT path, kind, created_at FROM audio_files WHERE bytes IS NULL").fetchall()
+        sizes, missing = [], []
+        for path, kind, created_at in rows:
+            try:
+                sizes.append((os.path.getsize(os.path.join(self.root, path)), path))
+            except FileNotFoundError:
+                if created_at < now - self.grace:
+                    missing.append((path, kind, None))
+        if sizes:
+            with self.db.transaction() as conn:
+                conn.executemany("UPDATE audio_files SET bytes = ? WHERE path = ?", sizes)
+        if missing:
+            self._remove(missing, stats, 'orphans')
+
+    def _remove_unlisted(self, now, stats):
+        """Delete files (and abandoned .part files) that have no manifest row"""
+        conn = self.db._connect()
+        for kind_dir in KINDS.values():
+            base = os.path.join(self.root, kind_dir)
+            if not os.path.isdir(base):
+                continue
+            for shard in os.scandir(base):
+                if not shard.is_dir():
+                    continue
+                entries = [e for e in os.scandir(shard.path) if e.is_file()]
+                names = [f"{kind_dir}/{shard.name}/{e.name}" for e in entries]
+                listed = set()
+                for i in range(0, len(names), SWEEP_BATCH):
+                    chunk = names[i:i + SWEEP_BATCH]
+                    listed.update(row[0] for row in conn.execute(
+                        f"SELECT path FROM audio_files WHERE path IN ({','.join('?' * len(chunk))})", chunk))
+                for entry, name in zip(entries, names):
+                    if name in listed:
+                        continue
+                    stat = entry.stat()
+                    if stat.st_mtime >= now - self.grace:
+                        continue
+                    try:
+                        os.remove(entry.path)
+                        stats['orphans'] += 1
+                        stats['bytes_freed'] += stat.st_size
+                    except FileNotFoundError:
+                        pass
+
+    def _remove_old_greetings(self, now, stats):
+        """Delete greeting clips (and abandoned .part files) no stored greeting refers to"""
+        base = os.path.join(self.root, GREETINGS_DIR)
+        if not os.path.isdir(base):
+            return
+        # Listed after the scan, so a clip saved in between counts as referenced
+        entries = [e for e in os.scandir(base) if e.is_file() and _GREETING_NAME.match(e.name)]
+        referenced = {row[0] for row in self.db._connect().execute(
+            "SELECT audio_filename FROM greetings WHERE audio_filename IS NOT NULL")}
+        for entry in entries:
+            if entry.name in referenced:
+                continue
+            stat = entry.stat()
+            if stat.st_mtime >= now - self.grace:
+                continue
+            try:
+                os.remove(entry.path)
+                stats['greetings'] += 1
+                stats['bytes_freed'] += stat.st_size
+            except FileNotFoundError:
+                pass
+
+    def _legacy_call_sid(self, key):
+        """The call_history CallSid a legacy clip name refers to, or None"""
+        candidates = [key]
+        match = _TIMESTAMP_SUFFIX.match(key)
+        if match:
+            candidates.append(match.group(1))
+        conn = self.db._connect()
+        for call_sid in candidates:
+            if conn.execute("SELECT 1 FROM call_history WHERE call_sid = ? LIMIT 1", (call_sid,)).fetchone():
+                return call_sid
+        return None
+
+    def _adopt_legacy(self):
+        """Move flat response_*/summary_* files from the root into the sharded layout"""
+        adopted = 0
+        if not os.path.isdir(self.root):
+            return adopted
+        for entry in os.scandir(self.root):
+            match = _LEGACY_NAME.match(entry.name)
+            if not match or not entry.is_file():
+                continue
+            kind, key = match.groups()
+            # No known call (or a name we cannot attribute): kept until retention, never an orphan
+            call_sid = self._legacy_call_sid(key)
+            rel = self._relative(kind, key)
+            stat = entry.stat()
+            os.makedirs(os.path.dirname(os.path.join(self.root, rel)), exist_ok=True)
+            os.replace(entry.path, os.path.join(self.root, rel))
+            with self.db.transaction() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO audio_files (path, kind, call_sid, bytes, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (rel, kind, call_sid, stat.st_size, stat.st_mtime))
+                if kind == 'summary':
+                    conn.execute("""
+                        UPDATE call_history SET summary_audio_path = ? WHERE summary_audio_path = ?
+                    """, (self.url_prefix + rel, self.url_prefix + entry.name))
+            adopted += 1
+        return adopted
+
+    def stats(self):
+        row = self.db._connect().execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM audio_files").fetchone()
+        return {
+            'files': row[0],
+            'bytes': row[1],
+            'max_bytes': self.max_bytes,
+            'retention_days': self.retention / 86400 if self.retention else None,
+            'last_sweep': self.last_sweep,
+        }
@@ -0,0 +1,228 @@
+"""
+Audio Stream Module
+Fan-out buffers that let /audio/<call_sid> play TTS audio while it is still being synthesized
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+STREAM_WORKERS = int(os.getenv('AUDIO_STREAM_WORKERS', 16))
+# How long a finished stream stays in memory before readers fall back to the file
+STREAM_LINGER_SECONDS = float(os.getenv('AUDIO_STREAM_LINGER_SECONDS', 120))
+# Upper bound a reader waits for the next chunk before giving up
+READ_TIMEOUT_SECONDS = float(os.getenv('AUDIO_STREAM_READ_TIMEOUT', 30))
+
+
+class AudioStream:
+    """
+    Append-only audio buffer with any number of concurrent readers.
+
+    The producer writes chunks as they arrive from the TTS provider; each chunk
+    is also teed to `<path>.part`, which is renamed to `path` once the stream
+    finishes cleanly, so a completed file can be replayed later.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._chunks = []
+        self._done = False
+        self.error = None
+        self.finished_at = None
+        self._cond = threading.Condition()
+        # Event-loop readers: (loop, asyncio.Event) pairs woken on every change
+        self._waiters = []
+        self._file = None
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            self._file = open(path + '.part', 'wb')
+
+    @property
+    def done(self):
+        return self._done
+
+    def write(self, chunk):
+        if not chunk:
+            return
+        if self._file:
+            self._file.write(chunk)
+        with self._cond:
+            self._chunks.append(chunk)
+            self._cond.notify_all()
+            self._wake()
+
+    def finish(self, error=None):
+        if self._file:
+            self._file.close()
+            if error is None and self._chunks:
+                os.replace(self.path + '.part', self.path)
+            else:
+                os.remove(self.path + '.part')
+        with self._cond:
+            self.error = error
+            self._done = True
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+            self._wake()
+
+    def _wake(self):
+        for loop, event in self._waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                # Event loop already closed
+                pass
+        self._waiters.clear()
+
+    def wait_started(self, timeout=None):
+        """True once the first chunk (or the end of the stream) is available"""
+        with self._cond:
+            return bool(self._cond.wait_for(lambda: self._chunks or self._done, timeout))
+
+    def iter_chunks(self, timeout=READ_TIMEOUT_SECONDS):
+        """Yield every chunk from the start, blocking for ones not produced yet"""
+        index = 0
+        while True:
+            with self._cond:
+                if not self._cond.wait_for(lambda: index < len(self._chunks) or self._done, timeout):
+                    return
+                pending = self._chunks[index:]
+                done = self._done
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+            if done and index >= len(self._chunks):
+                return
+
+
+    async def _await(self, predicate, timeout):
+        """Async counterpart of Condition.wait_for(predicate, timeout)"""
+        loop = asyncio.get_running_loop()
+        expires = None if timeout is None else loop.time() + timeout
+        while True:
+            event = asyncio.Event()
+            with self._cond:
+                if predicate():
+                    return True
+                self._waiters.append((loop, event))
+            remaining = None if expires is None else expires - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                with self._cond:
+                    return bool(predicate())
+
+    async def await_started(self, timeout=None):
+        """wait_started() for the event loop"""
+        return await self._await(lambda: self._chunks or self._done, timeout)
+
+    async def aiter_chunks(self, timeout=READ_TIMEOUT_SECONDS):
+        """iter_chunks() for the event loop: waits without holding a thread"""
+        index = 0
+        while True:
+            if not await self._await(lambda: index < len(self._chunks) or self._done, timeout):
+                return
+            with self._cond:
+                pending = self._chunks[index:]
+                done = self._done
+            for chunk in pending:
+                yield chunk
+            index += len(pending)
+            if done and index >= len(self._chunks):
+                return
+
+
+class AudioStreamRegistry:
+    """Tracks in-flight and recently finished streams by key (usually a CallSid)"""
+
+    def __init__(self, workers=STREAM_WORKERS, linger=STREAM_LINGER_SECONDS):
+        self.linger = linger
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='audio-stream')
+        # Producers running on an event loop (start_task); referenced until done
+        self._tasks = set()
+
+    def start(self, key, produce, path=None):
+        """
+        Register a stream and run `produce(stream)` in the background.
+
+        `produce` writes chunks with stream.write(); the registry finishes the
+        stream when it returns or raises.
+        """
+        stream = AudioStream(path)
+        with self._lock:
+            self._expire()
+            self._streams[key] = stream
+        self._run(stream, produce, key)
+        return stream
+
+    def start_task(self, key, produce, path=None):
+        """
+        Like start(), for an async `produce(stream)`: it runs as a task on the
+        running event loop instead of taking a worker thread.
+        """
+        stream = AudioStream(path)
+        with self._lock:
+            self._expire()
+            self._streams[key] = stream
+        self._run_task(stream, produce, key)
+        return stream
+
+    def run(self, produce, path=None):
+        """Like start(), for a stream only the caller needs to read"""
+        stream = AudioStream(path)
+        self._run(stream, produce, path)
+        return stream
+
+    def _run(self, stream, produce, key):
+        def run():
+            try:
+                produce(stream)
+            except Exception as e:
+                print(f"Error producing audio stream {key}: {e}")
+                stream.finish(error=e)
+            else:
+                stream.finish()
+
+        self._executor.submit(run)
+
+    def run_task(self, produce, path=None):
+        """Like run(), for an async `produce(stream)`"""
+        stream = AudioStream(path)
+        self._run_task(stream, produce, path)
+        return stream
+
+    def _run_task(self, stream, produce, key):
+        async def run():
+            try:
+                await produce(stream)
+            except asyncio.CancelledError as e:
+                stream.finish(error=e)
+                raise
+            except Exception as e:
+                print(f"Error producing audio stream {key}: {e}")
+                stream.finish(error=e)
+            else:
+                stream.finish()
+
+        task = asyncio.get_running_loop().create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get(self, key):
+        with self._lock:
+            return self._streams.get(key)
+
+    def _expire(self):
+        now = time.monotonic()
+        stale = [
+            key for key, stream in self._streams.items()
+            if stream.done and now - stream.finished_at > self.linger
+        ]
+        for key in stale:
+            del self._streams[key]
@@ -0,0 +1,401 @@
+"""
+Call Archive Module
+Moves old call history and recordings into compressed monthly archive files, reads them back and keeps the hot database small
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+# Calls and recordings older than this leave the hot database (0 disables archiving)
+ARCHIVE_AFTER_DAYS = float(os.getenv('ARCHIVE_AFTER_DAYS', 90))
+ARCHIVE_INTERVAL = float(os.getenv('ARCHIVE_INTERVAL_SECONDS', 6 * 3600))
+# Rows moved per transaction
+ARCHIVE_BATCH = int(os.getenv('ARCHIVE_BATCH', 1000))
+# Decompressed archive files kept in memory for reads
+ARCHIVE_CACHE_FILES = int(os.getenv('ARCHIVE_CACHE_FILES', 4))
+# VACUUM once at least this share of the database file is free pages
+VACUUM_FREE_RATIO = float(os.getenv('DB_VACUUM_FREE_RATIO', 0.25))
+# Files younger than this without an index row may still be being written
+ORPHAN_GRACE_SECONDS = 3600
+
+# kind -> source table and the columns kept
+TABLES = {
+    'call': ('call_history', ('id', 'phone_number', 'call_sid', 'incoming_text', 'ai_response', 'timestamp',
+                              'summary_text', 'summary_audio_path', 'summary_status')),
+    'recording': ('voice_recordings', ('id', 'phone_number', 'call_sid', 'file_path', 'duration',
+                                       'transcription', 'timestamp')),
+}
+# kind -> full-text index over archived rows and its columns (as in the hot *_fts tables)
+SEARCH_INDEXES = {
+    'call': ('archived_calls_fts', ('incoming_text', 'ai_response', 'summary_text')),
+    'recording': ('archived_recordings_fts', ('transcription',)),
+}
+
+
+class CallArchive:
+    """
+    Rows older than `after_days` are moved, oldest first and in batches,
+    into gzipped JSON-lines files under <root>/<table>/<YYYY-MM>/. Each
+    batch writes its files, indexes them (archive_files, archived_rows) and
+    deletes the source rows in one transaction, so a row is always in
+    exactly one place. Calls whose summary is still pending stay hot.
+    Summary clips are not archived: the audio store's orphan sweep removes
+    them once their call has left call_history, so archived calls carry no
+    clip link.
+
+    Reads go through the index: page() fills a newest-first page of hot
+    rows with archived ones and only opens archive files when archived
+    rows actually make the page; get_call() falls back to the archive for
+    a CallSid that is no longer hot. Archived text is indexed for search in
+    SEARCH_INDEXES as it is archived; snippet() rebuilds a search snippet
+    from the archive file, since those indexes keep no text.
+
+    run_once() indexes files archived before the search index existed,
+    archives, merges each month's part files into one, deletes
+    files the index does not know about, and VACUUMs the database once
+    enough of it is free pages. start() runs it every `interval` seconds in
+    the host's leader process only.
+    """
+
+    def __init__(self, db, root, after_days=ARCHIVE_AFTER_DAYS, interval=ARCHIVE_INTERVAL,
+                 batch=ARCHIVE_BATCH, cache_files=ARCHIVE_CACHE_FILES, vacuum_free_ratio=VACUUM_FREE_RATIO):
+        self.db = db
+        self.root = root
+        self.after_days = after_days
+        self.interval = interval
+        self.batch = batch
+        self.cache_files = cache_files
+        self.vacuum_free_ratio = vacuum_free_ratio
+        self.last_run = None
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # -- reading -------------------------------------------------------------
+
+    def page(self, kind, hot, limit, fields, before_id=None, phone_number=None):
+        """
+        Merge archived rows into `hot`, a newest-first page of at most `limit`
+        rows with ids below `before_id`. Rows are returned as dicts of
+        `fields`, like the hot ones.
+        """
+        where, params = "r.kind = ?", [kind]
+        if phone_number is not None:
+            where, params = where + " AND r.phone_number = ?", params + [phone_number]
+        if before_id is not None:
+            where, params = where + " AND r.id < ?", params + [before_id]
+        if len(hot) >= limit:
+            # Only archived rows newer than the last hot row can still make the page
+            where, params = where + " AND r.id > ?", params + [hot[-1]['id']]
+
+        candidates = self._locate(where, params, limit)
+        if not candidates:
+            return hot
+        merged = sorted(hot + [{'id': row_id, '_path': path} for row_id, path in candidates],
+                        key=lambda row: row['id'], reverse=True)[:limit]
+
+        wanted = [(row['id'], row['_path']) for row in merged if '_path' in row]
+        records = self._read(kind, wanted, where, params, limit)
+        return [
+            {field: records[row['id']].get(field) for field in fields} if '_path' in row else row
+            for row in merged
+        ]
+
+    def get_call(self, call_sid):
+        """An archived call by CallSid, or None"""
+        found = self._locate("r.kind = 'call' AND r.call_sid = ?", [call_sid], 1)
+        if not found:
+            return None
+        records = self._read('call', found, "r.kind = 'call' AND r.call_sid = ?", [call_sid], 1)
+        return records.get(found[0][0])
+
+    def snippet(self, kind, row_id, words, tokens):
+        """
+        Text around the first of `words` (the last one as a prefix) in an
+        archived row, `tokens` words long with hits in [brackets] like
+        FTS5's snippet(); None if the row cannot be read.
+        """
+        where, params = "r.kind = ? AND r.id = ?", [kind, row_id]
+        found = self._locate(where, params, 1)
+        record = self._read(kind, found, where, params, 1).get(row_id) if found else None
+        if record is None:
+            return None
+        words = [word.lower() for word in words]
+
+        def hit(token):
+            token = token.lower()
+            return token in words[:-1] or token.startswith(words[-1])
+
+        # The index stems words, so a match may have no literal hit: then show the first text's start
+        text, matches, position = '', [], 0
+        for field in SEARCH_INDEXES[kind][1]:
+            field_text = record.get(field) or ''
+            field_matches = list(re.finditer(r"\w+", field_text))
+            hits = [i for i, m in enumerate(field_matches) if hit(m.group())]
+            if hits:
+                text, matches, position = field_text, field_matches, hits[0]
+                break
+            if field_matches and not matches:
+                text, matches = field_text, field_matches
+        if not matches:
+            return text
+
+        start = max(0, min(position - tokens // 2, len(matches) - tokens))
+        window = matches[start:start + tokens]
+        end = len(text) if start + tokens >= len(matches) else window[-1].end()
+        snippet, at = '', window[0].start()
+        for m in window:
+            snippet += text[at:m.start()] + (f"[{m.group()}]" if hit(m.group()) else m.group())
+            at = m.end()
+        return ('…' if start else '') + snippet + text[at:end] + ('' if end == len(text) else '…')
+
+    def _locate(self, where, params, limit):
+        """(id, file path) of archived rows matching `where`, newest first"""
+        return self.db._connect().execute(f"""
+            SELECT r.id, f.path FROM archived_rows r
+            JOIN archive_files f ON f.id = r.file_id
+            WHERE {where}
+            ORDER BY r.id DESC
+            LIMIT ?
+        """, params + [limit]).fetchall()
+
+    def _read(self, kind, wanted, where, params, limit):
+        """Records by id for (id, path) pairs; re-locates once if compaction replaced a file"""
+        try:
+            return self._records(wanted)
+        except FileNotFoundError:
+            relocated = dict(self._locate(where, params, limit))
+            return self._records([(row_id, relocated[row_id]) for row_id, _ in wanted if row_id in relocated])
+
+    def _records(self, wanted):
+        records = {}
+        for row_id, path in wanted:
+            records[row_id] = self._load(path)[row_id]
+        return records
+
+    def _load(self, path):
+        """A whole archive file as {id: record}; files never change once written"""
+        with self._cache_lock:
+            if path in self._cache:
+                self._cache.move_to_end(path)
+                return self._cache[path]
+        with gzip.open(os.path.join(self.root, path), 'rt', encoding='utf-8') as f:
+            records = {record['id']: record for record in map(json.loads, f)}
+        with self._cache_lock:
+            self._cache[path] = records
+            while len(self._cache) > self.cache_files:
+                self._cache.popitem(last=False)
+        return records
+
+    # -- archiving -----------------------------------------------------------
+
+    def archive(self, now=None):
+        """Move every eligible row out of the hot tables; returns rows moved per kind"""
+        if not self.after_days:
+            return {kind: 0 for kind in TABLES}
+        now = datetime.now() if now is None else now
+        cutoff = (now - timedelta(days=self.after_days)).isoformat()
+        moved = {}
+        for kind in TABLES:
+            moved[kind] = 0
+            while True:
+                count = self._archive_batch(kind, cutoff)
+                moved[kind] += count
+                if count < self.batch:
+                    break
+        return moved
+
+    def _archive_batch(self, kind, cutoff):
+        table, columns = TABLES[kind]
+        where = "timestamp < ?"
+        if kind == 'call':
+            where += " AND COALESCE(summary_status, '') NOT IN ('pending', 'processing')"
+
+        with self.db.transaction() as conn:
+            rows = conn.execute(f"""
+                SELECT {', '.join(columns)} FROM {table} WHERE {where} ORDER BY id LIMIT ?
+            """, (cutoff, self.batch)).fetchall()
+            if not rows:
+                return 0
+
+            months = {}
+            for row in rows:
+                record = dict(zip(columns, row))
+                if kind == 'call':
+                    record['summary_audio_path'] = None
+                months.setdefault(record['timestamp'][:7], []).append(record)
+
+            for month, records in months.items():
+                file_id = self._add_file(conn, kind, month, records)
+                self._index(conn, kind, records)
+                conn.executemany("""
+                    INSERT INTO archived_rows (kind, id, phone_number, call_sid, timestamp, file_id)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, [(kind, r['id'], r['phone_number'], r['call_sid'], r['timestamp'], file_id) for r in records])
+            conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(row[0],) for row in rows])
+        return len(rows)
+
+    def _index(self, conn, kind, records):
+        table, fields = SEARCH_INDEXES[kind]
+        conn.executemany(f"""
+            INSERT INTO {table} (rowid, {', '.join(fields)}) VALUES (?{', ?' * len(fields)})
+        """, [(r['id'],) + tuple(r.get(field) for field in fields) for r in records])
+
+    def index_pending(self):
+        """Add files archived before the search index existed to it; returns how many files"""
+        files = self.db._connect().execute("SELECT id, kind, path FROM archive_files WHERE indexed = 0").fetchall()
+        for file_id, kind, path in files:
+            records = sorted(self._load(path).values(), key=lambda r: r['id'])
+            with self.db.transaction() as conn:
+                # Compaction may have replaced the file meanwhile; its rows are then indexed with the new one
+                if conn.execute("UPDATE archive_files SET indexed = 1 WHERE id = ? AND indexed = 0",
+                                (file_id,)).rowcount:
+                    self._index(conn, kind, records)
+        return len(files)
+
+    def _add_file(self, conn, kind, month, records):
+        """
+        List and then write `records` (ascending ids) as a new archive file.
+
+        Id ranges of parts can overlap (a call held back for its summary is
+        archived after later ones), so names carry a random suffix, and the
+        index row goes in first: a name clash fails before any file is
+        replaced, and a failed write rolls the row back.
+        """
+        path = f"{TABLES[kind][0]}/{month}/{records[0]['id']}-{records[-1]['id']}-{uuid.uuid4().hex[:8]}.jsonl.gz"
+        file_id = conn.execute("""
+            INSERT INTO archive_files (kind, month, path, rows, bytes, created_at, indexed)
+            VALUES (?, ?, ?, ?, 0, ?, 1)
+        """, (kind, month, path, len(records), datetime.now().isoformat())).lastrowid
+        size = self._write(path, records)
+        conn.execute("UPDATE archive_files SET bytes = ? WHERE id = ?", (size, file_id))
+        return file_id
+
+    def _write(self, path, records):
+        full = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full + '.part', 'wb') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for record in records:
+                    f.write(json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(full + '.part', full)
+        return os.path.getsize(full)
+
+    # -- maintenance ---------------------------------------------------------
+
+    def compact(self):
+        """Merge each month's part files into one file; returns the number of files removed"""
+        conn = self.db._connect()
+        # Months with parts not yet in the search index wait for index_pending()
+        months = conn.execute("""
+            SELECT kind, month FROM archive_files GROUP BY kind, month HAVING COUNT(*) > 1 AND MIN(indexed) = 1
+        """).fetchall()
+        removed = 0
+        for kind, month in months:
+            parts = conn.execute("""
+                SELECT id, path FROM archive_files WHERE kind = ? AND month = ? ORDER BY id
+            """, (kind, month)).fetchall()
+            # Read and write outside the transaction: part files never change
+            records = sorted((r for _, path in parts for r in self._load(path).values()), key=lambda r: r['id'])
+            ids = [part[0] for part in parts]
+            with self.db.transaction() as tx:
+                current = tx.execute("""
+                    SELECT id FROM archive_files WHERE kind = ? AND month = ? ORDER BY id
+                """, (kind, month)).fetchall()
+                if [row[0] for row in current] != ids:
+                    continue  # another worker got there first; try again next run
+                file_id = self._add_file(tx, kind, month, records)
+                marks = ','.join('?' * len(ids))
+                tx.execute(f"UPDATE archived_rows SET file_id = ? WHERE file_id IN ({marks})", [file_id] + ids)
+                tx.execute(f"DELETE FROM archive_files WHERE id IN ({marks})", ids)
+            for _, path in parts:
+                try:
+                    os.remove(os.path.join(self.root, path))
+                except FileNotFoundError:
+                    pass
+            removed += len(parts)
+        return removed
+
+    def remove_unlisted(self, now=None):
+        """Delete archive files the index does not list (batches that never committed)"""
+        now = time.time() if now is None else now
+        listed = {row[0] for row in self.db._connect().execute("SELECT path FROM archive_files")}
+        removed = 0
+        for table, _ in TABLES.values():
+            base = os.path.join(self.root, table)
+            if not os.path.isdir(base):
+                continue
+            for month in os.scandir(base):
+                if not month.is_dir():
+                    continue
+                for entry in os.scandir(month.path):
+                    if f"{table}/{month.name}/{entry.name}" in listed:
+                        continue
+                    if entry.stat().st_mtime >= now - ORPHAN_GRACE_SECONDS:
+                        continue
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def vacuum(self, force=False):
+        """Rebuild the database file once enough of it is free pages; returns True if it ran"""
+        conn = self.db._connect()
+        pages = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if not force and (not pages or free / pages < self.vacuum_free_ratio):
+            return False
+        conn.execute("VACUUM")
+        # Under WAL the rebuilt pages go through the log first; shrink it again
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return True
+
+    def run_once(self, now=None):
+        started = time.time()
+        stats = {'indexed': self.index_pending(), 'archived': self.archive(now), 'compacted': self.compact(),
+                 'orphans': self.remove_unlisted()}
+        stats['vacuumed'] = self.vacuum()
+        self.last_run = dict(stats, seconds=round(time.time() - started, 3), finished_at=time.time())
+        return stats
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='call-archiver', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # One worker per host archives; VACUUM in particular blocks every writer
+                if self.db.leader.held():
+                    self.run_once()
+            except Exception as e:
+                print(f"Call archive error: {e}")
+            self._stop.wait(self.interval)
+
+    def stats(self):
+        conn = self.db._connect()
+        files = conn.execute("SELECT kind, COUNT(*), COALESCE(SUM(rows), 0), COALESCE(SUM(bytes), 0) "
+                             "FROM archive_files GROUP BY kind").fetchall()
+        return {
+            'after_days': self.after_days or None,
+            'files': {kind: {'files': n, 'rows': rows, 'bytes': size} for kind, n, rows, size in files},
+            'last_run': self.last_run,
+        }
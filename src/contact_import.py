@@ -0,0 +1,195 @@
+"""
+Contact Import Module
+Streams contacts out of CSV or vCard exports and upserts them in batches
+"""
+
+import csv
+import os
+
+from .phone_numbers import normalize_number
+
+IMPORT_BATCH_SIZE = int(os.getenv('CONTACT_IMPORT_BATCH_SIZE', 1000))
+# Cap on per-row errors echoed back; the failed count is always exact
+MAX_REPORTED_ERRORS = 100
+
+FIELDS = ('phone_number', 'name', 'relationship', 'tone', 'topics')
+
+# Lower-cased CSV header -> contact field
+CSV_HEADERS = {
+    'phone_number': 'phone_number', 'phone number': 'phone_number', 'phone': 'phone_number',
+    'number': 'phone_number', 'mobile': 'phone_number', 'mobile phone': 'phone_number',
+    'telephone': 'phone_number', 'tel': 'phone_number', 'phone 1 - value': 'phone_number',
+    'name': 'name', 'full name': 'name', 'display name': 'name', 'fn': 'name',
+    'relationship': 'relationship', 'relation': 'relationship', 'group': 'relationship',
+    'category': 'relationship', 'categories': 'relationship',
+    'tone': 'tone',
+    'topics': 'topics', 'notes': 'topics', 'note': 'topics',
+}
+
+
+def _clean(value):
+    value = (value or '').strip()
+    return value or None
+
+
+def parse_csv(stream):
+    """
+    Yield (line_number, record) for each row of a CSV export.
+
+    Headers are matched loosely (Phone, Mobile, Full Name, Notes, ...). A
+    file whose first row has no recognisable phone column is read as
+    headerless, with columns in FIELDS order like add_contacts.py.
+    """
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    columns = [CSV_HEADERS.get(h.strip().lstrip('\ufeff').lower()) for h in header]
+    if 'phone_number' not in columns:
+        columns = list(FIELDS)
+        yield reader.line_num, _csv_record(columns, header)
+
+    for row in reader:
+        if any(cell.strip() for cell in row):
+            yield reader.line_num, _csv_record(columns, row)
+
+
+def _csv_record(columns, row):
+    record = {}
+    for field, value in zip(columns, row):
+        # First matching column wins (e.g. "Phone" before "Mobile")
+        if field and record.get(field) is None:
+            record[field] = _clean(value)
+    return record
+
+
+def unfold_lines(stream):
+    """
+    vCard / iCalendar lines with folded continuations joined, as
+    (line_number, text). Both formats fold long lines the same way.
+    """
+    pending = None
+    start = 0
+    for number, line in enumerate(stream, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield start, pending
+        pending, start = line, number
+    if pending is not None:
+        yield start, pending
+
+
+def unescape_text(value):
+    """A vCard / iCalendar TEXT value with its backslash escapes undone (newlines become spaces)"""
+    return (value.replace('\\n', ' ').replace('\\N', ' ')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def parse_vcard(stream):
+    """
+    Yield (line_number, record) per TEL of each card in a vCard export.
+
+    FN (or N) gives the name, the first CATEGORIES entry the relationship and
+    NOTE the topics. A card with several numbers yields one record each.
+    """
+    card = None
+    for number, line in unfold_lines(stream):
+        if not line.strip():
+            continue
+        prop, _, value = line.partition(':')
+        # "item1.TEL;TYPE=CELL" -> "TEL"
+        name = prop.split(';', 1)[0].rsplit('.', 1)[-1].strip().upper()
+
+        if name == 'BEGIN' and value.strip().upper() == 'VCARD':
+            card = {'line': number, 'tels': [], 'name': None, 'n': None,
+                    'relationship': None, 'topics': None}
+        elif card is None:
+            continue
+        elif name == 'END':
+            yield from _card_records(card)
+            card = None
+        elif name == 'TEL':
+            card['tels'].append(_clean(value))
+        elif name == 'FN':
+            card['name'] = _clean(unescape_text(value))
+        elif name == 'N':
+            parts = [unescape_text(p).strip() for p in value.split(';')]
+            card['n'] = _clean(' '.join(p for p in parts[1:2] + parts[:1] if p))
+        elif name == 'CATEGORIES':
+            card['relationship'] = _clean(unescape_text(value.split(',')[0]))
+        elif name == 'NOTE':
+            card['topics'] = _clean(unescape_text(value))
+
+
+def _card_records(card):
+    base = {
+        'name': card['name'] or card['n'],
+        'relationship': card['relationship'],
+        'topics': card['topics'],
+    }
+    if not card['tels']:
+        yield card['line'], dict(base, phone_number=None)
+    for tel in card['tels']:
+        yield card['line'], dict(base, phone_number=tel)
+
+
+def detect_format(filename=None, content_type=None, first_line=''):
+    """'vcard' or 'csv' from the file name, content type or first line"""
+    filename = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if filename.endswith(('.vcf', '.vcard')) or 'vcard' in content_type:
+        return 'vcard'
+    if filename.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    return 'vcard' if first_line.lstrip('\ufeff').strip().upper() == 'BEGIN:VCARD' else 'csv'
+
+
+def read_contacts(stream, fmt=None, filename=None, content_type=None):
+    """Parse a text stream, detecting the format unless `fmt` is given"""
+    if fmt is None:
+        first_line = stream.readline()
+        fmt = detect_format(filename, content_type, first_line)
+        stream = _prepend(first_line, stream)
+    return parse_vcard(stream) if fmt == 'vcard' else parse_csv(stream)
+
+
+def _prepend(first_line, stream):
+    if first_line:
+        yield first_line
+    yield from stream
+
+
+def import_contacts(db, records, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Normalize and upsert (line_number, record) pairs.
+
+    Each batch is read and validated first and then written with one
+    executemany in its own short transaction, so the write lock is never
+    held while the upload is still arriving. Bad rows are skipped and
+    reported individually; a failed batch leaves earlier batches imported.
+    """
+    result = {'imported': 0, 'failed': 0, 'errors': []}
+    batch = []
+
+    def fail(line, error):
+        result['failed'] += 1
+        if len(result['errors']) < MAX_REPORTED_ERRORS:
+            result['errors'].append({'line': line, 'error': error})
+
+    for line, record in records:
+        try:
+            phone_number = normalize_number(record.get('phone_number'))
+        except ValueError as e:
+            fail(line, str(e))
+            continue
+        batch.append((phone_number,) + tuple(record.get(field) for field in FIELDS[1:]))
+        if len(batch) >= batch_size:
+            result['imported'] += db.upsert_contacts(batch)
+            batch = []
+    if batch:
+        result['imported'] += db.upsert_contacts(batch)
+    return result
@@ -1,110 +1,245 @@
+import asyncio
+import functools
+import os
+import re
 import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 
+from .call_archive import CallArchive
+from .leader import Leader
+from .metrics import metrics
+from .migrations import migrate
+from .number_rules import NumberRules
+from .phone_numbers import lookup_key, normalize_number
+from .profile_cache import ProfileCache
+
+# Connection tuning. WAL lets readers run alongside the single writer, and
+# synchronous=NORMAL is durable under WAL without an fsync on every commit.
+BUSY_TIMEOUT_MS = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 256))
+# Threads serving AsyncDatabase calls (each keeps its own connection)
+ASYNC_DB_WORKERS = int(os.getenv('DB_ASYNC_WORKERS', 4))
+
+# Words around each search hit returned in snippets
+SNIPPET_TOKENS = 12
+
+# Where archived call history goes (default: call_archive/ next to the database file)
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR')
+
+CALL_FIELDS = ("phone_number", "call_sid", "incoming_text", "ai_response", "timestamp",
+               "summary_text", "summary_audio_path", "summary_status")
+
+
+def fts_query(text):
+    """
+    Free text -> FTS5 query matching every word (the last one as a prefix).
+
+    Words are quoted, so punctuation or FTS operators typed by a user can't
+    cause a syntax error. Returns None when there is nothing to search for.
+    """
+    words = re.findall(r"\w+", text or '')
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
 class Database:
-    def __init__(self, db_path="ai_moses.db"):
+    def __init__(self, db_path="ai_moses.db", schema_version=None, create_tables=True, archive_dir=ARCHIVE_DIR):
         self.db_path = db_path
-        self._create_tables()
+        self.schema_version = schema_version
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._pid = os.getpid()
+        self.profile_cache = ProfileCache()
+        # Elects the one process per host that runs shared background work
+        self.leader = Leader(db_path + '.leader')
+        # Org and number-range profiles for numbers that are not contacts
+        self.number_rules = NumberRules(self)
+        # Old calls and recordings; reads below fall through to it transparently
+        self.archive = CallArchive(self, archive_dir or os.path.join(os.path.dirname(db_path), 'call_archive'))
+        if create_tables:
+            self.create_tables()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
 
     def _connect(self):
-        return sqlite3.connect(self.db_path)
+        """Return this thread's long-lived connection, opening it on first use"""
+        if self._pid != os.getpid():
+            # Forked worker: connections inherited from the parent are unsafe
+            self._local = threading.local()
+            self._connections = []
+            self._connections_lock = threading.Lock()
+            self._pid = os.getpid()
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run several statements as one unit of work.
 
-    def _create_tables(self):
+        Nested blocks join the outermost transaction, which commits once on
+        exit (or rolls back if an exception escapes).
+        """
         conn = self._connect()
-        c = conn.cursor()
-
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS contacts (
-                phone_number TEXT PRIMARY KEY,
-                name TEXT,
-                relationship TEXT,
-                tone TEXT,
-                topics TEXT
-            )
-        """)
+        if self._local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        self._local.depth += 1
+        try:
+            yield conn
+        except BaseException:
+            self._local.depth -= 1
+            if self._local.depth == 0:
+                conn.rollback()
+            raise
+        self._local.depth -= 1
+        if self._local.depth == 0:
+            conn.commit()
 
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS status (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                activity TEXT,
-                updated_at TEXT
-            )
-        """)
-
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS call_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                phone_number TEXT,
-                call_sid TEXT,
-                incoming_text TEXT,
-                ai_response TEXT,
-                summary_text TEXT,
-                summary_audio_path TEXT,
-                timestamp TEXT
-            )
-        """)
-
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS voice_recordings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                phone_number TEXT,
-                call_sid TEXT,
-                file_path TEXT,
-                duration REAL,
-                transcription TEXT,
-                timestamp TEXT
-            )
-        """)
+    def ping(self):
+        """Round-trip a trivial query on this thread's connection; returns the latency in seconds"""
+        start = time.perf_counter()
+        self._connect().execute("SELECT 1").fetchone()
+        return time.perf_counter() - start
+
+    def close(self):
+        """Close every connection this instance has opened"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
 
-        conn.commit()
-        conn.close()
+    def create_tables(self):
+        """Apply pending migrations; done on construction unless create_tables=False"""
+        return migrate(self, target=self.schema_version)
 
+    @metrics.timed('get_caller_profile')
     def get_caller_profile(self, phone_number):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT * FROM contacts WHERE phone_number = ?", (phone_number,))
+        """
+        Profile for a caller in any spelling of their number: the contact
+        with the same E.164 number, else the number rule covering it.
+        """
+        phone_number = lookup_key(phone_number)
+        # Rule changes from other processes invalidate cached profiles (checked every few seconds)
+        self.number_rules.refresh()
+        profile = self.profile_cache.get(phone_number)
+        if profile is not None:
+            return profile
+
+        # Prefer the normalized row over a legacy spelling of the same number
+        c = self._connect().execute("""
+            SELECT phone_number, name, relationship, tone, topics FROM contacts
+            WHERE phone_e164 = ?
+            ORDER BY phone_number = phone_e164 DESC
+            LIMIT 1
+        """, (phone_number,))
         row = c.fetchone()
-        conn.close()
 
         if not row:
-            return {
+            profile = {
                 "name": "Unknown Caller",
                 "relationship": "unknown",
                 "tone": "neutral",
                 "topics": ""
             }
+            rule = self.number_rules.match(phone_number)
+            if rule is not None:
+                pattern, rule_id = rule.pop('pattern'), rule.pop('id')
+                profile.update({field: value for field, value in rule.items() if value is not None},
+                               phone_number=phone_number, rule=pattern, rule_id=rule_id)
+                self.profile_cache.put(phone_number, profile)
+                return profile
 
-        return {
+            self.profile_cache.put(phone_number, profile, known=False)
+            return profile
+
+        profile = {
             "phone_number": row[0],
             "name": row[1],
             "relationship": row[2],
             "tone": row[3],
             "topics": row[4],
         }
+        self.profile_cache.put(phone_number, profile)
+        return profile
 
     def add_caller_profile(self, phone_number, name, relationship, tone, topics):
-        conn = self._connect()
-        c = conn.cursor()
-
         try:
-            c.execute("""
-                INSERT OR REPLACE INTO contacts (phone_number, name, relationship, tone, topics)
-                VALUES (?, ?, ?, ?, ?)
-            """, (phone_number, name, relationship, tone, topics))
-
-            conn.commit()
+            phone_number = normalize_number(phone_number)
+            with self.transaction() as conn:
+                conn.execute("""
+                    INSERT OR REPLACE INTO contacts (phone_number, phone_e164, name, relationship, tone, topics)
+                    VALUES (?1, ?1, ?2, ?3, ?4, ?5)
+                """, (phone_number, name, relationship, tone, topics))
             return True
         except Exception:
             return False
         finally:
-            conn.close()
+            self.profile_cache.invalidate(lookup_key(phone_number))
 
-    def get_all_contacts(self):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT * FROM contacts")
+    def upsert_contacts(self, rows):
+        """
+        Insert or update (phone_number, name, relationship, tone, topics)
+        rows, numbers already normalized, with one executemany. Empty fields
+        keep the stored value. Returns the number of rows written.
+        """
+        try:
+            with self.transaction() as conn:
+                conn.executemany("""
+                    INSERT INTO contacts (phone_number, phone_e164, name, relationship, tone, topics)
+                    VALUES (?1, ?1, ?2, ?3, ?4, ?5)
+                    ON CONFLICT (phone_number) DO UPDATE SET
+                        name = COALESCE(excluded.name, contacts.name),
+                        relationship = COALESCE(excluded.relationship, contacts.relationship),
+                        tone = COALESCE(excluded.tone, contacts.tone),
+                        topics = COALESCE(excluded.topics, contacts.topics)
+                """, rows)
+            return len(rows)
+        finally:
+            self.profile_cache.invalidate()
+
+    def get_all_contacts(self, after=None, limit=None):
+        """Contacts ordered by phone_number, optionally the page after `after`"""
+        # Conditions are added only when used so SQLite can seek on the key
+        where, params = "", []
+        if after is not None:
+            where, params = "WHERE phone_number > ?", [after]
+        c = self._connect().execute(f"""
+            SELECT phone_number, name, relationship, tone, topics
+            FROM contacts
+            {where}
+            ORDER BY phone_number
+            LIMIT ?
+        """, params + [-1 if limit is None else limit])
         rows = c.fetchall()
-        conn.close()
 
         return [
             {
@@ -117,106 +252,358 @@ class Database:
             for row in rows
         ]
 
+    def get_contact_rules(self, since_rev=0):
+        """Number rules changed after `since_rev` (deleted ones included), oldest change first"""
+        rows = self._connect().execute("""
+            SELECT id, pattern, name, relationship, tone, topics, rev, deleted
+            FROM contact_rules WHERE rev > ? ORDER BY rev
+        """, (since_rev,)).fetchall()
+
+        return [
+            {
+                "id": row[0],
+                "pattern": row[1],
+                "name": row[2],
+                "relationship": row[3],
+                "tone": row[4],
+                "topics": row[5],
+                "rev": row[6],
+                "deleted": bool(row[7])
+            }
+            for row in rows
+        ]
+
+    def upsert_contact_rules(self, rows):
+        """Insert or replace (pattern, name, relationship, tone, topics) rows, each with a new rev"""
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            rev = conn.execute("SELECT COALESCE(MAX(rev), 0) FROM contact_rules").fetchone()[0]
+            conn.executemany("""
+                INSERT INTO contact_rules (pattern, name, relationship, tone, topics, rev, deleted, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+                ON CONFLICT (pattern) DO UPDATE SET
+                    name = excluded.name,
+                    relationship = excluded.relationship,
+                    tone = excluded.tone,
+                    topics = excluded.topics,
+                    rev = excluded.rev,
+                    deleted = 0,
+                    updated_at = excluded.updated_at
+            """, [tuple(row) + (rev + i, now) for i, row in enumerate(rows, 1)])
+        return len(rows)
+
+    def delete_contact_rule(self, rule_id):
+        """Soft-delete a rule so other processes see the removal as a change"""
+        with self.transaction() as conn:
+            return conn.execute("""
+                UPDATE contact_rules
+                SET deleted = 1, rev = (SELECT MAX(rev) FROM contact_rules) + 1, updated_at = ?
+                WHERE id = ? AND deleted = 0
+            """, (datetime.now().isoformat(), rule_id)).rowcount > 0
+
+    def get_greetings(self, since_rev=0):
+        """Pre-rendered greetings written after `since_rev`, oldest first"""
+        rows = self._connect().execute("""
+            SELECT key, name, relationship, tone, activity, text, audio_filename, rendered_at, rev
+            FROM greetings WHERE rev > ? ORDER BY rev
+        """, (since_rev,)).fetchall()
+
+        return [
+            {
+                "key": row[0],
+                "fingerprint": (row[1], row[2], row[3], row[4]),
+                "text": row[5],
+                "audio_filename": row[6],
+                "rendered_at": row[7],
+                "rev": row[8]
+            }
+            for row in rows
+        ]
+
+    def save_greeting(self, key, fingerprint, text, audio_filename):
+        """Store the greeting for `key` under the next rev; fingerprint is (name, relationship, tone, activity)"""
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            rev = conn.execute("SELECT COALESCE(MAX(rev), 0) + 1 FROM greetings").fetchone()[0]
+            conn.execute("""
+                INSERT OR REPLACE INTO greetings
+                    (key, name, relationship, tone, activity, text, audio_filename, rendered_at, rev)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key,) + tuple(fingerprint) + (text, audio_filename, now, rev))
+        return rev
+
+    def get_stale_greetings(self, activity):
+        """
+        Contacts and number rules whose stored greeting is missing or was
+        rendered from other details or another activity, as (key, profile).
+        Rule profiles get the same defaults as get_caller_profile().
+        """
+        rows = self._connect().execute("""
+            SELECT c.phone_number, c.name, c.relationship, c.tone
+            FROM contacts c LEFT JOIN greetings g ON g.key = c.phone_number
+            WHERE g.key IS NULL OR g.activity IS NOT ?1 OR g.name IS NOT c.name
+               OR g.relationship IS NOT c.relationship OR g.tone IS NOT c.tone
+            UNION ALL
+            SELECT r.key, r.name, r.relationship, r.tone
+            FROM (
+                SELECT 'rule:' || id AS key, COALESCE(name, 'Unknown Caller') AS name,
+                       COALESCE(relationship, 'unknown') AS relationship, COALESCE(tone, 'neutral') AS tone
+                FROM contact_rules WHERE deleted = 0
+            ) r LEFT JOIN greetings g ON g.key = r.key
+            WHERE g.key IS NULL OR g.activity IS NOT ?1 OR g.name IS NOT r.name
+               OR g.relationship IS NOT r.relationship OR g.tone IS NOT r.tone
+        """, (activity,)).fetchall()
+
+        return [(row[0], {"name": row[1], "relationship": row[2], "tone": row[3]}) for row in rows]
+
     def get_current_status(self):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("SELECT activity, updated_at FROM status ORDER BY id DESC LIMIT 1")
+        c = self._connect().execute("SELECT activity, updated_at, override_until FROM current_status WHERE id = 1")
         row = c.fetchone()
-        conn.close()
 
         if not row:
-            return {"activity": "Available", "updated_at": None}
+            return {"activity": "Available", "updated_at": None, "override_until": None}
 
-        return {"activity": row[0], "updated_at": row[1]}
+        return {"activity": row[0], "updated_at": row[1], "override_until": row[2]}
 
-    def update_status(self, activity):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO status (activity, updated_at)
-            VALUES (?, ?)
-        """, (activity, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
-        return True
+    def update_status(self, activity, override_until=None):
+        """Set the activity; it holds over scheduled blocks until `override_until` (ISO, None: indefinitely)"""
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            row = conn.execute("SELECT activity FROM current_status WHERE id = 1").fetchone()
+
+            # Same activity again: keep the open interval, just refresh the register
+            if not row or row[0] != activity:
+                conn.execute("UPDATE status_history SET ended_at = ? WHERE ended_at IS NULL", (now,))
+                conn.execute("""
+                    INSERT INTO status_history (activity, started_at, ended_at)
+                    VALUES (?, ?, NULL)
+                """, (activity, now))
 
+            conn.execute("""
+                INSERT OR REPLACE INTO current_status (id, activity, updated_at, override_until)
+                VALUES (1, ?, ?, ?)
+            """, (activity, now, override_until))
+        return {"activity": activity, "updated_at": now, "override_until": override_until}
+
+    def get_status_schedule(self):
+        rows = self._connect().execute("""
+            SELECT id, activity, starts_at, ends_at, rrule, exdates, source
+            FROM status_schedule ORDER BY id
+        """).fetchall()
+
+        return [
+            {
+                "id": row[0],
+                "activity": row[1],
+                "starts_at": row[2],
+                "ends_at": row[3],
+                "rrule": row[4],
+                "exdates": row[5].split(',') if row[5] else [],
+                "source": row[6]
+            }
+            for row in rows
+        ]
+
+    def status_schedule_version(self):
+        """Changes whenever a block is added or removed (ids are never reused)"""
+        return tuple(self._connect().execute("SELECT MAX(id), COUNT(*) FROM status_schedule").fetchone())
+
+    def add_status_blocks(self, rows, replace=False):
+        """
+        Insert (activity, starts_at, ends_at, rrule, exdates, source) rows,
+        first deleting every block if `replace`. An explicit status set to
+        hold indefinitely is ended, so the imported schedule takes over.
+        """
+        now = datetime.now().isoformat()
+        with self.transaction() as conn:
+            if replace:
+                conn.execute("DELETE FROM status_schedule")
+            conn.executemany("""
+                INSERT INTO status_schedule (activity, starts_at, ends_at, rrule, exdates, source, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [tuple(row) + (now,) for row in rows])
+            conn.execute("UPDATE current_status SET override_until = ? WHERE override_until IS NULL", (now,))
+        return len(rows)
+
+    def delete_status_block(self, block_id):
+        with self.transaction() as conn:
+            return conn.execute("DELETE FROM status_schedule WHERE id = ?", (block_id,)).rowcount > 0
+
+    def get_status_history(self, start=None, end=None, limit=None):
+        """Status intervals overlapping [start, end] (ISO timestamps), oldest first"""
+        query = "SELECT activity, started_at, ended_at FROM status_history WHERE 1 = 1"
+        params = []
+        if end is not None:
+            query += " AND started_at <= ?"
+            params.append(end)
+        if start is not None:
+            query += " AND (ended_at IS NULL OR ended_at >= ?)"
+            params.append(start)
+        query += " ORDER BY started_at"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+
+        rows = self._connect().execute(query, params).fetchall()
+
+        return [
+            {
+                "activity": row[0],
+                "started_at": row[1],
+                "ended_at": row[2]
+            }
+            for row in rows
+        ]
+
+    def prune_status_history(self, before):
+        """Delete closed intervals that ended before `before`"""
+        with self.transaction() as conn:
+            c = conn.execute("""
+                DELETE FROM status_history
+                WHERE ended_at IS NOT NULL AND ended_at < ?
+            """, (before,))
+        return c.rowcount
+
+    def downsample_status_history(self, min_seconds, before=None):
+        """
+        Fold closed intervals shorter than `min_seconds` into the interval
+        before them, then merge neighbours that end up with the same activity.
+        Intervals stay contiguous, so the timeline keeps no gaps.
+        """
+        query = "SELECT id, activity, started_at, ended_at FROM status_history WHERE ended_at IS NOT NULL"
+        params = []
+        if before is not None:
+            query += " AND ended_at < ?"
+            params.append(before)
+        query += " ORDER BY started_at"
+
+        with self.transaction() as conn:
+            rows = conn.execute(query, params).fetchall()
+            kept = []
+            removed = []
+            for row_id, activity, started_at, ended_at in rows:
+                duration = (datetime.fromisoformat(ended_at) - datetime.fromisoformat(started_at)).total_seconds()
+                if kept and (duration < min_seconds or kept[-1][1] == activity):
+                    kept[-1][3] = ended_at
+                    removed.append((row_id,))
+                else:
+                    kept.append([row_id, activity, started_at, ended_at])
+
+            conn.executemany("DELETE FROM status_history WHERE id = ?", removed)
+            conn.executemany(
+                "UPDATE status_history SET ended_at = ? WHERE id = ?",
+                [(ended_at, row_id) for row_id, _, _, ended_at in kept]
+            )
+        return len(removed)
+
+    @metrics.timed('log_call')
     def log_call(self, phone_number, call_sid, incoming_text, ai_response):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO call_history (phone_number, call_sid, incoming_text, ai_response, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        """, (phone_number, call_sid, incoming_text, ai_response, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute("""
+                INSERT INTO call_history (phone_number, call_sid, incoming_text, ai_response, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (call_sid) DO UPDATE SET
+                    incoming_text = excluded.incoming_text,
+                    ai_response = excluded.ai_response
+            """, (phone_number, call_sid, incoming_text, ai_response, datetime.now().isoformat()))
 
     def update_call_summary(self, call_sid, summary_text, summary_audio_path):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            UPDATE call_history 
-            SET summary_text = ?, summary_audio_path = ?
+        with self.transaction() as conn:
+            conn.execute("""
+                UPDATE call_history 
+                SET summary_text = ?, summary_audio_path = ?, summary_status = 'done'
+                WHERE call_sid = ?
+            """, (summary_text, summary_audio_path, call_sid))
+
+    def set_summary_status(self, call_sid, summary_status):
+        with self.transaction() as conn:
+            conn.execute("""
+                UPDATE call_history SET summary_status = ? WHERE call_sid = ?
+            """, (summary_status, call_sid))
+
+    def get_call(self, call_sid):
+        c = self._connect().execute("""
+            SELECT phone_number, call_sid, incoming_text, ai_response, timestamp, summary_text, summary_audio_path, summary_status
+            FROM call_history
             WHERE call_sid = ?
-        """, (summary_text, summary_audio_path, call_sid))
-        conn.commit()
-        conn.close()
+        """, (call_sid,))
+        row = c.fetchone()
 
-    def get_call_history(self, phone_number, limit=10):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            SELECT call_sid, incoming_text, ai_response, timestamp, summary_text, summary_audio_path
+        if not row:
+            archived = self.archive.get_call(call_sid)
+            return {field: archived[field] for field in CALL_FIELDS} if archived else None
+
+        return {
+            "phone_number": row[0],
+            "call_sid": row[1],
+            "incoming_text": row[2],
+            "ai_response": row[3],
+            "timestamp": row[4],
+            "summary_text": row[5],
+            "summary_audio_path": row[6],
+            "summary_status": row[7]
+        }
+
+    def get_call_history(self, phone_number, limit=10, before_id=None):
+        """A contact's calls, newest first (archived ones included); `before_id` continues from a previous page"""
+        where, params = "phone_number = ?", [phone_number]
+        if before_id is not None:
+            where, params = where + " AND id < ?", params + [before_id]
+        c = self._connect().execute(f"""
+            SELECT call_sid, incoming_text, ai_response, timestamp, summary_text, summary_audio_path, summary_status, id
             FROM call_history
-            WHERE phone_number = ?
+            WHERE {where}
             ORDER BY id DESC
             LIMIT ?
-        """, (phone_number, limit))
+        """, params + [limit])
         rows = c.fetchall()
-        conn.close()
 
-        return [
+        calls = [
             {
                 "call_sid": row[0],
                 "incoming_text": row[1],
                 "ai_response": row[2],
                 "timestamp": row[3],
                 "summary_text": row[4],
-                "summary_audio_path": row[5]
+                "summary_audio_path": row[5],
+                "summary_status": row[6],
+                "id": row[7]
             }
             for row in rows
         ]
+        return self.archive.page('call', calls, limit, CALL_FIELDS[1:] + ("id",),
+                                 before_id=before_id, phone_number=phone_number)
 
     def add_voice_recording(self, phone_number, call_sid, file_path, duration, transcription):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO voice_recordings (phone_number, call_sid, file_path, duration, transcription, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (
-            phone_number,
-            call_sid,
-            file_path,
-            duration,
-            transcription,
-            datetime.now().isoformat()
-        ))
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute("""
+                INSERT INTO voice_recordings (phone_number, call_sid, file_path, duration, transcription, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (
+                phone_number,
+                call_sid,
+                file_path,
+                duration,
+                transcription,
+                datetime.now().isoformat()
+            ))
         return True
 
-    def get_recent_calls(self, limit=10):
-        conn = self._connect()
-        c = conn.cursor()
-        c.execute("""
-            SELECT phone_number, call_sid, incoming_text, ai_response, timestamp, summary_text, summary_audio_path
+    def get_recent_calls(self, limit=10, before_id=None):
+        """All calls, newest first (archived ones included); `before_id` continues from a previous page"""
+        where, params = "", []
+        if before_id is not None:
+            where, params = "WHERE id < ?", [before_id]
+        c = self._connect().execute(f"""
+            SELECT phone_number, call_sid, incoming_text, ai_response, timestamp, summary_text, summary_audio_path, summary_status, id
             FROM call_history
+            {where}
             ORDER BY id DESC
             LIMIT ?
-        """, (limit,))
+        """, params + [limit])
         rows = c.fetchall()
-        conn.close()
 
-        return [
+        calls = [
             {
                 "phone_number": row[0],
                 "call_sid": row[1],
@@ -224,7 +611,126 @@ class Database:
                 "ai_response": row[3],
                 "timestamp": row[4],
                 "summary_text": row[5],
-                "summary_audio_path": row[6]
+                "summary_audio_path": row[6],
+                "summary_status": row[7],
+                "id": row[8]
+            }
+            for row in rows
+        ]
+        return self.archive.page('call', calls, limit, CALL_FIELDS + ("id",), before_id=before_id)
+
+    def search(self, query, phone_number=None, start=None, end=None, kind=None, limit=20, offset=0):
+        """
+        Ranked full-text search over call text, summaries and recording
+        transcriptions, hot and archived alike.
+
+        `start`/`end` bound the ISO timestamp (inclusive / exclusive) and
+        `kind` restricts results to 'call' or 'recording'. Results carry a
+        highlighted snippet; best matches come first (lower rank is better).
+        Archived results are marked "archived"; their snippets are rebuilt
+        from the archive files.
+        """
+        match = fts_query(query)
+        if match is None:
+            return []
+
+        filters, filter_params = "", []
+        for clause, value in (("phone_number = ?", phone_number),
+                              ("timestamp >= ?", start),
+                              ("timestamp < ?", end)):
+            if value is not None:
+                filters += f" AND src.{clause}"
+                filter_params.append(value)
+
+        selects, params = [], []
+        if kind in (None, 'call'):
+            # Summaries are written to be skimmed; weight them above raw turns
+            selects.append(f"""
+                SELECT 'call' AS kind, src.id, src.call_sid, src.phone_number, src.timestamp,
+                       snippet(call_history_fts, -1, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet,
+                       bm25(call_history_fts, 1.0, 1.0, 2.0) AS rank, 0 AS archived
+                FROM call_history_fts
+                JOIN call_history src ON src.id = call_history_fts.rowid
+                WHERE call_history_fts MATCH ?{filters}
+            """)
+            # The archived index is contentless: no snippet() there
+            selects.append(f"""
+                SELECT 'call' AS kind, src.id, src.call_sid, src.phone_number, src.timestamp,
+                       NULL AS snippet, bm25(archived_calls_fts, 1.0, 1.0, 2.0) AS rank, 1 AS archived
+                FROM archived_calls_fts
+                JOIN archived_rows src ON src.kind = 'call' AND src.id = archived_calls_fts.rowid
+                WHERE archived_calls_fts MATCH ?{filters}
+            """)
+            params += [match] + filter_params + [match] + filter_params
+        if kind in (None, 'recording'):
+            selects.append(f"""
+                SELECT 'recording' AS kind, src.id, src.call_sid, src.phone_number, src.timestamp,
+                       snippet(voice_recordings_fts, 0, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet,
+                       bm25(voice_recordings_fts) AS rank, 0 AS archived
+                FROM voice_recordings_fts
+                JOIN voice_recordings src ON src.id = voice_recordings_fts.rowid
+                WHERE voice_recordings_fts MATCH ?{filters}
+            """)
+            selects.append(f"""
+                SELECT 'recording' AS kind, src.id, src.call_sid, src.phone_number, src.timestamp,
+                       NULL AS snippet, bm25(archived_recordings_fts) AS rank, 1 AS archived
+                FROM archived_recordings_fts
+                JOIN archived_rows src ON src.kind = 'recording' AND src.id = archived_recordings_fts.rowid
+                WHERE archived_recordings_fts MATCH ?{filters}
+            """)
+            params += [match] + filter_params + [match] + filter_params
+        if not selects:
+            raise ValueError(f"unknown result kind: {kind!r}")
+
+        c = self._connect().execute(f"""
+            SELECT kind, id, call_sid, phone_number, timestamp, snippet, rank, archived
+            FROM ({' UNION ALL '.join(selects)})
+            ORDER BY rank, timestamp DESC, id DESC
+            LIMIT ? OFFSET ?
+        """, params + [limit, offset])
+        rows = c.fetchall()
+
+        words = re.findall(r"\w+", query)
+        return [
+            {
+                "kind": row[0],
+                "id": row[1],
+                "call_sid": row[2],
+                "phone_number": row[3],
+                "timestamp": row[4],
+                "snippet": self.archive.snippet(row[0], row[1], words, SNIPPET_TOKENS) if row[7] else row[5],
+                "rank": row[6],
+                "archived": bool(row[7])
             }
             for row in rows
-        ]
\ No newline at end of file
+        ]
+
+
+class AsyncDatabase:
+    """
+    Awaitable view of a Database for code running on an event loop.
+
+    Every Database method is available as a coroutine with the same
+    arguments, e.g. `await adb.log_call(...)`. sqlite3 has no async API, so
+    calls run on a small dedicated thread pool: the loop never blocks on a
+    query, and the pool (not the number of waiting requests) bounds how many
+    connections are open. run(fn, *args) does the same for any other
+    blocking helper, such as StatusManager.get_current_status.
+    """
+
+    def __init__(self, db, workers=ASYNC_DB_WORKERS):
+        self.db = db
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db-async')
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, metrics.carry(functools.partial(fn, *args, **kwargs)))
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+        return call
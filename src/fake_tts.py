@@ -0,0 +1,58 @@
+"""
+Fake TTS Module
+Offline stand-in for ElevenLabs streaming synthesis, for local latency measurements
+"""
+
+import asyncio
+import os
+import time
+
+# Roughly one 64 kbps mp3 frame group per chunk
+CHUNK_BYTES = 4096
+
+
+class FakeTTS:
+    """
+    Yield deterministic mp3-shaped bytes with configurable latency.
+
+    first_chunk_delay: seconds before the first chunk (provider time-to-first-byte)
+    chunk_delay: seconds between subsequent chunks
+    bytes_per_char: output size per character of input text
+    """
+
+    def __init__(self, first_chunk_delay=None, chunk_delay=None, bytes_per_char=None):
+        self.first_chunk_delay = float(first_chunk_delay if first_chunk_delay is not None
+                                       else os.getenv('FAKE_TTS_FIRST_CHUNK_DELAY', 0.3))
+        self.chunk_delay = float(chunk_delay if chunk_delay is not None
+                                 else os.getenv('FAKE_TTS_CHUNK_DELAY', 0.05))
+        self.bytes_per_char = int(bytes_per_char if bytes_per_char is not None
+                                  else os.getenv('FAKE_TTS_BYTES_PER_CHAR', 200))
+
+    def stream(self, text, output_format=None):
+        time.sleep(self.first_chunk_delay)
+        for i, chunk in enumerate(self._chunks(text, output_format)):
+            if i:
+                time.sleep(self.chunk_delay)
+            yield chunk
+
+    async def astream(self, text, output_format=None):
+        """stream() for the event loop: same bytes, without blocking it"""
+        await asyncio.sleep(self.first_chunk_delay)
+        for i, chunk in enumerate(self._chunks(text, output_format)):
+            if i:
+                await asyncio.sleep(self.chunk_delay)
+            yield chunk
+
+    def _chunks(self, text, output_format):
+        total = max(len(text) * self.bytes_per_char, CHUNK_BYTES)
+        if output_format and output_format.startswith('ulaw'):
+            # Low-level μ-law tone so the audio is audible but quiet
+            pattern = bytes([0xF0, 0xE8, 0xF0, 0xFF, 0x70, 0x68, 0x70, 0x7F]) * (CHUNK_BYTES // 8)
+        else:
+            # MPEG-1 Layer III frame sync header followed by filler
+            pattern = b'\xff\xfb\x90\x64' + bytes(CHUNK_BYTES)
+        sent = 0
+        while sent < total:
+            size = min(CHUNK_BYTES, total - sent)
+            sent += size
+            yield pattern[:size]
@@ -0,0 +1,237 @@
+"""
+Greeting Pool Module
+Pre-renders greeting text and audio per contact so answering a call is a lookup
+"""
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .resilience import Guard
+from .voice_agent import FALLBACK_RESPONSE
+
+GREETING_WORKERS = int(os.getenv('GREETING_POOL_WORKERS', 4))
+GREETING_POOL_ENABLED = os.getenv('GREETING_POOL_ENABLED', '1') == '1'
+# How often workers pick up greetings rendered elsewhere, and the rendering
+# process looks for contacts, rules or a status that need new ones
+GREETING_REFRESH_SECONDS = float(os.getenv('GREETING_POOL_REFRESH_SECONDS', 5))
+
+# Key used for the generic unknown-caller variant
+UNKNOWN = ''
+
+
+def fingerprint(caller, activity):
+    """Everything a greeting depends on; a changed fingerprint means a stale entry"""
+    return (caller.get('name'), caller.get('relationship'), caller.get('tone'), activity)
+
+
+def greeting_key(caller):
+    """Pool key for a caller profile: its number rule, the contact's number, or UNKNOWN"""
+    if caller.get('rule_id') is not None:
+        return f"rule:{caller['rule_id']}"
+    return caller.get('phone_number') or UNKNOWN
+
+
+class GreetingPool:
+    """
+    Greeting text + audio per contact, per number rule and for unknown
+    callers, for the current status.
+
+    One process renders: the host's leader (db.leader). Its refresh_all()
+    asks the database which contacts and rules have no greeting for their
+    current details and status and renders only those, so a change is
+    rendered once, not once per worker. It runs on status changes and every
+    `refresh_seconds`, which also catches changes made in other workers.
+    Renders use their own circuit breakers, so a backlog of them cannot
+    open the breakers live calls depend on, and each bumps a generation
+    counter so renders overtaken by a newer change are dropped.
+
+    Results go to the greetings table (audio to the shared audio
+    directory); every process mirrors the table in memory by applying rows
+    past the last rev it has seen. lookup() only returns entries whose
+    inputs still match the caller and status at call time; anything else is
+    a miss and the caller falls back to live generation.
+    """
+
+    def __init__(self, db, voice_agent, status_manager, audio_dir,
+                 workers=GREETING_WORKERS, enabled=GREETING_POOL_ENABLED,
+                 refresh_seconds=GREETING_REFRESH_SECONDS):
+        self.enabled = enabled
+        self.db = db
+        self.voice_agent = voice_agent
+        self.status_manager = status_manager
+        self.audio_dir = audio_dir
+        self.refresh_seconds = refresh_seconds
+        self.llm_guard = Guard('openai-greetings')
+        self.tts_guard = Guard('elevenlabs-greetings')
+        self._entries = {}
+        self._rev = 0
+        self._loaded_at = None
+        self._generations = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='greeting')
+        self._thread = None
+        self._stop = threading.Event()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def load(self, force=False):
+        """Apply greetings stored since the last load; returns how many changed"""
+        if not force and self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return 0
+        rows = self.db.get_greetings(since_rev=self._rev)
+        with self._lock:
+            for row in rows:
+                self._entries[row.pop('key')] = row
+                self._rev = max(self._rev, row.pop('rev'))
+            self._loaded_at = time.monotonic()
+        return len(rows)
+
+    def lookup(self, caller, activity):
+        """Pre-rendered greeting for this caller, or None"""
+        if not self.enabled:
+            return None
+        self.load()
+        with self._lock:
+            entry = self._entries.get(greeting_key(caller))
+            if entry is None:
+                self.misses += 1
+            elif entry['fingerprint'] != fingerprint(caller, activity):
+                self.stale += 1
+                entry = None
+            else:
+                self.hits += 1
+        return entry
+
+    def fallback(self, caller, activity):
+        """
+        Best pre-rendered greeting when live generation cannot answer in time:
+        the caller's own entry even if their details changed since it was
+        rendered, else the unknown-caller one, as long as it was rendered for
+        the current status. None if there is neither.
+        """
+        if not self.enabled:
+            return None
+        self.load()
+        with self._lock:
+            for candidate in (greeting_key(caller), UNKNOWN):
+                entry = self._entries.get(candidate)
+                if entry is not None and entry['fingerprint'][-1] == activity:
+                    return entry
+        return None
+
+    def refresh_all(self):
+        """
+        In the rendering process, render every greeting that is missing or
+        stale for the current status; elsewhere a no-op. Returns how many
+        renders were queued.
+        """
+        if not self.enabled or not self.db.leader.held():
+            return 0
+        activity = self.status_manager.get_current_status().get('activity')
+        self.load(force=True)
+        targets = self.db.get_stale_greetings(activity)
+        caller = self.db.get_caller_profile(None)
+        with self._lock:
+            entry = self._entries.get(UNKNOWN)
+        if entry is None or entry['fingerprint'] != fingerprint(caller, activity):
+            targets.append((UNKNOWN, caller))
+        return sum(self._schedule(key, caller, activity) for key, caller in targets)
+
+    def refresh_contact(self, phone_number):
+        """Render one caller's greeting now if this is the rendering process"""
+        if not self.enabled or not self.db.leader.held():
+            return
+        activity = self.status_manager.get_current_status().get('activity')
+        caller = self.db.get_caller_profile(phone_number)
+        self._schedule(greeting_key(caller), caller, activity)
+
+    def _schedule(self, key, caller, activity):
+        fp = fingerprint(caller, activity)
+        with self._lock:
+            if self._pending.get(key) == fp:
+                return False
+            generation = self._generations.get(key, 0) + 1
+            self._generations[key] = generation
+            self._pending[key] = fp
+        self._executor.submit(self._render, key, caller, activity, generation)
+        return True
+
+    def _is_current(self, key, generation):
+        with self._lock:
+            return self._generations.get(key) == generation
+
+    def _render(self, key, caller, activity, generation):
+        try:
+            if not self._is_current(key, generation):
+                return
+
+            text = self.voice_agent.generate_response(
+                caller_name=caller.get('name'),
+                caller_relationship=caller.get('relationship'),
+                caller_tone=caller.get('tone'),
+                status=activity,
+                guard=self.llm_guard
+            )
+            if text == FALLBACK_RESPONSE:
+                # Provider error; the next refresh finds the entry still stale
+                return
+
+            fp = fingerprint(caller, activity)
+            audio_filename = None
+            if self.voice_agent.can_speak and self._is_current(key, generation):
+                # Named by content: a re-render never reuses a name, so clips can be cached forever
+                digest = hashlib.sha256(repr((key,) + fp + (text,)).encode('utf-8')).hexdigest()[:16]
+                audio_filename = f"greeting_{digest}.mp3"
+                os.makedirs(self.audio_dir, exist_ok=True)
+                if not self.voice_agent.text_to_speech(text, os.path.join(self.audio_dir, audio_filename),
+                                                       guard=self.tts_guard):
+                    audio_filename = None
+
+            if self._is_current(key, generation):
+                self.db.save_greeting(key, fp, text, audio_filename)
+        except Exception as e:
+            print(f"Error rendering greeting for {key or 'unknown caller'}: {e}")
+        finally:
+            with self._lock:
+                if self._generations.get(key) == generation:
+                    self._pending.pop(key, None)
+
+    # -- background refresh ---------------------------------------------------
+
+    def start(self):
+        if not self.enabled:
+            return
+        self._thread = threading.Thread(target=self._run, name='greeting-pool', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.load(force=True)
+                self.refresh_all()
+            except Exception as e:
+                print(f"Greeting pool refresh error: {e}")
+            self._stop.wait(self.refresh_seconds)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                'entries': len(self._entries),
+                'rendering': len(self._pending),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,265 @@
+"""
+HTTP Pool Module
+One tunable keep-alive connection pool per process, shared by the OpenAI and ElevenLabs clients
+"""
+
+import asyncio
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .metrics import metrics
+
+# Pool size, and how many idle connections are kept open (and for how long)
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', 100))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', 120))
+# Opening a connection fails fast; reads wait for slow providers (per read, not in total)
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 3))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+# HTTP/2: on, off, or auto (on when the h2 package is installed)
+HTTP2 = os.getenv('HTTP2', 'auto')
+# Idle providers are pinged this often so their connections stay open (0 disables),
+# over this many connections at once
+HTTP_KEEPALIVE_PING_SECONDS = float(os.getenv('HTTP_KEEPALIVE_PING_SECONDS', 45))
+HTTP_WARM_CONNECTIONS = int(os.getenv('HTTP_WARM_CONNECTIONS', 2))
+
+
+def _http2_enabled():
+    if HTTP2 == 'auto':
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            return False
+        return True
+    return HTTP2 == '1' or HTTP2 == 'on'
+
+
+class _Tracer:
+    """httpcore trace callback for one request: notices when it had to open a connection"""
+
+    def __init__(self, pool, name, ping):
+        self.pool = pool
+        self.name = name
+        self.ping = ping
+        self.connect_started = None
+        self.connect_seconds = None
+        self.new_connection = False
+
+    def __call__(self, event, info):
+        if event == 'connection.connect_tcp.started':
+            self.connect_started = time.perf_counter()
+            self.new_connection = True
+        elif event in ('connection.connect_tcp.complete', 'connection.start_tls.complete'):
+            # Both fire for https; the later one covers the TLS handshake too
+            self.connect_seconds = time.perf_counter() - self.connect_started
+        elif event.endswith('send_request_headers.started'):
+            self.pool._sent(self)
+
+    async def atrace(self, event, info):
+        self(event, info)
+
+
+class HTTPPool:
+    """
+    Keep-alive connections to the providers, shared per process.
+
+    client() / async_client() hand the same httpx pool to every SDK client
+    (the OpenAI and ElevenLabs SDKs both accept one), so a connection opened
+    for one call is reused by the next instead of paying DNS, TCP and TLS
+    again. Every request is capped at HTTP_CONNECT_TIMEOUT for connecting,
+    whatever single timeout the SDK passes, and counted per provider as
+    using a new or reused connection. warm() opens connections ahead of the
+    first call and start_keepalive() pings idle providers so the pool does
+    not go cold between calls.
+    """
+
+    def __init__(self):
+        self._providers = {}
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._client = None
+        self._async_client = None
+        self._keepalive = None
+        self._stop = threading.Event()
+
+    def register(self, name, base_url):
+        """Attribute requests to `base_url`'s host to provider `name` and keep it warm"""
+        with self._lock:
+            self._providers[urlsplit(base_url).netloc] = (name, base_url)
+
+    def timeout(self, read):
+        import httpx
+        return httpx.Timeout(read, connect=HTTP_CONNECT_TIMEOUT)
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Forked worker: pooled sockets belong to the parent
+            self._client = None
+            self._async_client = None
+            self._keepalive = None
+            self._pid = os.getpid()
+
+    def client(self):
+        self._check_fork()
+        if self._client is None:
+            import httpx
+            with self._lock:
+                if self._client is None:
+                    self._client = httpx.Client(
+                        limits=self._limits(), http2=_http2_enabled(), timeout=self.timeout(HTTP_READ_TIMEOUT),
+                        event_hooks={'request': [self._on_request]}
+                    )
+        return self._client
+
+    def async_client(self):
+        """httpx.AsyncClient for the serving event loop (connections belong to that loop)"""
+        self._check_fork()
+        if self._async_client is None:
+            import httpx
+
+            async def on_request(request):
+                self._on_request(request, trace='atrace')
+
+            self._async_client = httpx.AsyncClient(
+                limits=self._limits(), http2=_http2_enabled(), timeout=self.timeout(HTTP_READ_TIMEOUT),
+                event_hooks={'request': [on_request]}
+            )
+        return self._async_client
+
+    # -- per-request bookkeeping ---------------------------------------------
+
+    def _provider(self, netloc):
+        entry = self._providers.get(netloc)
+        return entry[0] if entry else 'other'
+
+    def _on_request(self, request, trace=None):
+        timeout = request.extensions.get('timeout')
+        if timeout is not None:
+            connect = timeout.get('connect')
+            request.extensions['timeout'] = dict(
+                timeout, connect=HTTP_CONNECT_TIMEOUT if connect is None else min(connect, HTTP_CONNECT_TIMEOUT)
+            )
+        name = self._provider(request.url.netloc.decode('ascii'))
+        tracer = _Tracer(self, name, request.extensions.get('keepalive_ping', False))
+        request.extensions['trace'] = getattr(tracer, trace) if trace else tracer
+
+    def _sent(self, tracer):
+        if tracer.new_connection:
+            metrics.inc('http_connections_opened_total', dependency=tracer.name,
+                        reason='ping' if tracer.ping else 'request')
+            if tracer.connect_seconds is not None:
+                metrics.observe('http_connect_seconds', tracer.connect_seconds, dependency=tracer.name)
+        if not tracer.ping:
+            metrics.inc('http_requests_total', dependency=tracer.name,
+                        connection='new' if tracer.new_connection else 'reused')
+            with self._lock:
+                self._last_used[tracer.name] = time.monotonic()
+
+    # -- warm-up and keep-alive ----------------------------------------------
+
+    def _idle(self, interval):
+        """Registered providers without a real request in the last `interval` seconds"""
+        now = time.monotonic()
+        with self._lock:
+            return [(name, url) for name, url in self._providers.values()
+                    if now - self._last_used.get(name, float('-inf')) >= interval]
+
+    def _ping(self, name, url):
+        client = self.client()
+        try:
+            request = client.build_request('HEAD', url, extensions={'keepalive_ping': True})
+            client.send(request).close()
+            metrics.inc('http_pings_total', dependency=name, outcome='ok')
+        except Exception as e:
+            metrics.inc('http_pings_total', dependency=name, outcome='error')
+            print(f"Error pinging {name}: {e}")
+
+    def warm(self, connections=HTTP_WARM_CONNECTIONS, interval=0):
+        """Open (or keep open) `connections` connections to each provider idle for `interval`"""
+        threads = [
+            threading.Thread(target=self._ping, args=(name, url), daemon=True)
+            for name, url in self._idle(interval) for _ in range(connections)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def start_keepalive(self, interval=HTTP_KEEPALIVE_PING_SECONDS):
+        """Warm the pool now, then keep idle providers' connections open in the background"""
+        self._check_fork()
+        if self._keepalive is not None:
+            return
+
+        def run():
+            self.warm()
+            while interval and not self._stop.wait(interval):
+                self.warm(interval=interval)
+
+        self._stop.clear()
+        self._keepalive = threading.Thread(target=run, name='http-keepalive', daemon=True)
+        self._keepalive.start()
+
+    def stop_keepalive(self, timeout=None):
+        self._stop.set()
+        if self._keepalive is not None:
+            self._keepalive.join(timeout)
+            self._keepalive = None
+
+    async def _aping(self, name, url):
+        client = self.async_client()
+        try:
+            request = client.build_request('HEAD', url, extensions={'keepalive_ping': True})
+            await (await client.send(request)).aclose()
+            metrics.inc('http_pings_total', dependency=name, outcome='ok')
+        except Exception as e:
+            metrics.inc('http_pings_total', dependency=name, outcome='error')
+            print(f"Error pinging {name}: {e}")
+
+    async def awarm(self, connections=HTTP_WARM_CONNECTIONS, interval=0):
+        await asyncio.gather(*(
+            self._aping(name, url) for name, url in self._idle(interval) for _ in range(connections)
+        ))
+
+    async def akeepalive(self, interval=HTTP_KEEPALIVE_PING_SECONDS):
+        """start_keepalive() for the async pool; run as a task on the serving loop"""
+        await self.awarm()
+        while interval:
+            await asyncio.sleep(interval)
+            await self.awarm(interval=interval)
+
+    def stats(self):
+        """
+        Open and idle connections per provider, for /health, or None when
+        they cannot be read. httpx has no public API for its pool, so this
+        looks at its internals and gives up if they are not as expected.
+        """
+        stats = {}
+        try:
+            for client in (self._client, self._async_client):
+                if client is None:
+                    continue
+                for conn in client._transport._pool.connections:
+                    host, port = conn._origin.host.decode('ascii'), conn._origin.port
+                    name = self._provider(f"{host}:{port}")
+                    if name == 'other':
+                        name = self._provider(host)
+                    entry = stats.setdefault(name, {'open': 0, 'idle': 0})
+                    entry['open'] += 1
+                    entry['idle'] += conn.is_idle()
+        except (AttributeError, TypeError):
+            return None
+        return stats
+
+
+# Process-wide pool
+http_pool = HTTPPool()
@@ -0,0 +1,157 @@
+"""
+Job Queue Module
+Durable SQLite-backed background jobs with a worker pool, retries and per-key idempotency
+"""
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))
+# Retry delay is JOB_BACKOFF_BASE * 2**(attempt - 1) seconds, capped at JOB_BACKOFF_MAX
+JOB_BACKOFF_BASE = float(os.getenv('JOB_BACKOFF_BASE', 2))
+JOB_BACKOFF_MAX = float(os.getenv('JOB_BACKOFF_MAX', 300))
+# A running job whose lease expires (worker died) becomes claimable again
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 120))
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 1))
+
+
+class JobQueue:
+    """
+    Jobs live in the `jobs` table, unique per (kind, key), so enqueueing the
+    same CallSid twice (e.g. a retried Twilio callback) is a no-op. Workers
+    claim one job at a time under a lease, run the handler registered for its
+    kind, and either mark it done or reschedule it with exponential backoff
+    until max_attempts is reached.
+    """
+
+    def __init__(self, db, workers=JOB_WORKERS):
+        self.db = db
+        self.workers = workers
+        self._handlers = {}
+        self._failure_handlers = {}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def register(self, kind, handler, on_failure=None):
+        """
+        handler(payload) runs the job; raising schedules a retry.
+        on_failure(payload, error) runs once the job has exhausted its attempts.
+        """
+        self._handlers[kind] = handler
+        if on_failure:
+            self._failure_handlers[kind] = on_failure
+
+    def enqueue(self, kind, key, payload=None, max_attempts=JOB_MAX_ATTEMPTS, delay=0):
+        """Queue a job; returns False if one with the same kind and key already exists"""
+        now = datetime.now().isoformat()
+        with self.db.transaction() as conn:
+            c = conn.execute("""
+                INSERT INTO jobs (kind, key, payload, max_attempts, run_after, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (kind, key) DO NOTHING
+            """, (kind, key, json.dumps(payload or {}), max_attempts, time.time() + delay, now, now))
+        self._wakeup.set()
+        return c.rowcount == 1
+
+    def get_job(self, kind, key):
+        row = self.db._connect().execute("""
+            SELECT status, attempts, max_attempts, last_error, created_at, updated_at
+            FROM jobs WHERE kind = ? AND key = ?
+        """, (kind, key)).fetchone()
+        if not row:
+            return None
+        return {
+            "status": row[0],
+            "attempts": row[1],
+            "max_attempts": row[2],
+            "last_error": row[3],
+            "created_at": row[4],
+            "updated_at": row[5]
+        }
+
+    def counts(self):
+        rows = self.db._connect().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+    def workers_alive(self):
+        return sum(thread.is_alive() for thread in self._threads)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _claim(self):
+        now = time.time()
+        with self.db.transaction() as conn:
+            row = conn.execute("""
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, locked_until = ?, updated_at = ?
+                WHERE id = (
+                    SELECT id FROM jobs
+                    WHERE (status = 'pending' AND run_after <= ?)
+                       OR (status = 'running' AND locked_until < ?)
+                    ORDER BY run_after, id
+                    LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts, max_attempts
+            """, (now + JOB_LEASE_SECONDS, datetime.now().isoformat(), now, now)).fetchone()
+        return row
+
+    def _finish(self, job_id, status, error=None, run_after=None):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                UPDATE jobs
+                SET status = ?, last_error = ?, run_after = COALESCE(?, run_after),
+                    locked_until = NULL, updated_at = ?
+                WHERE id = ?
+            """, (status, error, run_after, datetime.now().isoformat(), job_id))
+
+    def run_once(self):
+        """Claim and run a single job; returns False when nothing was ready"""
+        row = self._claim()
+        if row is None:
+            return False
+
+        job_id, kind, payload, attempts, max_attempts = row
+        payload = json.loads(payload)
+        try:
+            self._handlers[kind](payload)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts >= max_attempts:
+                print(f"Job {kind} #{job_id} failed permanently: {error}")
+                self._finish(job_id, 'failed', error)
+                on_failure = self._failure_handlers.get(kind)
+                if on_failure:
+                    on_failure(payload, e)
+            else:
+                delay = min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX)
+                print(f"Job {kind} #{job_id} failed (attempt {attempts}), retrying in {delay:.0f}s: {error}")
+                self._finish(job_id, 'pending', error, run_after=time.time() + delay)
+        else:
+            self._finish(job_id, 'done')
+        return True
+
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                if self.run_once():
+                    continue
+            except Exception as e:
+                print(f"Job worker error: {e}")
+            self._wakeup.wait(JOB_POLL_SECONDS)
+            self._wakeup.clear()
@@ -0,0 +1,48 @@
+"""
+Leader Module
+Elects one process per host for background work that must not run in every worker
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # No flock (Windows): only the single-process development server runs there
+    fcntl = None
+
+
+class Leader:
+    """
+    An exclusive, non-blocking flock on `path`, kept for the life of the
+    process. held() is True in exactly one process at a time; when that
+    process exits the OS releases the lock and the next worker to ask takes
+    over. Locks are taken after the fork, never inherited from the master.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def held(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's lock (if any) is not ours
+                self._file = None
+                self._pid = os.getpid()
+            if self._file is not None or fcntl is None:
+                return True
+            f = open(self.path, 'a+')
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            f.truncate(0)
+            f.write(f"{os.getpid()}\n")
+            f.flush()
+            self._file = f
+            return True
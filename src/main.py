@@ -3,6 +3,9 @@ AI Moses Voice Agent - Main Flask Application
 Handles incoming Twilio calls and manages AI responses
 """
 
+import time
+_import_started = time.perf_counter()
+
 # MUST load env variables FIRST before any other imports
 from dotenv import load_dotenv
 import os
@@ -11,23 +14,106 @@ import os
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', '.env')
 load_dotenv(dotenv_path)
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, g, request, jsonify, render_template
 from datetime import datetime
+import io
+import shutil
+import threading
+import uuid
 
-from .twilio_handler import handle_incoming_call, handle_incoming_sms
-from .voice_agent import VoiceAgent
+from .twilio_handler import (
+    handle_incoming_call, handle_incoming_sms, handle_incoming_stream_call, handle_conversation_turn
+)
+from .voice_agent import VoiceAgent, SUMMARY_FALLBACK, FALLBACK_RESPONSE
 from .database import Database
 from .status_manager import StatusManager
+from .audio_stream import AudioStreamRegistry
+from .greeting_pool import GreetingPool
+from .job_queue import JobQueue
+from .session_store import SessionStore, USER, ASSISTANT
+from .contact_import import read_contacts, import_contacts
+from .phone_numbers import lookup_key
+from .status_schedule import read_schedule, import_schedule
+from .pagination import encode_cursor, decode_cursor, page_size, iter_pages, ndjson
+from .audio_store import AudioStore
+from .audio_server import AudioServer
+from .metrics import metrics
+from .http_pool import http_pool
+from .fake_tts import FakeTTS
+from .resilience import Deadline
 
 # Initialize Flask app
 app = Flask(__name__)
+# Let a fronting nginx/Apache send clip files itself
+app.config['USE_X_SENDFILE'] = os.getenv('USE_X_SENDFILE') == '1'
 
-# Initialize database
-db = Database()
+# Services are built here but start nothing (no connections, threads or SDK
+# clients) so the module can be imported in a pre-forking master; see
+# create_app() and init_worker().
+db = Database(create_tables=False)
 
-# Initialize managers
-status_manager = StatusManager()
+# Initialize managers (sharing the database's connections)
+status_manager = StatusManager(db)
 voice_agent = VoiceAgent()
+audio_streams = AudioStreamRegistry()
+job_queue = JobQueue(db)
+
+# Pipeline streamed LLM output into TTS sentence by sentence
+LLM_STREAMING = os.getenv('LLM_STREAMING', '1') == '1'
+
+# Time budget for answering a voice webhook with TwiML (Twilio gives up after 15s),
+# and for the first audio of a streamed answer to be ready
+ANSWER_DEADLINE_SECONDS = float(os.getenv('ANSWER_DEADLINE_SECONDS', 5))
+FIRST_AUDIO_DEADLINE_SECONDS = float(os.getenv('FIRST_AUDIO_DEADLINE_SECONDS', 4))
+
+# Multi-turn <Gather> conversations, kept in the database so any worker can
+# continue a call; idle or evicted sessions are saved as-is
+sessions = SessionStore(db, on_evict=lambda session: save_conversation(session))
+CONVERSATION_GOODBYE = "Alright, I'll let Moses know you called. Talk soon!"
+
+# Public wss:// URL of the media stream server (python -m src.media_stream)
+MEDIA_STREAM_URL = os.getenv('MEDIA_STREAM_URL')
+
+# Generated clips (served by Flask's static handler and /audio/<call_sid>)
+AUDIO_DIR = os.path.join('src', 'static', 'audio')
+audio_store = AudioStore(db, AUDIO_DIR)
+audio_server = AudioServer(AUDIO_DIR)
+
+greeting_pool = GreetingPool(db, voice_agent, status_manager, os.path.join(AUDIO_DIR, 'greetings'))
+# Scheduled blocks starting or ending change the greeting every caller hears (only the leader re-renders)
+status_manager.add_listener(greeting_pool.refresh_all)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# REQUEST METRICS
+# ═══════════════════════════════════════════════════════════════════════════
+
+@app.before_request
+def start_request_metrics():
+    """Label timings with the route and, for Twilio webhooks, the CallSid"""
+    call_sid = (request.view_args or {}).get('call_sid')
+    if request.mimetype == 'application/x-www-form-urlencoded':
+        call_sid = request.form.get('CallSid') or call_sid
+    g.metrics_tokens = metrics.enter(route=request.endpoint or 'unknown', call_sid=call_sid)
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.endpoint or 'unknown'
+    started = g.get('request_started')
+    if started is not None:
+        # Until the response starts; streamed bodies continue in the background
+        metrics.observe('request_seconds', time.perf_counter() - started, route=route)
+    metrics.inc('requests_total', route=route, status=str(response.status_code))
+    return response
+
+
+@app.teardown_request
+def finish_request_metrics(error=None):
+    tokens = g.pop('metrics_tokens', None)
+    if tokens:
+        metrics.exit(tokens)
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -36,8 +122,17 @@ voice_agent = VoiceAgent()
 
 @app.route('/incoming-call', methods=['POST'])
 def incoming_call():
-    """Handle incoming Twilio calls"""
+    """
+    Handle incoming Twilio calls.
+
+    Answers within ANSWER_DEADLINE_SECONDS whatever the providers do. The
+    normal answer is a pre-rendered greeting, or a live reply streamed as
+    it is generated and synthesized. When OpenAI or ElevenLabs has its
+    circuit open (or no voice is configured) the answer degrades to
+    _degraded_answer().
+    """
     try:
+        deadline = Deadline(ANSWER_DEADLINE_SECONDS)
         phone_number = request.form.get('From')
         call_sid = request.form.get('CallSid')
         
@@ -45,44 +140,224 @@ def incoming_call():
         caller = db.get_caller_profile(phone_number)
         
         # Get current status
-        current_status = db.get_current_status()
+        current_status = status_manager.get_current_status()
         
-        # Generate AI response text
-        ai_response_text = voice_agent.generate_response(
+        # Pre-rendered greeting for this caller and status: just a lookup
+        greeting = greeting_pool.lookup(caller, current_status.get('activity'))
+        if greeting is not None:
+            db.log_call(
+                phone_number=phone_number,
+                call_sid=call_sid,
+                incoming_text="Incoming call",
+                ai_response=greeting['text']
+            )
+            audio_url = None
+            if greeting['audio_filename']:
+                audio_url = f"{request.host_url}static/audio/greetings/{greeting['audio_filename']}"
+            return handle_incoming_call(request, greeting['text'], audio_url)
+        
+        # No voice configured, or a provider is failing: skip the live path
+        if not (voice_agent.can_speak_now and voice_agent.llm_guard.available):
+            return _degraded_answer(phone_number, call_sid, caller, current_status.get('activity'), deadline)
+        
+        # Otherwise answer right away with <Play> pointing at the stream; the
+        # response text and audio are produced in the background while Twilio
+        # fetches /audio/<call_sid>, and the audio is teed to disk for replay.
+        prompt = dict(
             caller_name=caller.get('name'),
             caller_relationship=caller.get('relationship'),
             caller_tone=caller.get('tone'),
             status=current_status.get('activity')
         )
         
-        # Generate Audio using ElevenLabs
-        audio_filename = f"response_{call_sid}_{int(datetime.now().timestamp())}.mp3"
-        audio_path = os.path.join('src', 'static', 'audio', audio_filename)
+        def log_response(ai_response_text):
+            db.log_call(
+                phone_number=phone_number,
+                call_sid=call_sid,
+                incoming_text="Incoming call",
+                ai_response=ai_response_text
+            )
         
-        # Try to generate audio, fallback to text if fails
-        has_audio = voice_agent.text_to_speech(ai_response_text, audio_path)
+        def produce(stream):
+            # Past this the fallback message is played instead of waiting on the providers
+            audio_deadline = Deadline(FIRST_AUDIO_DEADLINE_SECONDS)
+            if LLM_STREAMING:
+                # Speak each sentence as soon as the model finishes it
+                audio = voice_agent.stream_spoken_response(on_text=log_response, deadline=audio_deadline, **prompt)
+            else:
+                ai_response_text = voice_agent.generate_response(deadline=audio_deadline, **prompt)
+                log_response(ai_response_text)
+                audio = voice_agent.stream_speech(ai_response_text)
+            for chunk in audio:
+                stream.write(chunk)
         
-        # Log the call
-        db.log_call(
-            phone_number=phone_number,
-            call_sid=call_sid,
-            incoming_text="Incoming call",
-            ai_response=ai_response_text
-        )
+        audio_path = audio_store.allocate('response', call_sid, call_sid=call_sid)
+        audio_streams.start(call_sid, metrics.carry(produce), path=audio_path)
         
-        # Handle the call and return TwiML
-        # If we have audio, we pass the URL to play
-        audio_url = None
-        if has_audio:
-            audio_url = f"{request.host_url}static/audio/{audio_filename}"
-            
-        return handle_incoming_call(request, ai_response_text, audio_url)
+        audio_url = f"{request.host_url}audio/{call_sid}"
+        return handle_incoming_call(request, None, audio_url)
     
     except Exception as e:
         print(f"Error handling incoming call: {e}")
+        # Still answer the caller rather than have Twilio play its error message
+        return handle_incoming_call(request, FALLBACK_RESPONSE)
+
+
+def _degraded_answer(phone_number, call_sid, caller, activity, deadline):
+    """
+    Answer without the live streamed path, in order of preference:
+    1. a pre-rendered greeting for this status, even if slightly out of date
+    2. reply text from OpenAI within what is left of the deadline, spoken by <Say>
+    3. the static fallback message (what generate_response returns on a miss)
+    """
+    greeting = greeting_pool.fallback(caller, activity)
+    audio_url = None
+    if greeting is not None:
+        stage, text = 'cached', greeting['text']
+        if greeting['audio_filename']:
+            audio_url = f"{request.host_url}static/audio/greetings/{greeting['audio_filename']}"
+    else:
+        text = voice_agent.generate_response(
+            caller_name=caller.get('name'),
+            caller_relationship=caller.get('relationship'),
+            caller_tone=caller.get('tone'),
+            status=activity,
+            deadline=deadline
+        )
+        stage = 'static' if text == FALLBACK_RESPONSE else 'say'
+    
+    metrics.inc('fallbacks_total', stage=stage)
+    db.log_call(
+        phone_number=phone_number,
+        call_sid=call_sid,
+        incoming_text="Incoming call",
+        ai_response=text
+    )
+    return handle_incoming_call(request, text, audio_url)
+
+
+@app.route('/incoming-call/conversation', methods=['POST'])
+def incoming_call_conversation():
+    """Handle incoming Twilio calls as a multi-turn <Gather> conversation"""
+    try:
+        phone_number = request.form.get('From')
+        call_sid = request.form.get('CallSid')
+        
+        session = sessions.start(call_sid, phone_number, _caller_prompt(phone_number))
+        return _conversation_reply(session)
+    
+    except Exception as e:
+        print(f"Error handling conversation call: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/conversation/turn', methods=['POST'])
+def conversation_turn():
+    """Handle one caller turn of a <Gather> conversation"""
+    try:
+        call_sid = request.form.get('CallSid')
+        speech = (request.form.get('SpeechResult') or '').strip()
+        
+        session = sessions.get(call_sid)
+        if session is None:
+            # Expired or evicted; carry on as a fresh conversation
+            phone_number = request.form.get('From')
+            session = sessions.start(call_sid, phone_number, _caller_prompt(phone_number))
+        
+        if not speech:
+            return handle_conversation_turn(CONVERSATION_GOODBYE, None, None, end_call=True)
+        
+        sessions.add_turn(session, USER, speech)
+        return _conversation_reply(session)
+    
+    except Exception as e:
+        print(f"Error handling conversation turn: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+def _caller_prompt(phone_number):
+    """Prompt fields for generate_response from the caller's profile and current status"""
+    caller = db.get_caller_profile(phone_number)
+    current_status = status_manager.get_current_status()
+    return dict(
+        caller_name=caller.get('name'),
+        caller_relationship=caller.get('relationship'),
+        caller_tone=caller.get('tone'),
+        status=current_status.get('activity')
+    )
+
+
+def _conversation_reply(session):
+    """Generate the next reply from the session's (budgeted) history and listen again"""
+    ai_response_text = voice_agent.generate_response(
+        conversation_history=session.history(),
+        deadline=Deadline(ANSWER_DEADLINE_SECONDS),
+        **session.prompt
+    )
+    sessions.add_turn(session, ASSISTANT, ai_response_text)
+    
+    audio_url = None
+    if voice_agent.can_speak_now:
+        audio_key = f"{session.call_sid}-{len(session.turns)}"
+        audio_path = audio_store.allocate('response', audio_key, call_sid=session.call_sid)
+        
+        def produce(stream):
+            for chunk in voice_agent.stream_speech(ai_response_text):
+                stream.write(chunk)
+        
+        audio_streams.start(audio_key, metrics.carry(produce), path=audio_path)
+        audio_url = f"{request.host_url}audio/{audio_key}"
+    
+    return handle_conversation_turn(ai_response_text, audio_url, f"{request.host_url}conversation/turn")
+
+
+def save_conversation(session):
+    """Persist a finished (or evicted) conversation to call_history in one write"""
+    if not session.turns:
+        return
+    db.log_call(
+        phone_number=session.phone_number,
+        call_sid=session.call_sid,
+        incoming_text=session.caller_text() or "Incoming call",
+        ai_response=session.transcript()
+    )
+
+
+@app.route('/incoming-call/stream', methods=['POST'])
+def incoming_call_stream():
+    """Handle incoming Twilio calls as a real-time conversation (Media Streams)"""
+    try:
+        stream_url = MEDIA_STREAM_URL or f"wss://{request.host.split(':')[0]}/media-stream"
+        return handle_incoming_stream_call(stream_url, {'From': request.form.get('From')})
+    except Exception as e:
+        print(f"Error handling streamed call: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/audio/<call_sid>', methods=['GET'])
+def stream_audio(call_sid):
+    """Stream a call's response audio, live while it is synthesized or from disk after"""
+    stream = audio_streams.get(call_sid)
+    if stream is not None and stream.error is None:
+        return Response(stream.iter_chunks(), mimetype='audio/mpeg')
+    
+    audio_path = audio_store.path_for('response', call_sid)
+    response = audio_server.send(os.path.relpath(audio_path, AUDIO_DIR))
+    if response is not None:
+        return response
+    
+    return jsonify({'error': 'Audio not found'}), 404
+
+
+@app.route('/static/audio/<path:filename>', methods=['GET'])
+def serve_clip(filename):
+    """Serve a finished clip (greetings, responses, summaries) with caching and range support"""
+    response = audio_server.send(filename)
+    if response is not None:
+        return response
+    return jsonify({'error': 'Audio not found'}), 404
+
+
 @app.route('/incoming-sms', methods=['POST'])
 def incoming_sms():
     """Handle incoming Twilio SMS"""
@@ -94,14 +369,15 @@ def incoming_sms():
         caller = db.get_caller_profile(phone_number)
         
         # Get current status
-        current_status = db.get_current_status()
+        current_status = status_manager.get_current_status()
         
         # Generate AI response text
         ai_response_text = voice_agent.generate_response(
             caller_name=caller.get('name'),
             caller_relationship=caller.get('relationship'),
             caller_tone=caller.get('tone'),
-            status=current_status.get('activity')
+            status=current_status.get('activity'),
+            deadline=Deadline(ANSWER_DEADLINE_SECONDS)
         )
         
         # Log the SMS (reusing log_call for now)
@@ -127,23 +403,14 @@ def call_status():
         call_status = request.form.get('CallStatus')
         
         if call_status == 'completed':
-            # Generate summary voice note
-            
-            # 1. Generate Summary Text
-            summary_text = voice_agent.generate_summary("Caller called. AI responded.") # Placeholder
-            
-            # 2. Generate Summary Audio (Voice Note for Moses)
-            summary_filename = f"summary_{call_sid}.mp3"
-            summary_path = os.path.join('src', 'static', 'audio', summary_filename)
-            
-            voice_agent.text_to_speech(summary_text, summary_path)
-            
-            # 3. Update Database
-            db.update_call_summary(
-                call_sid=call_sid,
-                summary_text=summary_text,
-                summary_audio_path=f"/static/audio/{summary_filename}"
-            )
+            # Summary is produced by the job workers; repeated callbacks for
+            # the same CallSid are ignored by the queue.
+            with db.transaction():
+                session = sessions.end(call_sid)
+                if session is not None:
+                    save_conversation(session)
+                if job_queue.enqueue('call_summary', call_sid, {'call_sid': call_sid}):
+                    db.set_summary_status(call_sid, 'pending')
             
         return '', 200
     except Exception as e:
@@ -151,13 +418,132 @@ def call_status():
         return '', 500
 
 
+def summarize_call(payload):
+    """Job handler: generate the summary voice note for a finished call"""
+    with metrics.bind(route='job:call_summary', call_sid=payload['call_sid']):
+        _summarize_call(payload['call_sid'])
+
+
+def _summarize_call(call_sid):
+    db.set_summary_status(call_sid, 'processing')
+    
+    # 1. Generate Summary Text
+    call = db.get_call(call_sid)
+    if call:
+        transcript = f"Caller: {call['incoming_text']}\nAI: {call['ai_response']}"
+    else:
+        transcript = "Caller called. AI responded."
+    summary_text = voice_agent.generate_summary(transcript)
+    if summary_text == SUMMARY_FALLBACK:
+        raise RuntimeError("summary generation failed")
+    
+    # 2. Generate Summary Audio (Voice Note for Moses)
+    summary_audio_path = None
+    if voice_agent.can_speak:
+        summary_path = audio_store.allocate('summary', call_sid, call_sid=call_sid)
+        if not voice_agent.text_to_speech(summary_text, summary_path):
+            raise RuntimeError("summary audio generation failed")
+        summary_audio_path = audio_store.url_for(summary_path)
+    
+    # 3. Update Database
+    db.update_call_summary(
+        call_sid=call_sid,
+        summary_text=summary_text,
+        summary_audio_path=summary_audio_path
+    )
+
+
+def summarize_call_failed(payload, error):
+    db.set_summary_status(payload['call_sid'], 'failed')
+
+
+job_queue.register('call_summary', summarize_call, on_failure=summarize_call_failed)
+
+
+# Free space below which the audio volume is reported as degraded
+MIN_FREE_DISK_BYTES = int(os.getenv('HEALTH_MIN_FREE_DISK_BYTES', 512 * 1024 * 1024))
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    """Health check endpoint"""
+    """
+    Health check endpoint.
+
+    The database is queried for real and must answer for the service to be
+    up (503 otherwise). Job workers, disk space for audio and the outcome of
+    the latest OpenAI / ElevenLabs calls only mark the service as degraded.
+    """
+    checks = {}
+    
+    try:
+        checks['database'] = {'status': 'ok', 'latency_ms': round(db.ping() * 1000, 2)}
+    except Exception as e:
+        checks['database'] = {'status': 'error', 'error': str(e)}
+    
+    alive = job_queue.workers_alive()
+    checks['job_workers'] = {'status': 'ok' if alive == job_queue.workers else 'error',
+                             'alive': alive, 'expected': job_queue.workers}
+    
+    try:
+        free = shutil.disk_usage(AUDIO_DIR if os.path.isdir(AUDIO_DIR) else '.').free
+        checks['audio_disk'] = {'status': 'ok' if free >= MIN_FREE_DISK_BYTES else 'error', 'free_bytes': free}
+    except OSError as e:
+        checks['audio_disk'] = {'status': 'error', 'error': str(e)}
+    
+    dependencies = metrics.dependency_health()
+    connections = http_pool.stats()
+    guards = {'openai': voice_agent.llm_guard, 'elevenlabs': voice_agent.tts_guard}
+    for name, configured in (('openai', bool(voice_agent.openai_api_key)), ('elevenlabs', voice_agent.can_speak)):
+        state = dependencies.get(name)
+        if not configured:
+            checks[name] = {'status': 'disabled'}
+        elif state is None:
+            checks[name] = {'status': 'unknown'}
+        else:
+            checks[name] = dict(state, status='error' if state['consecutive_failures'] else 'ok')
+        if configured:
+            checks[name]['circuit'] = guards[name].stats()
+            if connections is not None:
+                checks[name]['connections'] = connections.get(name, {'open': 0, 'idle': 0})
+    
+    database_ok = checks['database']['status'] == 'ok'
+    degraded = any(check['status'] == 'error' for check in checks.values())
     return jsonify({
-        'status': 'online',
+        'status': 'down' if not database_ok else 'degraded' if degraded else 'online',
         'timestamp': datetime.now().isoformat(),
-        'database': 'connected'
+        'database': 'connected' if database_ok else 'error',
+        'checks': checks,
+        'startup_ms': startup
+    }), 200 if database_ok else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage, dependency and request latency histograms in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/traces/<call_sid>', methods=['GET'])
+def call_trace(call_sid):
+    """Timed steps recorded while handling one call (recent calls only)"""
+    spans = metrics.trace(call_sid)
+    if spans is None:
+        return jsonify({'error': 'No trace for this call'}), 404
+    return jsonify({'call_sid': call_sid, 'spans': spans}), 200
+
+
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """Caller profile and TTS audio cache counters"""
+    return jsonify({
+        'profile_cache': db.profile_cache.stats(),
+        'tts_cache': voice_agent.tts_cache.stats(),
+        'greeting_pool': greeting_pool.stats(),
+        'jobs': job_queue.counts(),
+        'audio_store': audio_store.stats(),
+        'audio_server': audio_server.stats(),
+        'call_archive': db.archive.stats(),
+        'number_rules': db.number_rules.stats()
     }), 200
 
 
@@ -187,6 +573,7 @@ def add_contact():
         )
         
         if success:
+            greeting_pool.refresh_contact(lookup_key(data.get('phone_number')))
             return jsonify({
                 'status': 'success',
                 'message': f"Contact {data.get('name')} added successfully"
@@ -202,19 +589,89 @@ def add_contact():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/contacts/bulk', methods=['POST'])
+def bulk_import_contacts():
+    """
+    Import a CSV or vCard address book, sent as a multipart `file` upload or
+    as the raw request body. ?format=csv|vcard overrides detection.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            raw, filename, content_type = upload.stream, upload.filename, upload.mimetype
+        else:
+            raw, filename, content_type = request.stream, None, request.mimetype
+
+        stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+        records = read_contacts(stream, fmt=request.args.get('format'),
+                                filename=filename, content_type=content_type)
+        result = import_contacts(db, records)
+        return jsonify({'status': 'success', **result}), 200
+
+    except Exception as e:
+        print(f"Error importing contacts: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/contact-rules', methods=['GET'])
+def get_contact_rules():
+    """Organization and number-range rules"""
+    try:
+        rules = [rule for rule in db.get_contact_rules() if not rule['deleted']]
+        return jsonify({'count': len(rules), 'rules': rules}), 200
+    except Exception as e:
+        print(f"Error getting contact rules: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/contact-rules', methods=['POST'])
+def add_contact_rules():
+    """
+    Add or replace rules matching callers who are not contacts: one rule, a
+    list, or {"rules": [...]}. "pattern" is a prefix ("+1 415 555*"), a
+    range ("+14155550100-+14155550199") or a single number; the other
+    fields are the profile (name, relationship, tone, topics).
+    """
+    try:
+        data = request.get_json()
+        rules = data.get('rules', [data]) if isinstance(data, dict) else data
+        result = db.number_rules.add(enumerate(rules))
+        return jsonify({'status': 'success', **result}), 200
+    except Exception as e:
+        print(f"Error adding contact rules: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/contact-rules/<int:rule_id>', methods=['DELETE'])
+def delete_contact_rule(rule_id):
+    """Remove one rule"""
+    try:
+        if not db.number_rules.delete(rule_id):
+            return jsonify({'error': 'Rule not found'}), 404
+        return jsonify({'status': 'success'}), 200
+    except Exception as e:
+        print(f"Error deleting contact rule: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/update-status', methods=['POST'])
 def update_status():
-    """Update your current activity status"""
+    """
+    Update your current activity status. It overrides the schedule until
+    "until" (ISO), indefinitely with "hold": true, and by default until the
+    next scheduled change.
+    """
     try:
         data = request.get_json()
         activity = data.get('activity', 'Busy')
         
-        db.update_status(activity)
+        result = status_manager.update_status(activity, until=data.get('until'), hold=bool(data.get('hold')))
         
         return jsonify({
             'status': 'success',
             'activity': activity,
-            'updated_at': datetime.now().isoformat()
+            'updated_at': result['updated_at'],
+            'until': result['until']
         }), 200
     
     except Exception as e:
@@ -226,41 +683,183 @@ def update_status():
 def get_current_status():
     """Get your current activity status"""
     try:
-        status = db.get_current_status()
+        status = status_manager.get_current_status()
         return jsonify(status), 200
     except Exception as e:
         print(f"Error getting status: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/status-schedule', methods=['GET'])
+def get_status_schedule():
+    """Scheduled blocks and the resolved schedule for the next ?hours= (default 24)"""
+    try:
+        return jsonify(status_manager.get_schedule(hours=request.args.get('hours', 24, type=float))), 200
+    except Exception as e:
+        print(f"Error getting status schedule: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/status-schedule', methods=['POST'])
+def import_status_schedule():
+    """
+    Import status blocks from an iCalendar file or JSON, sent as a multipart
+    `file` upload or as the request body. ?format=ics|json overrides
+    detection; ?replace=1 replaces the whole schedule.
+    """
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            body, filename, content_type = upload.read(), upload.filename, upload.mimetype
+        else:
+            body, filename, content_type = request.get_data(), None, request.mimetype
+
+        records = read_schedule(body.decode('utf-8-sig', errors='replace'), fmt=request.args.get('format'),
+                                filename=filename, content_type=content_type)
+        result = import_schedule(db, records, replace=request.args.get('replace') == '1')
+        status_manager.reload()
+
+        return jsonify({'status': 'success', **result}), 200
+
+    except Exception as e:
+        print(f"Error importing status schedule: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/status-schedule/<int:block_id>', methods=['DELETE'])
+def delete_status_block(block_id):
+    """Remove one scheduled block (every occurrence of a recurring one)"""
+    try:
+        if not db.delete_status_block(block_id):
+            return jsonify({'error': 'Block not found'}), 404
+        status_manager.reload()
+        return jsonify({'status': 'success'}), 200
+    except Exception as e:
+        print(f"Error deleting status block: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/status-history', methods=['GET'])
+def get_status_history():
+    """Get your activity timeline, optionally within ?start=&end= (ISO timestamps)"""
+    try:
+        history = status_manager.get_status_history(
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify({
+            'count': len(history),
+            'history': history
+        }), 200
+    except Exception as e:
+        print(f"Error getting status history: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
+def _wants_ndjson():
+    """?format=ndjson or an NDJSON Accept header streams the whole listing"""
+    return (request.args.get('format') == 'ndjson'
+            or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+
+def _cursor(expected_type):
+    value = decode_cursor(request.args.get('cursor'))
+    if value is not None and not isinstance(value, expected_type):
+        raise ValueError("cursor does not belong to this listing")
+    return value
+
+
+def _next_cursor(rows, limit, key):
+    return encode_cursor(rows[-1][key]) if len(rows) == limit else None
+
+
 @app.route('/call-history/<phone_number>', methods=['GET'])
 def get_call_history(phone_number):
-    """Get call history for a contact"""
+    """Get call history for a contact, newest first, one page per cursor"""
     try:
-        limit = request.args.get('limit', 10, type=int)
-        history = db.get_call_history(phone_number, limit=limit)
+        before_id = _cursor(int)
+        if _wants_ndjson():
+            rows = iter_pages(lambda after, n: db.get_call_history(phone_number, limit=n, before_id=after),
+                              'id', after=before_id)
+            return Response(ndjson(rows), mimetype='application/x-ndjson')
+
+        limit = page_size(request.args.get('limit', type=int), default=10)
+        history = db.get_call_history(phone_number, limit=limit, before_id=before_id)
         
         return jsonify({
             'phone_number': phone_number,
             'call_count': len(history),
-            'calls': history
+            'calls': history,
+            'next_cursor': _next_cursor(history, limit, 'id')
         }), 200
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error getting call history: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/search', methods=['GET'])
+def search():
+    """
+    Full-text search over past calls and recordings.
+
+    ?q= words to find, plus optional phone, from / to (ISO dates), type
+    (call | recording), limit and cursor. Results are ranked, so the cursor
+    is a position in the ranking rather than a row key.
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'error': 'missing search query (?q=)'}), 400
+
+        limit = page_size(request.args.get('limit', type=int), default=20)
+        offset = _cursor(int) or 0
+        results = db.search(
+            query,
+            phone_number=request.args.get('phone'),
+            start=request.args.get('from'),
+            end=request.args.get('to'),
+            kind=request.args.get('type'),
+            limit=limit,
+            offset=offset
+        )
+        return jsonify({
+            'query': query,
+            'count': len(results),
+            'results': results,
+            'next_cursor': encode_cursor(offset + limit) if len(results) == limit else None
+        }), 200
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error searching calls: {e}")
+        return jsonify({'error': str(e)}), 500
+
+
 @app.route('/all-contacts', methods=['GET'])
 def get_all_contacts():
-    """Get all contacts in database"""
+    """Get contacts ordered by phone number, one page per cursor"""
     try:
-        contacts = db.get_all_contacts()
+        after = _cursor(str)
+        if _wants_ndjson():
+            rows = iter_pages(lambda after, n: db.get_all_contacts(after=after, limit=n),
+                              'phone_number', after=after)
+            return Response(ndjson(rows), mimetype='application/x-ndjson')
+
+        limit = page_size(request.args.get('limit', type=int))
+        contacts = db.get_all_contacts(after=after, limit=limit)
         return jsonify({
             'contact_count': len(contacts),
-            'contacts': contacts
+            'contacts': contacts,
+            'next_cursor': _next_cursor(contacts, limit, 'phone_number')
         }), 200
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error getting all contacts: {e}")
         return jsonify({'error': str(e)}), 500
@@ -304,26 +903,53 @@ def index():
 
 @app.route('/recent-calls', methods=['GET'])
 def get_recent_calls():
-    """Get global recent calls"""
+    """Get global recent calls, newest first, one page per cursor"""
     try:
-        limit = request.args.get('limit', 10, type=int)
-        calls = db.get_recent_calls(limit=limit)
+        before_id = _cursor(int)
+        if _wants_ndjson():
+            rows = iter_pages(lambda after, n: db.get_recent_calls(limit=n, before_id=after),
+                              'id', after=before_id)
+            return Response(ndjson(rows), mimetype='application/x-ndjson')
+
+        limit = page_size(request.args.get('limit', type=int), default=10)
+        calls = db.get_recent_calls(limit=limit, before_id=before_id)
         return jsonify({
             'count': len(calls),
-            'calls': calls
+            'calls': calls,
+            'next_cursor': _next_cursor(calls, limit, 'id')
         }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"Error getting recent calls: {e}")
         return jsonify({'error': str(e)}), 500
 
 
+# Offline stand-ins used by /test/simulate-call unless it is asked to go live
+SIMULATED_REPLY = "Hey {name}, Moses is busy with {activity} right now. I'll let him know you called."
+simulated_tts = FakeTTS(first_chunk_delay=0, chunk_delay=0)
+
+
+def _simulated_audio(text, path):
+    with open(path, 'wb') as f:
+        for chunk in simulated_tts.stream(text):
+            f.write(chunk)
+    return True
+
+
 @app.route('/test/simulate-call', methods=['POST'])
 def simulate_call():
-    """Simulate an incoming call for testing"""
+    """
+    Simulate an incoming call for testing.
+
+    Runs offline (canned reply, fake audio) so it can be clicked freely;
+    pass "live": true to go through OpenAI and ElevenLabs.
+    """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         phone_number = data.get('phone_number', '+15550000000')
         caller_name = data.get('name', 'Test Caller')
+        live = bool(data.get('live'))
         
         # 1. Get Profile (or create dummy)
         caller = db.get_caller_profile(phone_number)
@@ -331,41 +957,43 @@ def simulate_call():
             caller['name'] = caller_name
             
         # 2. Get Status
-        current_status = db.get_current_status()
+        current_status = status_manager.get_current_status()
         
         # 3. Generate Response
-        ai_response = voice_agent.generate_response(
-            caller_name=caller.get('name'),
-            caller_relationship=caller.get('relationship'),
-            caller_tone=caller.get('tone'),
-            status=current_status.get('activity')
-        )
+        if live:
+            ai_response = voice_agent.generate_response(
+                caller_name=caller.get('name'),
+                caller_relationship=caller.get('relationship'),
+                caller_tone=caller.get('tone'),
+                status=current_status.get('activity')
+            )
+        else:
+            ai_response = SIMULATED_REPLY.format(name=caller['name'], activity=current_status.get('activity'))
+        speak = voice_agent.text_to_speech if live else _simulated_audio
         
         # 4. Generate Audio (Mock or Real)
-        call_sid = f"SIM_{int(datetime.now().timestamp())}"
-        audio_filename = f"response_{call_sid}.mp3"
-        audio_path = os.path.join('src', 'static', 'audio', audio_filename)
-        voice_agent.text_to_speech(ai_response, audio_path)
-        
-        # 5. Log Call
-        db.log_call(
-            phone_number=phone_number,
-            call_sid=call_sid,
-            incoming_text="[SIMULATED CALL]",
-            ai_response=ai_response
-        )
+        call_sid = f"SIM_{uuid.uuid4().hex[:12]}"
+        audio_path = audio_store.allocate('response', call_sid, call_sid=call_sid)
+        speak(ai_response, audio_path)
         
-        # 6. Simulate Summary (since we won't get a callback)
+        # 5. Simulate Summary (since we won't get a callback)
         summary_text = f"Simulated call from {caller['name']}. They wanted to test the system."
-        summary_filename = f"summary_{call_sid}.mp3"
-        summary_path = os.path.join('src', 'static', 'audio', summary_filename)
-        voice_agent.text_to_speech(summary_text, summary_path)
-        
-        db.update_call_summary(
-            call_sid=call_sid,
-            summary_text=summary_text,
-            summary_audio_path=f"/static/audio/{summary_filename}"
-        )
+        summary_path = audio_store.allocate('summary', call_sid, call_sid=call_sid)
+        speak(summary_text, summary_path)
+        
+        # 6. Log Call and Summary in a single commit
+        with db.transaction():
+            db.log_call(
+                phone_number=phone_number,
+                call_sid=call_sid,
+                incoming_text="[SIMULATED CALL]",
+                ai_response=ai_response
+            )
+            db.update_call_summary(
+                call_sid=call_sid,
+                summary_text=summary_text,
+                summary_audio_path=audio_store.url_for(summary_path)
+            )
         
         return jsonify({
             'status': 'success',
@@ -398,6 +1026,69 @@ def server_error(error):
 # APP STARTUP
 # ═══════════════════════════════════════════════════════════════════════════
 
+# Milliseconds spent per start-up phase in this process (also in /metrics)
+startup = {'import': round((time.perf_counter() - _import_started) * 1000, 1)}
+metrics.observe('startup_seconds', startup['import'] / 1000, phase='import')
+_worker_pid = None
+_worker_lock = threading.Lock()
+
+
+def _startup_phase(phase, started):
+    elapsed = time.perf_counter() - started
+    startup[phase] = round(elapsed * 1000, 1)
+    metrics.observe('startup_seconds', elapsed, phase=phase)
+
+
+def create_app(start=True):
+    """
+    Application factory used by python -m src.main, src.asgi and gunicorn
+    (see gunicorn.conf.py).
+
+    Brings the schema up to date, then with start=True runs init_worker()
+    for this process. A pre-forking master passes start=False: the schema
+    is migrated once there, its connection is closed again, and each worker
+    calls init_worker() after the fork.
+    """
+    started = time.perf_counter()
+    db.create_tables()
+    _startup_phase('schema', started)
+    if start:
+        init_worker()
+    else:
+        db.close()
+    return app
+
+
+def init_worker():
+    """
+    Start this process's background work: job workers, audio retention
+    sweeps, call history archiving, the scheduled status watcher, provider
+    connection warm-up, the greeting pool, the fallback clip and the
+    number rule trie. Runs once per process, so it is safe to call again
+    after a fork.
+    """
+    global _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+
+    started = time.perf_counter()
+    job_queue.start()
+    audio_store.start()
+    db.archive.start()
+    status_manager.start()
+    http_pool.start_keepalive()
+    # Loads the greetings already rendered; only the leader renders, and only stale ones
+    greeting_pool.start()
+    # The static fallback message must be playable even while TTS is down
+    threading.Thread(target=voice_agent.warm_fallback, name='warm-fallback', daemon=True).start()
+    # Compile number rules now rather than on the first unknown caller
+    threading.Thread(target=db.number_rules.refresh, kwargs={'force': True}, name='number-rules', daemon=True).start()
+    _startup_phase('worker', started)
+    print(f"Worker {_worker_pid} ready: " + ', '.join(f"{phase} {ms}ms" for phase, ms in startup.items()))
+
+
 if __name__ == '__main__':
     print("🚀 AI Moses Voice Agent Starting...")
     print("📱 Listening on http://localhost:5000")
@@ -405,19 +1096,30 @@ if __name__ == '__main__':
     print("\nEndpoints ready:")
     print("  ✅ /health")
     print("  ✅ /incoming-call")
+    print("  ✅ /incoming-call/conversation")
+    print("  ✅ /incoming-call/stream")
     print("  ✅ /incoming-sms")
+    print("  ✅ /audio/<call_sid>")
     print("  ✅ /caller-profile/<phone>")
+    print("  ✅ /cache-stats")
+    print("  ✅ /metrics")
+    print("  ✅ /traces/<call_sid>")
     print("  ✅ /add-contact")
+    print("  ✅ /contacts/bulk")
+    print("  ✅ /contact-rules")
     print("  ✅ /update-status")
     print("  ✅ /current-status")
+    print("  ✅ /status-schedule")
+    print("  ✅ /status-history")
     print("  ✅ /call-history/<phone>")
     print("  ✅ /all-contacts")
+    print("  ✅ /search")
     print("  ✅ /voice-recording")
     print("  ✅ / (Dashboard)")
     print("\n🔗 Next: Configure Twilio webhook to http://localhost:5000/incoming-call")
     print("   (Use ngrok for testing: ngrok http 5000)\n")
     
-    app.run(
+    create_app().run(
         host='localhost',
         port=5000,
         debug=True,
@@ -0,0 +1,423 @@
+"""
+Media Stream Module
+Real-time two-way calls over Twilio Media Streams (asyncio websocket server)
+
+Run alongside the Flask app:
+    python -m src.media_stream
+
+and answer calls with /incoming-call/stream, which returns
+<Connect><Stream url="wss://.../media-stream"> TwiML. Each call gets its own
+session: inbound μ-law frames feed an energy-based turn detector, finished
+turns are transcribed and answered by the LLM, and the reply is synthesized
+as μ-law and streamed back sentence by sentence. Caller speech during a
+reply cancels it and clears Twilio's playback buffer (barge-in).
+"""
+
+# MUST load env variables FIRST before any other imports
+from dotenv import load_dotenv
+import os
+
+dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', '.env')
+load_dotenv(dotenv_path)
+
+import asyncio
+import base64
+import io
+import json
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import aclosing
+
+import numpy as np
+
+from .database import Database
+from .metrics import metrics
+from .session_store import format_transcript
+from .status_manager import StatusManager
+from .voice_agent import VoiceAgent, split_sentences
+
+MEDIA_STREAM_HOST = os.getenv('MEDIA_STREAM_HOST', '0.0.0.0')
+MEDIA_STREAM_PORT = int(os.getenv('MEDIA_STREAM_PORT', 5001))
+# Threads for blocking provider calls (STT, LLM, TTS) across all sessions
+MEDIA_STREAM_WORKERS = int(os.getenv('MEDIA_STREAM_WORKERS', 64))
+
+# Turn detection: 20 ms frames; a frame is voiced when its RMS exceeds SPEECH_RMS
+SPEECH_RMS = float(os.getenv('TURN_SPEECH_RMS', 500))
+SPEECH_START_MS = int(os.getenv('TURN_SPEECH_START_MS', 60))
+TURN_END_SILENCE_MS = int(os.getenv('TURN_END_SILENCE_MS', 600))
+MAX_TURN_MS = int(os.getenv('TURN_MAX_MS', 30000))
+PRE_ROLL_MS = 200
+
+STT_MODEL = os.getenv('STT_MODEL', 'whisper-1')
+
+SAMPLE_RATE = 8000
+FRAME_MS = 20
+FRAME_BYTES = SAMPLE_RATE * FRAME_MS // 1000  # one μ-law byte per sample
+
+
+def _ulaw_decode_byte(u):
+    u = ~u & 0xFF
+    sign = u & 0x80
+    exponent = (u >> 4) & 0x07
+    mantissa = u & 0x0F
+    sample = (((mantissa << 3) + 0x84) << exponent) - 0x84
+    return -sample if sign else sample
+
+
+_ULAW_TO_PCM = np.array([_ulaw_decode_byte(i) for i in range(256)], dtype=np.int16)
+
+
+def ulaw_decode(data):
+    """μ-law bytes -> int16 PCM samples"""
+    return _ULAW_TO_PCM[np.frombuffer(data, dtype=np.uint8)]
+
+
+def ulaw_encode(samples):
+    """int16 PCM samples -> μ-law bytes"""
+    pcm = np.asarray(samples, dtype=np.int32)
+    sign = np.where(pcm < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(pcm), 32635) + 0x84
+    exponent = np.floor(np.log2(magnitude)).astype(np.int32) - 7
+    exponent = np.clip(exponent, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8).tobytes()
+
+
+def pcm_to_wav(samples):
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(np.asarray(samples, dtype=np.int16).tobytes())
+    return buffer.getvalue()
+
+
+class TurnDetector:
+    """
+    Energy-based voice activity detection over 20 ms μ-law frames.
+
+    feed() returns 'speech_start' when the caller starts talking and
+    'turn_end' once they have been silent for TURN_END_SILENCE_MS (or hit
+    MAX_TURN_MS); take_turn() then returns the utterance as PCM.
+    """
+
+    def __init__(self, speech_rms=SPEECH_RMS, start_ms=SPEECH_START_MS,
+                 silence_ms=TURN_END_SILENCE_MS, max_turn_ms=MAX_TURN_MS):
+        self.speech_rms = speech_rms
+        self.start_frames = max(1, start_ms // FRAME_MS)
+        self.silence_frames = max(1, silence_ms // FRAME_MS)
+        self.max_frames = max_turn_ms // FRAME_MS
+        self.pre_roll_frames = PRE_ROLL_MS // FRAME_MS
+        self._pending = b''
+        self._frames = []
+        self._voiced_run = 0
+        self._silent_run = 0
+        self.in_speech = False
+        self._turn = None
+
+    def feed(self, payload):
+        events = []
+        self._pending += payload
+        while len(self._pending) >= FRAME_BYTES:
+            frame, self._pending = self._pending[:FRAME_BYTES], self._pending[FRAME_BYTES:]
+            event = self._feed_frame(frame)
+            if event:
+                events.append(event)
+        return events
+
+    def _feed_frame(self, frame):
+        pcm = ulaw_decode(frame)
+        rms = float(np.sqrt(np.mean(pcm.astype(np.float32) ** 2)))
+        voiced = rms >= self.speech_rms
+        self._frames.append(pcm)
+
+        if not self.in_speech:
+            self._voiced_run = self._voiced_run + 1 if voiced else 0
+            if self._voiced_run >= self.start_frames:
+                self.in_speech = True
+                self._silent_run = 0
+                keep = self.start_frames + self.pre_roll_frames
+                self._frames = self._frames[-keep:]
+                return 'speech_start'
+            # Only keep enough history for the pre-roll
+            del self._frames[:-(self.start_frames + self.pre_roll_frames)]
+            return None
+
+        self._silent_run = 0 if voiced else self._silent_run + 1
+        if self._silent_run >= self.silence_frames or len(self._frames) >= self.max_frames:
+            self._turn = np.concatenate(self._frames[:len(self._frames) - self._silent_run] or self._frames)
+            self._frames = []
+            self._voiced_run = 0
+            self.in_speech = False
+            return 'turn_end'
+        return None
+
+    def take_turn(self):
+        turn, self._turn = self._turn, None
+        return turn
+
+
+class OpenAITranscriber:
+    def __init__(self, voice_agent):
+        self.client = voice_agent.client
+
+    def transcribe(self, samples):
+        with metrics.dependency('openai', 'transcribe'):
+            result = self.client.audio.transcriptions.create(
+                model=STT_MODEL,
+                file=('turn.wav', pcm_to_wav(samples))
+            )
+        return result.text.strip()
+
+
+class FakeTranscriber:
+    """Offline stand-in: returns FAKE_STT_TEXT after FAKE_STT_DELAY seconds"""
+
+    def __init__(self):
+        self.text = os.getenv('FAKE_STT_TEXT', "Hey, is Moses around? Can you tell him to call me back?")
+        self.delay = float(os.getenv('FAKE_STT_DELAY', 0.2))
+
+    def transcribe(self, samples):
+        time.sleep(self.delay)
+        return self.text
+
+
+_DONE = object()
+
+
+async def iterate_in_thread(executor, make_iterator):
+    """Consume a blocking iterator on `executor`, yielding its items to the event loop"""
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def put(item):
+        try:
+            loop.call_soon_threadsafe(items.put_nowait, item)
+        except RuntimeError:
+            # Event loop already closed
+            cancelled.set()
+
+    def run():
+        try:
+            for item in make_iterator():
+                if cancelled.is_set():
+                    return
+                put((item, None))
+        except Exception as e:
+            put((None, e))
+        finally:
+            put((_DONE, None))
+
+    loop.run_in_executor(executor, run)
+    try:
+        while True:
+            item, error = await items.get()
+            if error is not None:
+                raise error
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        cancelled.set()
+
+
+class CallSession:
+    """State for one Media Streams connection"""
+
+    def __init__(self, server, websocket):
+        self.server = server
+        self.websocket = websocket
+        self.stream_sid = None
+        self.call_sid = None
+        self.phone_number = None
+        self.prompt = {}
+        self.history = []
+        self.detector = TurnDetector()
+        self._reply_task = None
+        self._marks_pending = set()
+        self._mark_seq = 0
+        self._send_lock = asyncio.Lock()
+
+    @property
+    def speaking(self):
+        """Reply audio is being generated or is still queued/playing at Twilio"""
+        return (self._reply_task is not None and not self._reply_task.done()) or bool(self._marks_pending)
+
+    async def run(self):
+        try:
+            async for message in self.websocket:
+                data = json.loads(message)
+                event = data.get('event')
+                if event == 'start':
+                    await self._on_start(data['start'])
+                elif event == 'media':
+                    await self._on_media(data['media'])
+                elif event == 'mark':
+                    self._marks_pending.discard(data.get('mark', {}).get('name'))
+                elif event == 'stop':
+                    break
+        finally:
+            await self._cancel_reply()
+            await self._finish()
+
+    async def _on_start(self, start):
+        self.stream_sid = start.get('streamSid')
+        self.call_sid = start.get('callSid')
+        params = start.get('customParameters') or {}
+        self.phone_number = params.get('From')
+
+        loop = asyncio.get_running_loop()
+        caller = await loop.run_in_executor(self.server.executor, self.server.db.get_caller_profile, self.phone_number)
+        status = self.server.status_manager.get_current_status()
+        self.prompt = dict(
+            caller_name=caller.get('name'),
+            caller_relationship=caller.get('relationship'),
+            caller_tone=caller.get('tone'),
+            status=status.get('activity')
+        )
+        # Open with a greeting, as the one-shot path does
+        self._reply_task = asyncio.create_task(self._reply())
+
+    async def _on_media(self, media):
+        if media.get('track', 'inbound') != 'inbound':
+            return
+        for event in self.detector.feed(base64.b64decode(media['payload'])):
+            if event == 'speech_start' and self.speaking:
+                await self._barge_in()
+            elif event == 'turn_end':
+                samples = self.detector.take_turn()
+                await self._cancel_reply()
+                self._reply_task = asyncio.create_task(self._answer_turn(samples))
+
+    async def _barge_in(self):
+        self.server.barge_ins += 1
+        await self._cancel_reply()
+        self._marks_pending.clear()
+        await self._send({'event': 'clear', 'streamSid': self.stream_sid})
+
+    async def _cancel_reply(self):
+        task, self._reply_task = self._reply_task, None
+        if task and not task.done():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _answer_turn(self, samples):
+        loop = asyncio.get_running_loop()
+        try:
+            text = await loop.run_in_executor(self.server.executor, self.server.transcriber.transcribe, samples)
+        except Exception as e:
+            print(f"Error transcribing turn on {self.call_sid}: {e}")
+            return
+        if not text:
+            return
+        self.history.append({"role": "user", "content": text})
+        await self._reply()
+
+    async def _reply(self):
+        agent = self.server.voice_agent
+        history = list(self.history)
+        spoken = []
+        try:
+            sentences = iterate_in_thread(
+                self.server.executor,
+                lambda: split_sentences(agent.stream_response(conversation_history=history, **self.prompt))
+            )
+            async with aclosing(sentences):
+                async for sentence in sentences:
+                    spoken.append(sentence)
+                    audio = iterate_in_thread(
+                        self.server.executor,
+                        lambda text=sentence: agent.stream_speech(text, output_format='ulaw_8000')
+                    )
+                    async with aclosing(audio):
+                        async for chunk in audio:
+                            await self._send_audio(chunk)
+            await self._send_mark()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error generating reply on {self.call_sid}: {e}")
+        finally:
+            # Whatever was said (even if cut off) is part of the conversation
+            if spoken:
+                self.history.append({"role": "assistant", "content": ' '.join(spoken)})
+
+    async def _send_audio(self, chunk):
+        await self._send({
+            'event': 'media',
+            'streamSid': self.stream_sid,
+            'media': {'payload': base64.b64encode(chunk).decode('ascii')}
+        })
+
+    async def _send_mark(self):
+        self._mark_seq += 1
+        name = f"reply-{self._mark_seq}"
+        self._marks_pending.add(name)
+        await self._send({'event': 'mark', 'streamSid': self.stream_sid, 'mark': {'name': name}})
+
+    async def _send(self, message):
+        async with self._send_lock:
+            await self.websocket.send(json.dumps(message))
+
+    async def _finish(self):
+        if not self.call_sid:
+            return
+        transcript = format_transcript((turn['role'], turn['content']) for turn in self.history)
+        caller_turns = '\n'.join(turn['content'] for turn in self.history if turn['role'] == 'user')
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.server.executor, lambda: self.server.db.log_call(
+                phone_number=self.phone_number,
+                call_sid=self.call_sid,
+                incoming_text=caller_turns or "Incoming call",
+                ai_response=transcript
+            ))
+        except Exception as e:
+            print(f"Error logging streamed call {self.call_sid}: {e}")
+
+
+class MediaStreamServer:
+    """Accepts Twilio Media Streams connections and runs a CallSession per call"""
+
+    def __init__(self, db=None, status_manager=None, voice_agent=None, transcriber=None,
+                 workers=MEDIA_STREAM_WORKERS):
+        self.db = db or Database()
+        self.status_manager = status_manager or StatusManager(self.db)
+        self.voice_agent = voice_agent or VoiceAgent()
+        if transcriber is None:
+            transcriber = FakeTranscriber() if os.getenv('STT_BACKEND') == 'fake' else OpenAITranscriber(self.voice_agent)
+        self.transcriber = transcriber
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-stream')
+        self.active_calls = 0
+        self.total_calls = 0
+        self.barge_ins = 0
+
+    async def handle(self, websocket):
+        self.active_calls += 1
+        self.total_calls += 1
+        try:
+            await CallSession(self, websocket).run()
+        except Exception as e:
+            print(f"Media stream session error: {e}")
+        finally:
+            self.active_calls -= 1
+
+    async def serve(self, host=MEDIA_STREAM_HOST, port=MEDIA_STREAM_PORT, ready=None):
+        from websockets.asyncio.server import serve
+
+        async with serve(self.handle, host, port, max_size=2 ** 20) as server:
+            if ready is not None:
+                ready(server)
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    print(f"🎧 AI Moses media stream server on ws://{MEDIA_STREAM_HOST}:{MEDIA_STREAM_PORT}/media-stream")
+    asyncio.run(MediaStreamServer().serve())
@@ -0,0 +1,250 @@
+"""
+Metrics Module
+Stage timings, latency histograms, dependency health and per-CallSid traces, exposed in Prometheus format
+"""
+
+import asyncio
+import contextvars
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import wraps
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Most recent calls kept in the trace store, and spans kept per call
+TRACE_LIMIT = int(os.getenv('METRICS_TRACE_LIMIT', 1000))
+TRACE_MAX_SPANS = 200
+PREFIX = 'ai_moses'
+
+_route = contextvars.ContextVar('metrics_route', default='background')
+_call_sid = contextvars.ContextVar('metrics_call_sid', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{k}="{escape(v)}"' for k, v in labels)
+
+
+class Metrics:
+    """
+    In-process registry shared by every module of one worker.
+
+    stage(name) / timed(name) time a step of handling a call and label it
+    with the current route; dependency(name, operation) times a call to an
+    external service and remembers whether it succeeded, which /health
+    reports. While a CallSid is bound (see bind()), every timed step is also
+    appended to that call's trace.
+    """
+
+    def __init__(self, buckets=BUCKETS, trace_limit=TRACE_LIMIT):
+        self.buckets = buckets
+        self.trace_limit = trace_limit
+        self._histograms = {}
+        self._counters = {}
+        self._dependencies = {}
+        self._traces = OrderedDict()
+        self._lock = threading.Lock()
+
+    # -- recording -----------------------------------------------------------
+
+    def observe(self, name, seconds, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def enter(self, route=None, call_sid=None):
+        """Attribute timings to `route` and `call_sid` until exit(tokens)"""
+        tokens = []
+        if route is not None:
+            tokens.append((_route, _route.set(route)))
+        if call_sid is not None:
+            tokens.append((_call_sid, _call_sid.set(call_sid)))
+        return tokens
+
+    def exit(self, tokens):
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+    @contextmanager
+    def bind(self, route=None, call_sid=None):
+        tokens = self.enter(route, call_sid)
+        try:
+            yield
+        finally:
+            self.exit(tokens)
+
+    @staticmethod
+    def carry(fn):
+        """Wrap `fn` to run with the caller's route/CallSid, e.g. on a worker thread"""
+        context = contextvars.copy_context()
+
+        @wraps(fn)
+        def run(*args, **kwargs):
+            return context.run(fn, *args, **kwargs)
+        return run
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('stage_seconds', elapsed, stage=name, route=_route.get())
+            self._span(name, start, elapsed, error)
+
+    def timed(self, name):
+        """Decorator form of stage(), for plain and async functions"""
+        def decorate(fn):
+            if inspect.iscoroutinefunction(fn):
+                @wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    with self.stage(name):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    @contextmanager
+    def dependency(self, name, operation):
+        """Time a call to an external service and track its health"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            if error is None:
+                outcome = 'ok'
+            elif isinstance(error, asyncio.CancelledError):
+                # Abandoned by us (a hedge that lost, a missed deadline): says nothing about the service
+                outcome = 'cancelled'
+            else:
+                outcome = 'error'
+            self.observe('dependency_seconds', elapsed, dependency=name, operation=operation, outcome=outcome)
+            self._span(f"{name}.{operation}", start, elapsed, error)
+            if outcome != 'cancelled':
+                self._record_health(name, error)
+
+    def _record_health(self, name, error):
+        with self._lock:
+            state = self._dependencies.setdefault(name, {
+                'last_success': None, 'last_error': None, 'error': None, 'consecutive_failures': 0
+            })
+            if error is None:
+                state['last_success'] = time.time()
+                state['consecutive_failures'] = 0
+            else:
+                state['last_error'] = time.time()
+                state['error'] = str(error)[:200]
+                state['consecutive_failures'] += 1
+
+    def _span(self, name, start, elapsed, error):
+        call_sid = _call_sid.get()
+        if call_sid is None:
+            return
+        with self._lock:
+            trace = self._traces.get(call_sid)
+            if trace is None:
+                trace = self._traces[call_sid] = {'started': start, 'spans': []}
+                while len(self._traces) > self.trace_limit:
+                    self._traces.popitem(last=False)
+            if len(trace['spans']) < TRACE_MAX_SPANS:
+                trace['spans'].append({
+                    'stage': name,
+                    'route': _route.get(),
+                    'offset_ms': round((start - trace['started']) * 1000, 2),
+                    'duration_ms': round(elapsed * 1000, 2),
+                    'error': None if error is None else str(error)[:200],
+                })
+
+    # -- reading -------------------------------------------------------------
+
+    def trace(self, call_sid):
+        """Timed steps recorded for a call, in start order (None if unknown)"""
+        with self._lock:
+            trace = self._traces.get(call_sid)
+            if trace is None:
+                return None
+            return sorted(trace['spans'], key=lambda span: span['offset_ms'])
+
+    def dependency_health(self):
+        with self._lock:
+            return {name: dict(state) for name, state in self._dependencies.items()}
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            histograms = sorted(
+                (name, labels, list(h.counts), h.sum, h.count) for (name, labels), h in self._histograms.items()
+            )
+            counters = sorted(self._counters.items())
+
+        lines = []
+        declared = set()
+        for name, labels, counts, total, count in histograms:
+            metric = f"{PREFIX}_{name}"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{metric}_bucket{{{_labels(labels + (('le', bound),))}}} {cumulative}")
+            lines.append(f"{metric}_bucket{{{_labels(labels + (('le', '+Inf'),))}}} {count}")
+            lines.append(f"{metric}_sum{{{_labels(labels)}}} {total:.6f}")
+            lines.append(f"{metric}_count{{{_labels(labels)}}} {count}")
+        for (name, labels), value in counters:
+            metric = f"{PREFIX}_{name}"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{{{_labels(labels)}}} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide registry
+metrics = Metrics()
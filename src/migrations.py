@@ -0,0 +1,440 @@
+"""
+Schema Migrations Module
+Ordered, versioned schema changes applied at startup
+"""
+
+import sqlite3
+from datetime import datetime
+
+from .phone_numbers import lookup_key
+
+
+def _initial_schema(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contacts (
+            phone_number TEXT PRIMARY KEY,
+            name TEXT,
+            relationship TEXT,
+            tone TEXT,
+            topics TEXT
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS status (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity TEXT,
+            updated_at TEXT
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS call_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone_number TEXT,
+            call_sid TEXT,
+            incoming_text TEXT,
+            ai_response TEXT,
+            summary_text TEXT,
+            summary_audio_path TEXT,
+            timestamp TEXT
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS voice_recordings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            phone_number TEXT,
+            call_sid TEXT,
+            file_path TEXT,
+            duration REAL,
+            transcription TEXT,
+            timestamp TEXT
+        )
+    """)
+
+
+def _call_lookup_indexes(c):
+    # Older databases may hold repeated call_sids (e.g. retried webhooks).
+    # Keep the newest row as-is and tag the rest so the unique index can be built.
+    c.execute("""
+        UPDATE call_history
+        SET call_sid = call_sid || '#' || id
+        WHERE call_sid IS NOT NULL
+          AND id NOT IN (SELECT MAX(id) FROM call_history WHERE call_sid IS NOT NULL GROUP BY call_sid)
+    """)
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_call_history_phone_id ON call_history (phone_number, id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_call_history_call_sid ON call_history (call_sid)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_voice_recordings_phone_id ON voice_recordings (phone_number, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_voice_recordings_call_sid ON voice_recordings (call_sid)")
+
+
+def _status_register(c):
+    # Single-row register for O(1) current-status reads, plus an interval
+    # history where repeated updates with the same activity collapse into one row.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS current_status (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            activity TEXT,
+            updated_at TEXT
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS status_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity TEXT,
+            started_at TEXT,
+            ended_at TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_status_history_started_at ON status_history (started_at)")
+
+    # Backfill from the legacy append-only status table
+    rows = c.execute("SELECT activity, updated_at FROM status ORDER BY id").fetchall()
+    intervals = []
+    for activity, updated_at in rows:
+        if intervals and intervals[-1][0] == activity:
+            continue
+        if intervals:
+            intervals[-1][2] = updated_at
+        intervals.append([activity, updated_at, None])
+    c.executemany("""
+        INSERT INTO status_history (activity, started_at, ended_at)
+        VALUES (?, ?, ?)
+    """, intervals)
+
+    if rows:
+        c.execute("""
+            INSERT OR REPLACE INTO current_status (id, activity, updated_at)
+            VALUES (1, ?, ?)
+        """, rows[-1])
+
+
+def _job_queue(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 5,
+            run_after REAL NOT NULL,
+            locked_until REAL,
+            last_error TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            UNIQUE (kind, key)
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after)")
+
+    columns = [row[1] for row in c.execute("PRAGMA table_info(call_history)")]
+    if 'summary_status' not in columns:
+        c.execute("ALTER TABLE call_history ADD COLUMN summary_status TEXT")
+    c.execute("""
+        UPDATE call_history SET summary_status = 'done'
+        WHERE summary_status IS NULL AND summary_text IS NOT NULL
+    """)
+
+
+def _full_text_search(c):
+    # External-content FTS5 tables: the text lives only in the source tables
+    # and triggers keep the index in step with every insert, update and delete.
+    tokenizer = "porter unicode61 remove_diacritics 2"
+    c.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS call_history_fts USING fts5(
+            incoming_text, ai_response, summary_text,
+            content='call_history', content_rowid='id', tokenize='{tokenizer}'
+        )
+    """)
+    c.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS voice_recordings_fts USING fts5(
+            transcription,
+            content='voice_recordings', content_rowid='id', tokenize='{tokenizer}'
+        )
+    """)
+
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS call_history_fts_insert AFTER INSERT ON call_history BEGIN
+            INSERT INTO call_history_fts (rowid, incoming_text, ai_response, summary_text)
+            VALUES (new.id, new.incoming_text, new.ai_response, new.summary_text);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS call_history_fts_delete AFTER DELETE ON call_history BEGIN
+            INSERT INTO call_history_fts (call_history_fts, rowid, incoming_text, ai_response, summary_text)
+            VALUES ('delete', old.id, old.incoming_text, old.ai_response, old.summary_text);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS call_history_fts_update
+        AFTER UPDATE OF incoming_text, ai_response, summary_text ON call_history BEGIN
+            INSERT INTO call_history_fts (call_history_fts, rowid, incoming_text, ai_response, summary_text)
+            VALUES ('delete', old.id, old.incoming_text, old.ai_response, old.summary_text);
+            INSERT INTO call_history_fts (rowid, incoming_text, ai_response, summary_text)
+            VALUES (new.id, new.incoming_text, new.ai_response, new.summary_text);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS voice_recordings_fts_insert AFTER INSERT ON voice_recordings BEGIN
+            INSERT INTO voice_recordings_fts (rowid, transcription) VALUES (new.id, new.transcription);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS voice_recordings_fts_delete AFTER DELETE ON voice_recordings BEGIN
+            INSERT INTO voice_recordings_fts (voice_recordings_fts, rowid, transcription)
+            VALUES ('delete', old.id, old.transcription);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS voice_recordings_fts_update
+        AFTER UPDATE OF transcription ON voice_recordings BEGIN
+            INSERT INTO voice_recordings_fts (voice_recordings_fts, rowid, transcription)
+            VALUES ('delete', old.id, old.transcription);
+            INSERT INTO voice_recordings_fts (rowid, transcription) VALUES (new.id, new.transcription);
+        END
+    """)
+
+    # Index whatever is already there
+    c.execute("INSERT INTO call_history_fts (call_history_fts) VALUES ('rebuild')")
+    c.execute("INSERT INTO voice_recordings_fts (voice_recordings_fts) VALUES ('rebuild')")
+
+
+def _audio_manifest(c):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS audio_files (
+            path TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            call_sid TEXT,
+            bytes INTEGER,
+            created_at REAL NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audio_files_created_at ON audio_files (created_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_audio_files_call_sid ON audio_files (call_sid)")
+
+
+def _call_archive(c):
+    # Archived rows live in compressed monthly files; the hot database keeps
+    # only the file list and a narrow per-row index (no text) to find them.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS archive_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            month TEXT NOT NULL,
+            path TEXT NOT NULL UNIQUE,
+            rows INTEGER NOT NULL,
+            bytes INTEGER NOT NULL,
+            created_at TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archive_files_kind_month ON archive_files (kind, month)")
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS archived_rows (
+            kind TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            phone_number TEXT,
+            call_sid TEXT,
+            timestamp TEXT,
+            file_id INTEGER NOT NULL REFERENCES archive_files (id),
+            PRIMARY KEY (kind, id)
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archived_rows_phone_id ON archived_rows (kind, phone_number, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archived_rows_call_sid ON archived_rows (call_sid)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_archived_rows_file_id ON archived_rows (file_id)")
+
+
+def _status_schedule(c):
+    # Scheduled status blocks, one row per one-off or recurring block (expanded
+    # in memory), and how long an explicit /update-status holds over them.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS status_schedule (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity TEXT NOT NULL,
+            starts_at TEXT NOT NULL,
+            ends_at TEXT NOT NULL,
+            rrule TEXT,
+            exdates TEXT,
+            source TEXT,
+            created_at TEXT
+        )
+    """)
+
+    columns = [row[1] for row in c.execute("PRAGMA table_info(current_status)")]
+    if 'override_until' not in columns:
+        c.execute("ALTER TABLE current_status ADD COLUMN override_until TEXT")
+
+
+def _normalized_contacts(c):
+    # Callers are looked up by their E.164 form. Existing numbers are
+    # rewritten to it where that does not collide with another contact; the
+    # rest keep their spelling and are found through phone_e164.
+    columns = [row[1] for row in c.execute("PRAGMA table_info(contacts)")]
+    if 'phone_e164' not in columns:
+        c.execute("ALTER TABLE contacts ADD COLUMN phone_e164 TEXT")
+    rows = c.execute("SELECT phone_number FROM contacts").fetchall()
+    normalized = [(lookup_key(phone_number), phone_number) for phone_number, in rows]
+    c.executemany("UPDATE contacts SET phone_e164 = ? WHERE phone_number = ?", normalized)
+    c.executemany("UPDATE OR IGNORE contacts SET phone_number = phone_e164 WHERE phone_number = ?",
+                  [(phone_number,) for key, phone_number in normalized if key != phone_number])
+    c.execute("CREATE INDEX IF NOT EXISTS idx_contacts_phone_e164 ON contacts (phone_e164)")
+
+    # Organization and number-range rules. Every change takes the next rev
+    # and deletes are soft, so each process can apply changes incrementally.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS contact_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            pattern TEXT NOT NULL UNIQUE,
+            name TEXT,
+            relationship TEXT,
+            tone TEXT,
+            topics TEXT,
+            rev INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_contact_rules_rev ON contact_rules (rev)")
+
+
+def _greetings(c):
+    # Pre-rendered greetings, written by the one process that renders them
+    # and read by every worker. Keyed by contact number, 'rule:<id>' or ''
+    # (unknown caller); name..activity are the inputs the text was made from.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS greetings (
+            key TEXT PRIMARY KEY,
+            name TEXT,
+            relationship TEXT,
+            tone TEXT,
+            activity TEXT,
+            text TEXT NOT NULL,
+            audio_filename TEXT,
+            rendered_at TEXT,
+            rev INTEGER NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_greetings_rev ON greetings (rev)")
+
+
+def _conversation_sessions(c):
+    # Live <Gather> conversations, shared by every worker so a call's turns
+    # and its /call-status can each land on any of them. A session is
+    # written to call_history and removed when the call ends or idles out.
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_sessions (
+            call_sid TEXT PRIMARY KEY,
+            phone_number TEXT,
+            prompt TEXT NOT NULL,
+            last_seen REAL NOT NULL
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_conversation_sessions_last_seen ON conversation_sessions (last_seen)")
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_turns (
+            call_sid TEXT NOT NULL REFERENCES conversation_sessions (call_sid) ON DELETE CASCADE,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            text TEXT NOT NULL,
+            PRIMARY KEY (call_sid, seq)
+        ) WITHOUT ROWID
+    """)
+
+
+def _archive_search(c):
+    # Full-text index over archived rows. Contentless (the text is only in
+    # the archive files), keyed by the row id; archived_rows says where each
+    # row lives. Files are indexed as they are written; archive_files.indexed
+    # is 0 for those written before this index existed until the archiver
+    # backfills them.
+    tokenizer = "porter unicode61 remove_diacritics 2"
+    c.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS archived_calls_fts USING fts5(
+            incoming_text, ai_response, summary_text, content='', tokenize='{tokenizer}'
+        )
+    """)
+    c.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS archived_recordings_fts USING fts5(
+            transcription, content='', tokenize='{tokenizer}'
+        )
+    """)
+    columns = [row[1] for row in c.execute("PRAGMA table_info(archive_files)")]
+    if 'indexed' not in columns:
+        c.execute("ALTER TABLE archive_files ADD COLUMN indexed INTEGER NOT NULL DEFAULT 0")
+
+
+# (version, description, step). Append new steps at the end; never renumber.
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "call_history and voice_recordings lookup indexes", _call_lookup_indexes),
+    (3, "current status register and interval status history", _status_register),
+    (4, "background job queue and call_history.summary_status", _job_queue),
+    (5, "full-text search over call text and recording transcriptions", _full_text_search),
+    (6, "generated audio manifest", _audio_manifest),
+    (7, "call history archive index", _call_archive),
+    (8, "status schedule and override expiry", _status_schedule),
+    (9, "normalized contact numbers and contact rules", _normalized_contacts),
+    (10, "pre-rendered greetings", _greetings),
+    (11, "shared conversation sessions", _conversation_sessions),
+    (12, "full-text search over archived calls and recordings", _archive_search),
+]
+
+
+def current_version(conn):
+    """Highest applied migration version (0 for a fresh database)"""
+    row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    return row[0] or 0
+
+
+def migrate(db, target=None):
+    """
+    Bring the database up to `target` (default: latest).
+
+    Each step runs in its own transaction together with its bookkeeping row,
+    so a failed step leaves the schema at the previous version. The version
+    is re-read inside the transaction, so concurrent workers starting at the
+    same time apply each step exactly once.
+
+    Returns a list of the versions applied by this call.
+    """
+    wanted = MIGRATIONS[-1][0] if target is None else target
+    try:
+        # Already current (every start but the first): no write lock needed
+        if current_version(db._connect()) >= wanted:
+            return []
+    except sqlite3.OperationalError:
+        pass  # fresh database, no schema_migrations yet
+
+    with db.transaction() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
+            )
+        """)
+
+    applied = []
+    for version, description, step in MIGRATIONS:
+        if target is not None and version > target:
+            break
+
+        with db.transaction() as conn:
+            if current_version(conn) >= version:
+                continue
+
+            step(conn.cursor())
+            conn.execute("""
+                INSERT INTO schema_migrations (version, description, applied_at)
+                VALUES (?, ?, ?)
+            """, (version, description, datetime.now().isoformat()))
+            applied.append(version)
+
+    return applied
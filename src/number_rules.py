@@ -0,0 +1,108 @@
+"""
+Number Rules Module
+Organization and number-range caller rules, compiled into a prefix trie that is kept in step with the database
+"""
+
+import os
+import threading
+import time
+
+from .phone_numbers import PrefixTrie, compile_rule, parse_rule
+
+# How long a process trusts its trie before checking for rule changes made by other workers
+RULES_REFRESH_SECONDS = float(os.getenv('NUMBER_RULES_REFRESH_SECONDS', 5))
+# Import errors reported back per request
+MAX_REPORTED_ERRORS = 50
+
+FIELDS = ("pattern", "name", "relationship", "tone", "topics")
+
+
+class NumberRules:
+    """
+    Caller profiles for whole number blocks (a company switchboard range,
+    a country), consulted when a number is not an exact contact.
+
+    Rules are compiled into a PrefixTrie; the longest matching prefix wins.
+    The trie is loaded on first use and then only changed rows are applied:
+    every write bumps the rule's rev, so refresh() asks for rows past the
+    last rev seen, at most once per `refresh_seconds`.
+    """
+
+    def __init__(self, db, refresh_seconds=RULES_REFRESH_SECONDS):
+        self.db = db
+        self.refresh_seconds = refresh_seconds
+        self.trie = PrefixTrie()
+        self._rules = {}
+        self._prefixes = {}
+        self._rev = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Apply rule changes since the last refresh; returns how many rules changed"""
+        if not force and self._checked_at is not None and time.monotonic() - self._checked_at < self.refresh_seconds:
+            return 0
+        with self._lock:
+            rows = self.db.get_contact_rules(since_rev=self._rev)
+            for rule in rows:
+                self._apply(rule)
+                self._rev = max(self._rev, rule['rev'])
+            self._checked_at = time.monotonic()
+        if rows:
+            # Callers cached before the change may now match differently
+            self.db.profile_cache.invalidate()
+        return len(rows)
+
+    def _apply(self, rule):
+        for prefix, length in self._prefixes.pop(rule['id'], ()):
+            self.trie.remove(prefix, rule['id'], length)
+        self._rules.pop(rule['id'], None)
+        if rule['deleted']:
+            return
+        # Stored patterns are canonical (validated by add())
+        prefixes = compile_rule(rule['pattern'])
+        for prefix, length in prefixes:
+            self.trie.insert(prefix, rule['id'], length)
+        self._prefixes[rule['id']] = prefixes
+        self._rules[rule['id']] = tuple(rule[field] for field in FIELDS)
+
+    def match(self, number):
+        """The rule covering an E.164 number (its fields plus `id`), or None"""
+        if not number or not number.startswith('+'):
+            return None
+        self.refresh()
+        rule_id = self.trie.match(number[1:])
+        if rule_id is None:
+            return None
+        rule = self._rules.get(rule_id)
+        return dict(zip(FIELDS, rule), id=rule_id) if rule else None
+
+    def add(self, records):
+        """
+        Validate and upsert (position, rule) pairs, keyed by the canonical
+        pattern. Invalid patterns are reported individually.
+        """
+        result = {'imported': 0, 'failed': 0, 'errors': []}
+        rows = []
+        for position, record in records:
+            try:
+                pattern = parse_rule(record.get('pattern'))
+            except ValueError as e:
+                result['failed'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append({'line': position, 'error': str(e)})
+                continue
+            rows.append((pattern,) + tuple(record.get(field) for field in FIELDS[1:]))
+        if rows:
+            result['imported'] = self.db.upsert_contact_rules(rows)
+            self.refresh(force=True)
+        return result
+
+    def delete(self, rule_id):
+        deleted = self.db.delete_contact_rule(rule_id)
+        if deleted:
+            self.refresh(force=True)
+        return deleted
+
+    def stats(self):
+        return {'rules': len(self._rules), 'prefixes': self.trie.size, 'rev': self._rev}
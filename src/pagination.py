@@ -0,0 +1,59 @@
+"""
+Pagination Module
+Opaque keyset cursors and NDJSON streaming for the listing endpoints
+"""
+
+import base64
+import json
+import os
+
+DEFAULT_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.getenv('LIST_MAX_PAGE_SIZE', 1000))
+# Rows fetched per query while streaming a full listing
+STREAM_BATCH_SIZE = int(os.getenv('LIST_STREAM_BATCH_SIZE', 500))
+
+
+def encode_cursor(value):
+    """Sort key of the last row on a page -> URL-safe token (None when done)"""
+    if value is None:
+        return None
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; None for a missing token, ValueError if malformed"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return json.loads(raw)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"invalid cursor: {token!r}")
+
+
+def page_size(requested, default=DEFAULT_PAGE_SIZE):
+    if requested is None:
+        return default
+    return max(1, min(requested, MAX_PAGE_SIZE))
+
+
+def iter_pages(fetch_page, key, after=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Yield every row by calling fetch_page(after, limit) until a short page.
+
+    Each batch is its own query, so no read transaction or result set is
+    held open while the consumer (e.g. a slow HTTP client) catches up.
+    """
+    while True:
+        rows = fetch_page(after, batch_size)
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        after = rows[-1][key]
+
+
+def ndjson(rows):
+    """One JSON document per line, for chunked streaming responses"""
+    for row in rows:
+        yield json.dumps(row) + '\n'
@@ -0,0 +1,184 @@
+"""
+Phone Numbers Module
+Normalizes phone numbers to E.164-style strings (+<country><number>) and matches them against prefix and range rules
+"""
+
+import os
+import re
+
+# Country calling code assumed for numbers written without one
+DEFAULT_COUNTRY_CODE = os.getenv('DEFAULT_COUNTRY_CODE', '1')
+
+_EXTENSION = re.compile(r'\s*(?:ext\.?|x|#)\s*\d+\s*$', re.IGNORECASE)
+
+
+def normalize_number(raw, default_country_code=DEFAULT_COUNTRY_CODE):
+    """
+    '+1 (234) 567-8900', '234.567.8900', '1-234-567-8900' and '0012345678900'
+    all become '+12345678900'. Raises ValueError for input that cannot be a
+    phone number.
+    """
+    if raw is None:
+        raise ValueError("missing phone number")
+    text = _EXTENSION.sub('', str(raw).strip())
+    if not text:
+        raise ValueError("missing phone number")
+
+    digits = re.sub(r'\D', '', text)
+    if text.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        # International dialing prefix
+        digits = digits[2:]
+    elif default_country_code == '1':
+        # NANP area codes never start with 1, so a leading 1 is the country code
+        if not digits.startswith('1'):
+            digits = '1' + digits
+    elif digits.startswith('0') and default_country_code:
+        # National trunk prefix
+        digits = default_country_code + digits[1:]
+
+    if not 7 <= len(digits) <= 15:
+        raise ValueError(f"not a valid phone number: {raw!r}")
+    return '+' + digits
+
+
+def lookup_key(raw):
+    """normalize_number(), or the input unchanged when it is not a number (e.g. 'anonymous')"""
+    try:
+        return normalize_number(raw)
+    except ValueError:
+        return raw
+
+
+def range_prefixes(low, high):
+    """
+    The fewest digit prefixes covering every number from `low` to `high`
+    (digit strings of equal length), e.g. '1200'..'1299' -> ['12'] and
+    '1295'..'1310' -> ['1295', '1296', '1297', '1298', '1299', '130', '1310'].
+    """
+    width = len(low)
+    current, end = int(low), int(high)
+    prefixes = []
+    while current <= end:
+        # Widen the block while it stays aligned and inside the range
+        size = 0
+        while size < width and current % 10 ** (size + 1) == 0 and current + 10 ** (size + 1) - 1 <= end:
+            size += 1
+        prefixes.append(str(current).zfill(width)[:width - size])
+        current += 10 ** size
+    return prefixes
+
+
+def parse_rule(pattern):
+    """
+    Number rule pattern -> canonical pattern.
+
+    '+1 415 555*' matches every number starting +1415555,
+    '+14155550100-+14155550199' the numbers in that range (both ends the
+    same length) and a plain number only itself. Raises ValueError.
+    """
+    text = (pattern or '').strip()
+    if text.endswith('*'):
+        digits = re.sub(r'[\s().-]', '', text[:-1])
+        if not re.fullmatch(r'\+\d{1,15}', digits):
+            raise ValueError(f"prefix must be + and up to 15 digits: {pattern!r}")
+        return digits + '*'
+
+    split = text.find('-+') + 1 or text.find('..') + 1
+    if split:
+        low, high = normalize_number(text[:split - 1]), normalize_number(text[split:].lstrip('.'))
+        if len(low) != len(high) or low > high:
+            raise ValueError(f"range ends must be the same length, low first: {pattern!r}")
+        return f"{low}-{high}"
+
+    return normalize_number(text)
+
+
+def compile_rule(pattern):
+    """
+    Canonical pattern (from parse_rule) -> [(prefix digits, number length)],
+    length None for an open prefix: '+14155550100-+14155550199' ->
+    [('141555501', 11)].
+    """
+    if pattern.endswith('*'):
+        return [(pattern[1:-1], None)]
+    low, _, high = pattern.partition('-')
+    if not high:
+        return [(low[1:], len(low) - 1)]
+    return [(prefix, len(low) - 1) for prefix in range_prefixes(low[1:], high[1:])]
+
+
+class PrefixTrie:
+    """
+    Digit trie from number prefixes to values, for longest-prefix matching.
+
+    Each prefix carries a required number length (None: any length), so a
+    range like +14155550100-+14155550199 compiles to the prefix 141555501
+    for 11-digit numbers only. match() walks at most 15 nodes. Entries are
+    added and removed one at a time, so a changed rule never means a
+    rebuild; among equal prefixes the exact-length entry, then the highest
+    value, wins.
+    """
+
+    _END = ''
+
+    def __init__(self):
+        self._root = {}
+        self.size = 0
+
+    def insert(self, prefix, value, length=None):
+        node = self._root
+        for digit in prefix:
+            child = node.get(digit)
+            if child is None:
+                child = node[digit] = {}
+            node = child
+        ends = node.get(self._END)
+        if ends is None:
+            ends = node[self._END] = {}
+        values = ends.get(length)
+        if values is None:
+            values = ends[length] = set()
+        if value not in values:
+            values.add(value)
+            self.size += 1
+
+    def remove(self, prefix, value, length=None):
+        path = [self._root]
+        for digit in prefix:
+            node = path[-1].get(digit)
+            if node is None:
+                return
+            path.append(node)
+        ends = path[-1].get(self._END, {})
+        values = ends.get(length)
+        if not values or value not in values:
+            return
+        values.discard(value)
+        self.size -= 1
+        if not values:
+            del ends[length]
+        if not ends:
+            path[-1].pop(self._END, None)
+        # Prune nodes left without entries or children
+        for depth in range(len(prefix), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][prefix[depth - 1]]
+
+    def match(self, digits):
+        """Value of the longest prefix of `digits` whose length rule fits, or None"""
+        node = self._root
+        best = None
+        length = len(digits)
+        for digit in digits:
+            node = node.get(digit)
+            if node is None:
+                break
+            ends = node.get(self._END)
+            if ends:
+                values = ends.get(length) or ends.get(None)
+                if values:
+                    best = max(values)
+        return best
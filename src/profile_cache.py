@@ -0,0 +1,79 @@
+"""
+Profile Cache Module
+Bounded LRU/TTL cache for caller profiles
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_SIZE = int(os.getenv('PROFILE_CACHE_SIZE', 10000))
+CACHE_TTL = float(os.getenv('PROFILE_CACHE_TTL', 300))
+# Unknown numbers expire sooner so a contact added from another process
+# (e.g. add_contacts.py) is picked up quickly.
+NEGATIVE_CACHE_TTL = float(os.getenv('PROFILE_CACHE_NEGATIVE_TTL', 60))
+
+
+class ProfileCache:
+    """Thread-safe LRU cache of caller profiles with per-entry expiry"""
+
+    def __init__(self, max_size=CACHE_SIZE, ttl=CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, phone_number):
+        """Return a copy of the cached profile, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(phone_number)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[phone_number]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(phone_number)
+            expires_at, profile, known = entry
+            if known:
+                self.hits += 1
+            else:
+                self.negative_hits += 1
+            # Callers mutate the returned dict (e.g. /test/simulate-call)
+            return dict(profile)
+
+    def put(self, phone_number, profile, known=True):
+        ttl = self.ttl if known else self.negative_ttl
+        with self._lock:
+            self._entries[phone_number] = (time.monotonic() + ttl, dict(profile), known)
+            self._entries.move_to_end(phone_number)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, phone_number=None):
+        """Drop one number, or everything when no number is given"""
+        with self._lock:
+            if phone_number is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(phone_number, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            }
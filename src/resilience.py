@@ -0,0 +1,254 @@
+"""
+Resilience Module
+Per-request deadlines, hedged requests and circuit breakers for calls to OpenAI and ElevenLabs
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .metrics import metrics
+
+# Consecutive failures (errors or missed deadlines) that open a provider's circuit
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', 5))
+# How long an open circuit skips the provider before letting one probe through
+BREAKER_RESET_SECONDS = float(os.getenv('BREAKER_RESET_SECONDS', 30))
+# Send a second, identical request once the first has run past this percentile
+# of recent latencies (0 disables hedging)
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 0))
+# Recent successful latencies kept per provider, and how many are needed before hedging
+LATENCY_WINDOW = int(os.getenv('HEDGE_LATENCY_WINDOW', 200))
+HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))
+# Threads running guarded calls; calls abandoned at their deadline keep one until they return
+GUARD_WORKERS = int(os.getenv('GUARD_WORKERS', 16))
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class Deadline:
+    """A point in time a request has to be answered by"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def expired(self):
+        return time.monotonic() >= self.expires
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and failures are counted. After
+    `failure_threshold` consecutive failures the circuit opens and allow()
+    refuses every call for `reset_after` seconds; then a single probe is let
+    through (half-open), which closes the circuit again on success or
+    re-opens it on failure. A probe that never reports back (cancelled) is
+    given up on after another `reset_after`.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_after=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = None
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        """True while calls would be refused (does not use up the half-open probe)"""
+        with self._lock:
+            if self.state == 'closed':
+                return False
+            return time.monotonic() - self.opened_at < self.reset_after
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.reset_after:
+                self.state = 'half_open'
+                self.opened_at = now
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                if self.state == 'closed':
+                    self.opened += 1
+                    print(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {'state': self.state, 'consecutive_failures': self.failures, 'times_opened': self.opened}
+
+
+class Guard:
+    """
+    Runs calls to one provider behind its circuit breaker, within a deadline.
+
+    call(fn, deadline) runs `fn` on the guard's pool and waits at most until
+    the deadline, raising DeadlineExceeded if it passes (the call itself
+    cannot be cancelled and finishes in the background). When hedging is
+    enabled and `fn` is still running once it has taken longer than
+    HEDGE_PERCENTILE of recent calls, an identical second request is sent
+    and whichever answers first wins. Errors and missed deadlines count
+    against the breaker; while it is open, call() raises CircuitOpen
+    without touching the provider.
+    """
+
+    def __init__(self, name, breaker=None, hedge_percentile=HEDGE_PERCENTILE,
+                 window=LATENCY_WINDOW, min_samples=HEDGE_MIN_SAMPLES, workers=GUARD_WORKERS):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker(name)
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-call")
+
+    @property
+    def available(self):
+        return not self.breaker.is_open
+
+    def hedge_delay(self):
+        """Seconds after which a second request is sent, or None"""
+        if not self.hedge_percentile:
+            return None
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.hedge_percentile / 100))
+        return ordered[index]
+
+    def record(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def admit(self):
+        """Breaker check for calls made outside call() (streams); raises CircuitOpen"""
+        if not self.breaker.allow():
+            metrics.inc('breaker_rejections_total', dependency=self.name)
+            raise CircuitOpen(f"{self.name} circuit is open")
+
+    def finished(self, deadline=None):
+        """Report a call made outside call() that answered; late answers count as failures"""
+        if deadline is not None and deadline.expired:
+            self.breaker.failure()
+            metrics.inc('deadline_misses_total', dependency=self.name)
+        else:
+            self.breaker.success()
+
+    def failed(self):
+        """Report a call made outside call() that raised"""
+        self.breaker.failure()
+
+    def call(self, fn, deadline=None):
+        self.admit()
+        start = time.perf_counter()
+        hedge_at = self.hedge_delay()
+        attempts = {self._executor.submit(metrics.carry(fn))}
+        hedged = False
+        error = None
+
+        while attempts:
+            timeout = deadline.remaining() if deadline else None
+            if hedge_at is not None and not hedged:
+                until_hedge = max(0.0, hedge_at - (time.perf_counter() - start))
+                timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+            done, attempts = wait(attempts, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.exception() is None:
+                    self.record(time.perf_counter() - start)
+                    self.breaker.success()
+                    return future.result()
+                error = future.exception()
+
+            if deadline and deadline.expired and attempts:
+                self.breaker.failure()
+                metrics.inc('deadline_misses_total', dependency=self.name)
+                raise DeadlineExceeded(f"{self.name} did not answer within {deadline.seconds:.1f}s")
+
+            if attempts and hedge_at is not None and not hedged and time.perf_counter() - start >= hedge_at:
+                hedged = True
+                metrics.inc('hedged_requests_total', dependency=self.name)
+                attempts.add(self._executor.submit(metrics.carry(fn)))
+
+        self.breaker.failure()
+        raise error
+
+    async def acall(self, fn, deadline=None):
+        """
+        call() for coroutines: `fn` returns a fresh awaitable per attempt.
+        Unlike threads, attempts still running when the deadline passes (or
+        the hedge that lost) are cancelled.
+        """
+        self.admit()
+        start = time.perf_counter()
+        hedge_at = self.hedge_delay()
+        attempts = {asyncio.ensure_future(fn())}
+        hedged = False
+        error = None
+
+        try:
+            while attempts:
+                timeout = deadline.remaining() if deadline else None
+                if hedge_at is not None and not hedged:
+                    until_hedge = max(0.0, hedge_at - (time.perf_counter() - start))
+                    timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+                done, attempts = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for future in done:
+                    if future.exception() is None:
+                        self.record(time.perf_counter() - start)
+                        self.breaker.success()
+                        return future.result()
+                    error = future.exception()
+
+                if deadline and deadline.expired and attempts:
+                    self.breaker.failure()
+                    metrics.inc('deadline_misses_total', dependency=self.name)
+                    raise DeadlineExceeded(f"{self.name} did not answer within {deadline.seconds:.1f}s")
+
+                if attempts and hedge_at is not None and not hedged and time.perf_counter() - start >= hedge_at:
+                    hedged = True
+                    metrics.inc('hedged_requests_total', dependency=self.name)
+                    attempts.add(asyncio.ensure_future(fn()))
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+        self.breaker.failure()
+        raise error
+
+    def stats(self):
+        stats = self.breaker.stats()
+        stats['hedge_after_seconds'] = self.hedge_delay()
+        return stats
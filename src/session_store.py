@@ -0,0 +1,156 @@
+"""
+Session Store Module
+Per-CallSid conversation state for multi-turn calls, shared by all workers, bounded by count, age and prompt size
+"""
+
+import json
+import os
+import time
+
+MAX_SESSIONS = int(os.getenv('CONVERSATION_MAX_SESSIONS', 1000))
+SESSION_TTL = float(os.getenv('CONVERSATION_TTL_SECONDS', 900))
+# Rough prompt budget for conversation history sent to the LLM
+TOKEN_BUDGET = int(os.getenv('CONVERSATION_TOKEN_BUDGET', 1200))
+# Cheap token estimate; good enough for budgeting English speech
+CHARS_PER_TOKEN = 4
+EARLIER_NOTE_CHARS = 240
+
+USER = 'user'
+ASSISTANT = 'assistant'
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 4
+
+
+def format_transcript(turns):
+    """(role, text) turns -> 'Caller: ...' / 'AI: ...' lines"""
+    return '\n'.join(f"{'Caller' if role == USER else 'AI'}: {text}" for role, text in turns)
+
+
+class Session:
+    __slots__ = ('call_sid', 'phone_number', 'prompt', 'turns', 'last_seen')
+
+    def __init__(self, call_sid, phone_number, prompt):
+        self.call_sid = call_sid
+        self.phone_number = phone_number
+        self.prompt = prompt
+        self.turns = []
+        self.last_seen = time.monotonic()
+
+    def history(self, token_budget=TOKEN_BUDGET):
+        """
+        Chat messages for the most recent turns that fit in `token_budget`.
+
+        Older turns are dropped; if any were, the caller's first turn (usually
+        why they called) is kept as a short note so the reply stays on topic.
+        """
+        messages = []
+        used = 0
+        for role, text in reversed(self.turns):
+            cost = estimate_tokens(text)
+            if messages and used + cost > token_budget:
+                break
+            messages.append({"role": role, "content": text})
+            used += cost
+        messages.reverse()
+
+        if len(messages) < len(self.turns):
+            opener = next((text for role, text in self.turns if role == USER), None)
+            if opener:
+                messages.insert(0, {
+                    "role": "system",
+                    "content": f"Earlier in this call the caller said: {opener[:EARLIER_NOTE_CHARS]}"
+                })
+        return messages
+
+    def transcript(self):
+        return format_transcript(self.turns)
+
+    def caller_text(self):
+        return '\n'.join(text for role, text in self.turns if role == USER)
+
+
+class SessionStore:
+    """
+    Sessions kept in SQLite (conversation_sessions / conversation_turns),
+    so every worker sees every call: a turn or /call-status for a CallSid
+    can land on any process. Sessions idle longer than `ttl` and the least
+    recently active ones beyond `max_sessions` are removed when sessions
+    are started or fetched; `on_evict(session)` lets the owner persist
+    them, in the same transaction, so exactly one process does.
+    """
+
+    def __init__(self, db, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL, on_evict=None):
+        self.db = db
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.on_evict = on_evict
+
+    def start(self, call_sid, phone_number, prompt):
+        session = Session(call_sid, phone_number, prompt)
+        with self.db.transaction() as conn:
+            # Replacing the row drops any turns left from an earlier session
+            conn.execute("DELETE FROM conversation_sessions WHERE call_sid = ?", (call_sid,))
+            conn.execute("""
+                INSERT INTO conversation_sessions (call_sid, phone_number, prompt, last_seen)
+                VALUES (?, ?, ?, ?)
+            """, (call_sid, phone_number, json.dumps(prompt), time.time()))
+            self._sweep(conn)
+        return session
+
+    def get(self, call_sid):
+        with self.db.transaction() as conn:
+            self._sweep(conn)
+            session = self._load(conn, call_sid)
+            if session is not None:
+                conn.execute("UPDATE conversation_sessions SET last_seen = ? WHERE call_sid = ?",
+                             (time.time(), call_sid))
+        return session
+
+    def add_turn(self, session, role, text):
+        with self.db.transaction() as conn:
+            conn.execute("""
+                INSERT INTO conversation_turns (call_sid, seq, role, text)
+                SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM conversation_turns WHERE call_sid = ?
+            """, (session.call_sid, role, text, session.call_sid))
+            conn.execute("UPDATE conversation_sessions SET last_seen = ? WHERE call_sid = ?",
+                         (time.time(), session.call_sid))
+        session.turns.append((role, text))
+        session.last_seen = time.monotonic()
+
+    def end(self, call_sid):
+        """Remove and return the session (None if unknown, already ended or expired)"""
+        with self.db.transaction() as conn:
+            session = self._load(conn, call_sid)
+            if session is not None:
+                conn.execute("DELETE FROM conversation_sessions WHERE call_sid = ?", (call_sid,))
+        return session
+
+    def __len__(self):
+        return self.db._connect().execute("SELECT COUNT(*) FROM conversation_sessions").fetchone()[0]
+
+    def _load(self, conn, call_sid):
+        row = conn.execute("SELECT phone_number, prompt FROM conversation_sessions WHERE call_sid = ?",
+                           (call_sid,)).fetchone()
+        if row is None:
+            return None
+        session = Session(call_sid, row[0], json.loads(row[1]))
+        session.turns = [tuple(turn) for turn in conn.execute(
+            "SELECT role, text FROM conversation_turns WHERE call_sid = ? ORDER BY seq", (call_sid,))]
+        return session
+
+    def _sweep(self, conn):
+        # Runs inside the caller's transaction, so a session is evicted (and saved) once
+        victims = conn.execute("""
+            SELECT call_sid FROM conversation_sessions WHERE last_seen < ?
+            UNION
+            SELECT call_sid FROM (
+                SELECT call_sid FROM conversation_sessions ORDER BY last_seen DESC LIMIT -1 OFFSET ?
+            )
+        """, (time.time() - self.ttl, self.max_sessions)).fetchall()
+        for call_sid, in victims:
+            session = self._load(conn, call_sid)
+            conn.execute("DELETE FROM conversation_sessions WHERE call_sid = ?", (call_sid,))
+            if self.on_evict:
+                self.on_evict(session)
@@ -1,15 +1,169 @@
 from src.database import Database
+from src.metrics import metrics
+from src.status_schedule import SCHEDULE_DEFAULT_ACTIVITY, StatusSchedule
 from datetime import datetime
+import os
+import threading
+import time
+
+# How long a process trusts its in-memory status before re-reading the
+# register row, so updates made by other workers are picked up.
+STATUS_REFRESH_SECONDS = float(os.getenv('STATUS_REFRESH_SECONDS', 5))
+# Longest the watcher sleeps between checks when no scheduled change is due
+STATUS_WATCH_SECONDS = float(os.getenv('STATUS_WATCH_SECONDS', 60))
+
 
 class StatusManager:
-    def __init__(self):
-        self.db = Database()
+    """
+    The activity callers are told about.
+
+    An explicit update_status() wins until its override expires; by default
+    that is the next scheduled change, so setting "Driving" during a meeting
+    lasts until the meeting ends. Otherwise the scheduled block covering now
+    applies, then SCHEDULE_DEFAULT_ACTIVITY between blocks. Without a
+    schedule (or with `hold`) the last explicit status stays, as before;
+    importing a schedule ends an indefinite hold.
+    """
+
+    def __init__(self, db=None, refresh_seconds=STATUS_REFRESH_SECONDS):
+        self.db = db or Database()
+        self.refresh_seconds = refresh_seconds
+        self.schedule = StatusSchedule(self.db)
+        self._lock = threading.Lock()
+        # Read on first use, so building one opens no connection (e.g. before a fork)
+        self._current = None
+        self._override_until = None
+        self._loaded_at = None
+        self._listeners = []
+        self._last_activity = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _load(self):
+        status = self.db.get_current_status()
+        self.schedule.refresh()
+        with self._lock:
+            self._set(status)
 
+    def _set(self, status):
+        self._current = status
+        until = status.get('override_until')
+        self._override_until = datetime.fromisoformat(until).timestamp() if until else None
+        self._loaded_at = time.monotonic()
+
+    def _fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self._load()
+
+    def _resolve(self, now):
+        current = self._current
+        if self._override_until is None or now < self._override_until:
+            return {'activity': current['activity'], 'updated_at': current['updated_at'],
+                    'source': 'manual', 'until': current.get('override_until')}
+
+        block = self.schedule.index.lookup(now)
+        if block is not None:
+            activity, start, end = block
+            return {'activity': activity, 'updated_at': datetime.fromtimestamp(start).isoformat(),
+                    'source': 'schedule', 'until': datetime.fromtimestamp(end).isoformat()}
+        if self.schedule.empty:
+            return {'activity': current['activity'], 'updated_at': current['updated_at'],
+                    'source': 'manual', 'until': None}
+        return {'activity': SCHEDULE_DEFAULT_ACTIVITY, 'updated_at': None, 'source': 'default', 'until': None}
+
+    @metrics.timed('get_current_status')
     def get_current_status(self):
-        """What are you doing right now?"""
-        return self.db.get_current_status()
+        """What are you doing right now? An O(log n) lookup in the schedule index"""
+        self._fresh()
+        return self._resolve(time.time())
+
+    def update_status(self, activity, until=None, hold=False):
+        """
+        Set your activity. It overrides the schedule until `until` (ISO),
+        indefinitely with `hold`, and by default until the next scheduled change.
+        """
+        self._fresh()
+        if hold:
+            override_until = None
+        elif until is not None:
+            override_until = datetime.fromisoformat(until).isoformat()
+        elif self.schedule.empty:
+            override_until = None
+        else:
+            now = time.time()
+            change = self.schedule.index.next_change(now) or self.schedule.index.horizon
+            override_until = datetime.fromtimestamp(change).isoformat()
+
+        with self._lock:
+            status = self.db.update_status(activity, override_until)
+            self._set(status)
+            self._last_activity = activity
+        return {'status': 'updated', 'activity': activity, 'updated_at': status['updated_at'],
+                'until': override_until}
+
+    def get_status_history(self, start=None, end=None, limit=None):
+        """Timeline of explicitly set activities overlapping a time range"""
+        return self.db.get_status_history(start=start, end=end, limit=limit)
+
+    def get_schedule(self, hours=24):
+        """Stored blocks and the resolved schedule for the next `hours`"""
+        self._fresh()
+        now = time.time()
+        upcoming = self.schedule.index.between(now, now + hours * 3600) if self.schedule.index else []
+        return {
+            'blocks': self.db.get_status_schedule(),
+            'upcoming': [
+                {'activity': activity,
+                 'start': datetime.fromtimestamp(start).isoformat(),
+                 'end': datetime.fromtimestamp(end).isoformat()}
+                for activity, start, end in upcoming
+            ],
+            'index': self.schedule.stats(),
+        }
+
+    def reload(self):
+        """Pick up a schedule change made by this process right away"""
+        self._load()
+
+    # -- watching for scheduled changes --------------------------------------
+
+    def add_listener(self, callback):
+        """Call `callback()` whenever the resolved activity changes on its own (a block starts or ends)"""
+        self._listeners.append(callback)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='status-watcher', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            wait = STATUS_WATCH_SECONDS
+            try:
+                wait = min(wait, self.check())
+            except Exception as e:
+                print(f"Status watch error: {e}")
+            self._stop.wait(max(wait, 0.05))
+
+    def check(self, now=None):
+        """Notify listeners if the activity changed; returns seconds until the next scheduled change"""
+        self._load()
+        now = time.time() if now is None else now
+        activity = self._resolve(now)['activity']
+        with self._lock:
+            changed, self._last_activity = self._last_activity not in (None, activity), activity
+        if changed:
+            for callback in self._listeners:
+                callback()
 
-    def update_status(self, activity):
-        """Set your activity"""
-        self.db.update_status(activity)
-        return {'status': 'updated', 'activity': activity}
\ No newline at end of file
+        index = self.schedule.index
+        candidates = [index.next_change(now)] if index else []
+        if self._override_until is not None:
+            candidates.append(self._override_until)
+        pending = [when - now for when in candidates if when is not None and when > now]
+        return min(pending) if pending else STATUS_WATCH_SECONDS
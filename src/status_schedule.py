@@ -0,0 +1,559 @@
+"""
+Status Schedule Module
+Imports one-off and recurring status blocks (iCalendar or JSON) and expands them into a sorted interval index for call-time lookups
+"""
+
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+from .contact_import import unescape_text, unfold_lines
+from .metrics import metrics
+
+# How far ahead recurring blocks are expanded; the index is extended once
+# less than half of this is left
+SCHEDULE_HORIZON_DAYS = float(os.getenv('SCHEDULE_HORIZON_DAYS', 14))
+# Activity reported between scheduled blocks once an explicit status has expired
+SCHEDULE_DEFAULT_ACTIVITY = os.getenv('SCHEDULE_DEFAULT_ACTIVITY', 'Available')
+# Past intervals kept in the index (for listings), in seconds
+SCHEDULE_KEEP_PAST_SECONDS = 24 * 3600
+# Import errors reported back per request
+MAX_REPORTED_ERRORS = 50
+
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+FREQUENCIES = ('DAILY', 'WEEKLY', 'MONTHLY')
+
+_DURATION = re.compile(r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$')
+
+
+# -- recurrence rules ---------------------------------------------------------
+
+def parse_rrule(text):
+    """
+    RRULE text -> dict, for the subset the schedule expands: FREQ=DAILY,
+    WEEKLY or MONTHLY (same day of the month) with INTERVAL, UNTIL, COUNT
+    and, for WEEKLY, BYDAY. Anything else raises ValueError.
+    """
+    parts = {}
+    for part in text.strip().removeprefix('RRULE:').split(';'):
+        if part.strip():
+            key, _, value = part.partition('=')
+            parts[key.strip().upper()] = value.strip()
+
+    rule = {'freq': parts.pop('FREQ', '').upper(), 'interval': 1, 'until': None, 'count': None, 'byday': None}
+    if rule['freq'] not in FREQUENCIES:
+        raise ValueError(f"Unsupported FREQ {rule['freq'] or '(missing)'}; use one of {', '.join(FREQUENCIES)}")
+    if 'INTERVAL' in parts:
+        rule['interval'] = int(parts.pop('INTERVAL'))
+        if rule['interval'] < 1:
+            raise ValueError("INTERVAL must be at least 1")
+    if 'UNTIL' in parts:
+        rule['until'] = _parse_datetime(parts.pop('UNTIL'))
+    if 'COUNT' in parts:
+        rule['count'] = int(parts.pop('COUNT'))
+    if 'BYDAY' in parts:
+        days = [day.strip().upper() for day in parts.pop('BYDAY').split(',')]
+        if rule['freq'] != 'WEEKLY' or not all(day in WEEKDAYS for day in days):
+            raise ValueError("BYDAY is only supported as plain weekdays (MO..SU) with FREQ=WEEKLY")
+        rule['byday'] = sorted({WEEKDAYS.index(day) for day in days})
+    parts.pop('WKST', None)
+    if parts:
+        raise ValueError(f"Unsupported RRULE part(s): {', '.join(sorted(parts))}")
+    return rule
+
+
+def format_rrule(rule):
+    """The normalized RRULE text stored for a parsed rule"""
+    text = f"FREQ={rule['freq']}"
+    if rule['interval'] != 1:
+        text += f";INTERVAL={rule['interval']}"
+    if rule['byday']:
+        text += ";BYDAY=" + ','.join(WEEKDAYS[day] for day in rule['byday'])
+    if rule['until']:
+        text += ";UNTIL=" + rule['until'].strftime('%Y%m%dT%H%M%S')
+    if rule['count']:
+        text += f";COUNT={rule['count']}"
+    return text
+
+
+def _add_months(value, months):
+    month = value.month - 1 + months
+    year, month = value.year + month // 12, month % 12 + 1
+    try:
+        return value.replace(year=year, month=month)
+    except ValueError:
+        # No such day that month (e.g. the 31st)
+        return None
+
+
+def _candidates(start, duration, rule, after):
+    """
+    (ordinal, start) of a rule's occurrences, in order, skipping straight to
+    the first that can end after `after` instead of walking from `start`.
+    """
+    interval = rule['interval']
+    skip = max(after - duration - start, timedelta(0))
+
+    if rule['freq'] == 'DAILY':
+        k = skip.days // interval
+        while True:
+            yield k, start + timedelta(days=k * interval)
+            k += 1
+
+    elif rule['freq'] == 'WEEKLY':
+        days = rule['byday'] or [start.weekday()]
+        first = [day for day in days if day >= start.weekday()]
+        week = datetime.combine(start.date() - timedelta(days=start.weekday()), start.time())
+        p = skip.days // (7 * interval)
+        n = 0 if p == 0 else len(first) + (p - 1) * len(days)
+        while True:
+            for day in (first if p == 0 else days):
+                yield n, week + timedelta(weeks=p * interval, days=day)
+                n += 1
+            p += 1
+
+    else:
+        # Months without the day are skipped and not counted, so a COUNT
+        # series has to be walked from its start
+        k = 0 if rule['count'] else (skip.days // 31) // interval
+        n = 0
+        while True:
+            occurrence = _add_months(start, k * interval)
+            if occurrence is not None:
+                yield n, occurrence
+                n += 1
+            k += 1
+
+
+def occurrences(start, end, rule=None, exdates=(), after=None):
+    """
+    (start, end) datetimes of a block's occurrences that end after `after`,
+    in order; endless for an open-ended rule, so callers pull lazily.
+    """
+    duration = end - start
+    after = after or start
+    if rule is None:
+        if end > after:
+            yield start, end
+        return
+
+    exdates = set(exdates)
+    for n, occurrence in _candidates(start, duration, rule, after):
+        if rule['count'] is not None and n >= rule['count']:
+            return
+        if rule['until'] is not None and occurrence > rule['until']:
+            return
+        if occurrence + duration > after and occurrence not in exdates:
+            yield occurrence, occurrence + duration
+
+
+# -- parsing ------------------------------------------------------------------
+
+def _parse_datetime(value, tzid=None):
+    """ISO or iCalendar date/time -> naive local time"""
+    value = value.strip()
+    if re.fullmatch(r'\d{8}(T\d{4}(\d{2})?Z?)?', value):
+        utc = value.endswith('Z')
+        digits = value.rstrip('Z')
+        fmt = '%Y%m%d' if len(digits) == 8 else '%Y%m%dT%H%M%S' if len(digits) == 15 else '%Y%m%dT%H%M'
+        parsed = datetime.strptime(digits, fmt)
+        if utc:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+    else:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    if parsed.tzinfo is None and tzid:
+        try:
+            from zoneinfo import ZoneInfo
+            parsed = parsed.replace(tzinfo=ZoneInfo(tzid))
+        except (ImportError, KeyError, ValueError):
+            # Unknown zone (e.g. a Windows name): treat as local time
+            pass
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def _parse_duration(value):
+    match = _DURATION.match(value.strip())
+    if not match:
+        raise ValueError(f"Unrecognized DURATION {value!r}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+
+def _block(activity, start, end, rule=None, exdates=(), source=None):
+    """Validated block record; raises ValueError"""
+    if not activity or not str(activity).strip():
+        raise ValueError("Missing activity")
+    if start is None or end is None:
+        raise ValueError("Missing start or end")
+    if end <= start:
+        raise ValueError("Block ends before it starts")
+    return {
+        'activity': str(activity).strip(),
+        'start': start,
+        'end': end,
+        'rule': rule,
+        'exdates': sorted(exdates),
+        'source': source,
+    }
+
+
+def _json_rule(item):
+    if item.get('rrule'):
+        return parse_rrule(item['rrule'])
+    repeat = (item.get('repeat') or '').lower()
+    if not repeat:
+        return None
+    if repeat == 'weekdays':
+        repeat, days = 'weekly', WEEKDAYS[:5]
+    else:
+        days = item.get('days')
+    text = f"FREQ={repeat.upper()}"
+    if days:
+        text += ";BYDAY=" + ','.join(str(day)[:2].upper() for day in days)
+    for key in ('interval', 'count'):
+        if item.get(key):
+            text += f";{key.upper()}={item[key]}"
+    if item.get('until'):
+        text += f";UNTIL={_parse_datetime(item['until']).strftime('%Y%m%dT%H%M%S')}"
+    return parse_rrule(text)
+
+
+def parse_json(data):
+    """
+    Yield (index, block) for each entry of a JSON schedule: a list of blocks,
+    or {"blocks": [...]}. A block has activity, start and end (ISO), and
+    optionally "repeat" (daily, weekly, monthly or weekdays) with "days"
+    (["MO", "WE"]), "interval", "until" and "count", or an "rrule" string.
+    Invalid entries yield (index, ValueError).
+    """
+    items = data.get('blocks', []) if isinstance(data, dict) else data
+    for index, item in enumerate(items or []):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("Block must be an object")
+            start = _parse_datetime(item['start']) if item.get('start') else None
+            end = _parse_datetime(item['end']) if item.get('end') else None
+            if start is not None and end is None and item.get('minutes'):
+                end = start + timedelta(minutes=float(item['minutes']))
+            exdates = [_parse_datetime(value) for value in item.get('except', [])]
+            yield index, _block(item.get('activity'), start, end, _json_rule(item), exdates, 'json')
+        except (ValueError, TypeError) as e:
+            yield index, ValueError(str(e))
+
+
+def _ics_property(line):
+    """'DTSTART;TZID=Europe/Paris:20261019T090000' -> ('DTSTART', {'TZID': ...}, '20261019T090000')"""
+    head, _, value = line.partition(':')
+    name, *params = head.split(';')
+    return name.strip().upper(), dict(p.split('=', 1) for p in params if '=' in p), value
+
+
+def parse_ics(stream):
+    """
+    Yield (line_number, block) for each VEVENT of an iCalendar file.
+
+    SUMMARY gives the activity. DTEND or DURATION give the end (all-day
+    events last the whole day). RRULE and EXDATE are honoured, and an event
+    overriding one occurrence of a series (RECURRENCE-ID) replaces it.
+    Cancelled and free (TRANSP:TRANSPARENT) events are skipped. Invalid
+    events yield (line_number, ValueError).
+    """
+    events = []
+    event = None
+    for number, line in unfold_lines(stream):
+        if not line.strip():
+            continue
+        name, params, value = _ics_property(line)
+        if name == 'BEGIN' and value.strip().upper() == 'VEVENT':
+            event = {'line': number, 'exdates': []}
+        elif event is None:
+            continue
+        elif name == 'END' and value.strip().upper() == 'VEVENT':
+            events.append(event)
+            event = None
+        elif name in ('DTSTART', 'DTEND', 'RECURRENCE-ID'):
+            event[name] = (params, value)
+        elif name == 'EXDATE':
+            event['exdates'] += [(params, v) for v in value.split(',')]
+        elif name in ('SUMMARY', 'RRULE', 'DURATION', 'UID', 'STATUS', 'TRANSP'):
+            event[name] = value.strip()
+
+    overridden = {}
+    for event in events:
+        if 'RECURRENCE-ID' in event and 'UID' in event:
+            params, value = event['RECURRENCE-ID']
+            overridden.setdefault(event['UID'], []).append(_ics_datetime(params, value))
+
+    for event in events:
+        if event.get('STATUS', '').upper() == 'CANCELLED' or event.get('TRANSP', '').upper() == 'TRANSPARENT':
+            continue
+        try:
+            if 'DTSTART' not in event:
+                raise ValueError("VEVENT without DTSTART")
+            start = _ics_datetime(*event['DTSTART'])
+            if 'DTEND' in event:
+                end = _ics_datetime(*event['DTEND'])
+            elif 'DURATION' in event:
+                end = start + _parse_duration(event['DURATION'])
+            else:
+                # No end: a date lasts the day, a date-time is an instant
+                end = start + (timedelta(days=1) if _is_date(*event['DTSTART']) else timedelta(0))
+            rule = parse_rrule(event['RRULE']) if event.get('RRULE') else None
+            exdates = [_ics_datetime(params, value) for params, value in event['exdates']]
+            if rule is not None:
+                exdates += overridden.get(event.get('UID'), [])
+            yield event['line'], _block(unescape_text(event.get('SUMMARY', '')), start, end,
+                                        rule, exdates, 'ics')
+        except (ValueError, TypeError) as e:
+            yield event['line'], ValueError(str(e))
+
+
+def _is_date(params, value):
+    return params.get('VALUE', '').upper() == 'DATE' or len(value.strip()) == 8
+
+
+def _ics_datetime(params, value):
+    return _parse_datetime(value, tzid=params.get('TZID'))
+
+
+def read_schedule(body, fmt=None, filename=None, content_type=None):
+    """Parse an uploaded schedule, detecting iCalendar vs JSON unless `fmt` is given"""
+    if fmt is None:
+        filename = (filename or '').lower()
+        is_ics = (filename.endswith(('.ics', '.ical')) or 'calendar' in (content_type or '')
+                  or body.lstrip('\ufeff').lstrip().upper().startswith('BEGIN:VCALENDAR'))
+        fmt = 'ics' if is_ics else 'json'
+    if fmt == 'ics':
+        return parse_ics(body.splitlines())
+    return parse_json(json.loads(body))
+
+
+def import_schedule(db, records, replace=False):
+    """
+    Store (position, block) pairs in one transaction, reporting invalid ones
+    individually. With `replace` the new blocks replace the whole schedule
+    (only if at least one is valid).
+    """
+    result = {'imported': 0, 'failed': 0, 'errors': []}
+    rows = []
+    for position, block in records:
+        if isinstance(block, ValueError):
+            result['failed'] += 1
+            if len(result['errors']) < MAX_REPORTED_ERRORS:
+                result['errors'].append({'line': position, 'error': str(block)})
+            continue
+        rows.append((
+            block['activity'],
+            block['start'].isoformat(),
+            block['end'].isoformat(),
+            format_rrule(block['rule']) if block['rule'] else None,
+            ','.join(value.isoformat() for value in block['exdates']) or None,
+            block['source'],
+        ))
+    if rows:
+        result['imported'] = db.add_status_blocks(rows, replace=replace)
+    return result
+
+
+# -- interval index -----------------------------------------------------------
+
+class ScheduleIndex:
+    """
+    Scheduled blocks flattened into sorted, non-overlapping intervals.
+
+    Lookups are a binary search over interval starts. Where blocks overlap
+    the one that started last wins (a meeting inside a working day), then
+    the shorter one, then the later import. Recurring blocks are expanded
+    lazily up to a horizon: each block keeps a paused occurrence generator
+    on a heap ordered by its next start, so extend() only touches the
+    occurrences that fall in the new window. Intervals before the old
+    horizon are final; only the tail after it is recomputed.
+    """
+
+    def __init__(self, blocks, now):
+        self._heap = []
+        self._sources = {}
+        self._carry = []
+        # Start a little in the past so blocks in progress keep their real start
+        self._horizon = now - SCHEDULE_KEEP_PAST_SECONDS
+        # (starts, ends, activities) epoch seconds; replaced whole, so readers need no lock
+        self._intervals = ([], [], [])
+        self._lock = threading.Lock()
+        after = datetime.fromtimestamp(self._horizon)
+        for seq, block in enumerate(blocks):
+            generator = occurrences(block['start'], block['end'], block['rule'], block['exdates'], after=after)
+            self._sources[seq] = (generator, block['activity'])
+            self._push(seq)
+
+    def _push(self, seq):
+        generator, _ = self._sources[seq]
+        occurrence = next(generator, None)
+        if occurrence is None:
+            del self._sources[seq]
+        else:
+            heapq.heappush(self._heap, (occurrence[0].timestamp(), seq, occurrence[1].timestamp()))
+
+    @property
+    def horizon(self):
+        return self._horizon
+
+    def extend(self, until, now=None):
+        """Expand occurrences starting before `until` and rebuild the tail after the old horizon"""
+        with self._lock:
+            if until <= self._horizon:
+                return 0
+            low = self._horizon
+            window = list(self._carry)
+            while self._heap and self._heap[0][0] < until:
+                start, seq, end = heapq.heappop(self._heap)
+                window.append((start, end, seq, self._sources[seq][1]))
+                self._push(seq)
+            added = len(window) - len(self._carry)
+
+            starts, ends, activities = (list(part) for part in self._intervals)
+            # Keep what is final: cut the interval crossing the old horizon, drop those after it
+            keep = bisect_left(starts, low)
+            del starts[keep:], ends[keep:], activities[keep:]
+            if ends and ends[-1] > low:
+                ends[-1] = low
+            for start, end, activity in _flatten(window, low):
+                if ends and ends[-1] == start and activities[-1] == activity:
+                    ends[-1] = end
+                else:
+                    starts.append(start)
+                    ends.append(end)
+                    activities.append(activity)
+
+            if now is not None:
+                expired = bisect_right(ends, now - SCHEDULE_KEEP_PAST_SECONDS)
+                del starts[:expired], ends[:expired], activities[:expired]
+
+            self._carry = [item for item in window if item[1] > until]
+            self._intervals = (starts, ends, activities)
+            self._horizon = until
+            return added
+
+    def lookup(self, at):
+        """(activity, start, end) of the interval covering epoch time `at`, or None"""
+        starts, ends, activities = self._intervals
+        i = bisect_right(starts, at) - 1
+        if i >= 0 and at < ends[i]:
+            return activities[i], starts[i], ends[i]
+        return None
+
+    def next_change(self, at):
+        """When the scheduled activity next changes after `at` (None: not within the horizon)"""
+        starts, ends, _ = self._intervals
+        i = bisect_right(starts, at)
+        if i > 0 and at < ends[i - 1]:
+            return ends[i - 1]
+        return starts[i] if i < len(starts) else None
+
+    def between(self, start, end):
+        """Intervals overlapping [start, end), as (activity, start, end)"""
+        starts, ends, activities = self._intervals
+        i = max(bisect_right(starts, start) - 1, 0)
+        result = []
+        while i < len(starts) and starts[i] < end:
+            if ends[i] > start:
+                result.append((activities[i], starts[i], ends[i]))
+            i += 1
+        return result
+
+    def __len__(self):
+        return len(self._intervals[0])
+
+
+def _flatten(window, low):
+    """
+    (start, end, seq, activity) occurrences -> disjoint (start, end, activity)
+    from `low` on, by sweeping their boundaries with the active ones on a
+    heap ordered by priority (ended ones are dropped as they surface).
+    """
+    window = sorted((max(start, low), end, start, seq, activity)
+                    for start, end, seq, activity in window if end > low)
+    boundaries = sorted({point for item in window for point in item[:2]})
+    active = []
+    i = 0
+    for point, following in zip(boundaries, boundaries[1:]):
+        while i < len(window) and window[i][0] <= point:
+            clipped, end, start, seq, activity = window[i]
+            heapq.heappush(active, (-start, end, -seq, activity))
+            i += 1
+        while active and active[0][1] <= point:
+            heapq.heappop(active)
+        if active:
+            yield point, following, active[0][3]
+
+
+class StatusSchedule:
+    """
+    The stored schedule as an in-memory ScheduleIndex per process.
+
+    refresh() is cheap: it rebuilds only when another import or delete has
+    changed the stored blocks (one indexed MAX/COUNT query) and extends the
+    index once less than half the horizon is left, so expansion is paid
+    once per change or per half-horizon, never per lookup.
+    """
+
+    def __init__(self, db, horizon_days=SCHEDULE_HORIZON_DAYS):
+        self.db = db
+        self.horizon = horizon_days * 86400
+        self.index = None
+        self._version = None
+        self._blocks = 0
+        self._lock = threading.Lock()
+        self.rebuilt_at = None
+
+    def refresh(self, now=None):
+        now = time.time() if now is None else now
+        version = self.db.status_schedule_version()
+        with self._lock:
+            if version != self._version or self.index is None:
+                self._rebuild(now)
+                self._version = version
+            elif self.index.horizon - now < self.horizon / 2:
+                started = time.perf_counter()
+                self.index.extend(now + self.horizon, now=now)
+                metrics.observe('status_schedule_expand_seconds', time.perf_counter() - started, reason='horizon')
+
+    def _rebuild(self, now):
+        started = time.perf_counter()
+        blocks = []
+        for row in self.db.get_status_schedule():
+            blocks.append({
+                'activity': row['activity'],
+                'start': datetime.fromisoformat(row['starts_at']),
+                'end': datetime.fromisoformat(row['ends_at']),
+                'rule': parse_rrule(row['rrule']) if row['rrule'] else None,
+                'exdates': [datetime.fromisoformat(value) for value in row['exdates']],
+            })
+        index = ScheduleIndex(blocks, now)
+        index.extend(now + self.horizon, now=now)
+        self.index = index
+        self._blocks = len(blocks)
+        self.rebuilt_at = datetime.now().isoformat()
+        metrics.observe('status_schedule_expand_seconds', time.perf_counter() - started, reason='rebuild')
+
+    @property
+    def empty(self):
+        return not self._blocks
+
+    def stats(self):
+        index = self.index
+        return {
+            'blocks': self._blocks,
+            'intervals': len(index) if index else 0,
+            'horizon': datetime.fromtimestamp(index.horizon).isoformat() if index else None,
+            'rebuilt_at': self.rebuilt_at,
+        }
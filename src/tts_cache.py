@@ -0,0 +1,169 @@
+"""
+TTS Cache Module
+Content-addressed, size-bounded disk cache for synthesized audio
+"""
+
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+CACHE_DIR = os.getenv('TTS_CACHE_DIR', 'tts_cache')
+CACHE_MAX_BYTES = int(os.getenv('TTS_CACHE_MAX_BYTES', 500 * 1024 * 1024))
+READ_CHUNK_BYTES = 64 * 1024
+
+
+def cache_key(voice_id, model, text, output_format=None):
+    """Stable key for one utterance rendered by one voice, model and (non-default) format"""
+    material = f"{voice_id}\x00{model}\x00{text}"
+    if output_format:
+        material += f"\x00{output_format}"
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class TTSCache:
+    """
+    Disk-backed audio cache with an in-memory LRU index.
+
+    Files are stored as `<dir>/<key[:2]>/<key>.mp3`. Writes land in a temp file
+    that is renamed into place, so readers never see a partial clip. When the
+    total size exceeds `max_bytes` the least recently used clips are deleted.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.mp3")
+
+    def _load_index(self):
+        """Rebuild the index from disk, oldest access first"""
+        if not os.path.isdir(self.directory):
+            return
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith('.part'):
+                    os.remove(path)
+                    continue
+                if not name.endswith('.mp3'):
+                    continue
+                st = os.stat(path)
+                entries.append((st.st_atime, name[:-4], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._bytes += size
+        self._evict()
+
+    def get(self, key):
+        """Path of the cached clip, or None on a miss"""
+        with self._lock:
+            size = self._index.get(key)
+            if size is None:
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += size
+        return self._path(key)
+
+    def temp_path(self, key):
+        """Fresh temp file path for writing `key`; pass it to commit() when done"""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return f"{path}.{uuid.uuid4().hex}.part"
+
+    def commit(self, key, temp_path):
+        """Atomically move a finished temp file into the cache"""
+        path = self._path(key)
+        size = os.path.getsize(temp_path)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._bytes += size - self._index.get(key, 0)
+            self._index[key] = size
+            self._index.move_to_end(key)
+            self._evict()
+        return path
+
+    def read(self, key):
+        """Yield a cached clip in chunks, or None on a miss"""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            self._forget(key)
+            return None
+        return self._read_file(f)
+
+    def _read_file(self, f):
+        with f:
+            while True:
+                chunk = f.read(READ_CHUNK_BYTES)
+                if not chunk:
+                    return
+                yield chunk
+
+    def copy_to(self, key, output_path):
+        """Materialize a cached clip at output_path (hard link when possible)"""
+        path = self.get(key)
+        if path is None:
+            return False
+        tmp_path = output_path + '.part'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(path, tmp_path)
+        except FileNotFoundError:
+            # Evicted between lookup and link
+            self._forget(key)
+            return False
+        except OSError:
+            # Cross-device or no hard-link support
+            shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, output_path)
+        return True
+
+    def _forget(self, key):
+        with self._lock:
+            size = self._index.pop(key, None)
+            if size is not None:
+                self._bytes -= size
+
+    def _evict(self):
+        # Caller holds the lock (or is still in __init__)
+        while self._bytes > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._index),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+            }
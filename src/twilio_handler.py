@@ -3,18 +3,13 @@ Twilio Handler Module
 Handles incoming calls and SMS from Twilio
 """
 
-# MUST load env variables FIRST
-from dotenv import load_dotenv
-import os
-
-# Load .env from config directory
-dotenv_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config', '.env')
-load_dotenv(dotenv_path)
-
-from twilio.twiml.voice_response import VoiceResponse
+from twilio.twiml.voice_response import VoiceResponse, Connect, Gather
 from twilio.twiml.messaging_response import MessagingResponse
 
+from .metrics import metrics
+
 
+@metrics.timed('twiml')
 def handle_incoming_call(request, ai_response=None, audio_url=None):
     """
     Handle incoming Twilio call
@@ -45,6 +40,63 @@ def handle_incoming_call(request, ai_response=None, audio_url=None):
     return str(response), 200, {'Content-Type': 'application/xml'}
 
 
+@metrics.timed('twiml')
+def handle_conversation_turn(ai_response, audio_url, action_url, end_call=False):
+    """
+    Speak one reply and listen for the caller's next turn
+    
+    Args:
+        ai_response: AI generated response text
+        audio_url: URL to generated audio (optional; falls back to <Say>)
+        action_url: URL Twilio posts the caller's speech to
+        end_call: speak the reply and hang up instead of listening
+        
+    Returns:
+        TwiML response for Twilio
+    """
+    response = VoiceResponse()
+    target = response
+    if not end_call:
+        target = Gather(input='speech', action=action_url, method='POST',
+                        speech_timeout='auto', action_on_empty_result=True)
+    
+    if audio_url:
+        target.play(audio_url)
+    else:
+        target.say(ai_response, voice='Polly.Matthew', language='en-US')
+    
+    if not end_call:
+        response.append(target)
+    # Only reached for end_call, or if Gather finishes without calling the action
+    response.hangup()
+    
+    return str(response), 200, {'Content-Type': 'application/xml'}
+
+
+@metrics.timed('twiml')
+def handle_incoming_stream_call(stream_url, parameters=None):
+    """
+    Connect the call to the real-time media stream server
+    
+    Args:
+        stream_url: wss:// URL of the media stream server
+        parameters: custom parameters passed to the stream's start event
+        
+    Returns:
+        TwiML response for Twilio
+    """
+    response = VoiceResponse()
+    connect = Connect()
+    stream = connect.stream(url=stream_url)
+    for name, value in (parameters or {}).items():
+        if value is not None:
+            stream.parameter(name=name, value=value)
+    response.append(connect)
+    
+    return str(response), 200, {'Content-Type': 'application/xml'}
+
+
+@metrics.timed('twiml')
 def handle_incoming_sms(ai_response_text):
     """
     Generate TwiML response for SMS
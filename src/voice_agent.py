@@ -3,14 +3,77 @@ Voice Agent Module
 Handles AI response generation using OpenAI
 """
 
-from openai import OpenAI
-"""
-Voice Agent Module
-Handles AI response generation using OpenAI
-"""
-
-from openai import OpenAI
+import asyncio
+import itertools
 import os
+import queue
+import re
+import threading
+
+from .audio_stream import AudioStream, AudioStreamRegistry
+from .http_pool import http_pool
+from .metrics import metrics
+from .resilience import Guard
+from .tts_cache import TTSCache, cache_key
+
+TTS_MODEL = "eleven_turbo_v2"  # Low latency model
+FALLBACK_RESPONSE = "I'm sorry, I'm having trouble hearing you. Please leave a message."
+SUMMARY_FALLBACK = "Could not generate summary."
+# Concurrent per-sentence TTS requests across all calls
+TTS_PIPELINE_WORKERS = int(os.getenv('TTS_PIPELINE_WORKERS', 8))
+# Don't send fragments shorter than this to TTS; short ones are merged forward
+MIN_SENTENCE_CHARS = int(os.getenv('MIN_SENTENCE_CHARS', 20))
+# Client-side timeout for OpenAI requests, so calls abandoned at a deadline do not linger
+OPENAI_TIMEOUT_SECONDS = float(os.getenv('OPENAI_TIMEOUT_SECONDS', 30))
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or 'https://api.openai.com/v1'
+ELEVENLABS_BASE_URL = os.getenv('ELEVENLABS_BASE_URL') or 'https://api.elevenlabs.io'
+
+_SENTENCE_END = re.compile(r'[.!?…]+["\')\]]*\s+')
+_ABBREVIATIONS = ('mr.', 'mrs.', 'ms.', 'dr.', 'st.', 'vs.', 'e.g.', 'i.e.', 'etc.')
+
+
+class SentenceSplitter:
+    """Incremental form of split_sentences(): feed() deltas, get back the sentences they complete"""
+
+    def __init__(self, min_chars=MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ''
+
+    def feed(self, delta):
+        self.buffer += delta
+        sentences = []
+        start = 0
+        for match in _SENTENCE_END.finditer(self.buffer):
+            words = self.buffer[start:match.start() + 1].split()
+            if words and words[-1].lower() in _ABBREVIATIONS:
+                continue
+            if match.end() - start >= self.min_chars:
+                sentences.append(self.buffer[start:match.end()].strip())
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ''
+        return [rest] if rest else []
+
+
+def split_sentences(deltas, min_chars=MIN_SENTENCE_CHARS):
+    """Regroup streamed text deltas into sentences as soon as each one ends"""
+    splitter = SentenceSplitter(min_chars)
+    for delta in deltas:
+        yield from splitter.feed(delta)
+    yield from splitter.flush()
+
+
+async def asplit_sentences(deltas, min_chars=MIN_SENTENCE_CHARS):
+    """split_sentences() over an async iterator of deltas"""
+    splitter = SentenceSplitter(min_chars)
+    async for delta in deltas:
+        for sentence in splitter.feed(delta):
+            yield sentence
+    for sentence in splitter.flush():
+        yield sentence
 
 
 class VoiceAgent:
@@ -25,20 +88,81 @@ class VoiceAgent:
         if not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY not found in .env")
             
-        self.client = OpenAI(api_key=self.openai_api_key)
+        # SDK clients are made on first use: importing the SDKs dominates
+        # start-up, and their connection pools must not be shared across a fork
+        self._client = None
+        self._elevenlabs = None
+        # Circuit breakers (and optional hedging) per provider
+        self.llm_guard = Guard('openai')
+        self.tts_guard = Guard('elevenlabs')
         
-        # Initialize ElevenLabs if key is present
-        if self.elevenlabs_api_key:
-            from elevenlabs.client import ElevenLabs
-            self.elevenlabs = ElevenLabs(api_key=self.elevenlabs_api_key)
-        else:
-            self.elevenlabs = None
+        # TTS_BACKEND=fake swaps ElevenLabs for an offline stand-in (latency testing)
+        self.fake_tts = None
+        if os.getenv('TTS_BACKEND', 'elevenlabs') == 'fake':
+            from .fake_tts import FakeTTS
+            self.fake_tts = FakeTTS()
+        elif not self.elevenlabs_api_key:
             print("Warning: ELEVENLABS_API_KEY not found. Voice cloning will be disabled.")
 
-    def generate_response(self, caller_name="Friend", caller_relationship="unknown", 
-                         caller_tone="neutral", status="Busy", conversation_history=None):
-        """Generate AI response based on caller info and history"""
-        
+        # Both SDKs share one keep-alive pool, kept warm by the worker (see init_worker)
+        http_pool.register('openai', OPENAI_BASE_URL)
+        if self.elevenlabs_api_key and not self.fake_tts:
+            http_pool.register('elevenlabs', ELEVENLABS_BASE_URL)
+
+        self.tts_cache = TTSCache()
+        self._speech_pipeline = AudioStreamRegistry(workers=TTS_PIPELINE_WORKERS)
+        # Non-blocking clients for the async serving mode (src/asgi.py), made on first use
+        self._async_client = None
+        self._async_elevenlabs = None
+        self._async_tts_slots = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.openai_api_key, base_url=OPENAI_BASE_URL,
+                                  timeout=http_pool.timeout(OPENAI_TIMEOUT_SECONDS),
+                                  http_client=http_pool.client())
+        return self._client
+
+    @property
+    def elevenlabs(self):
+        """ElevenLabs client, or None when TTS is faked or no key is set"""
+        if self._elevenlabs is None and self.elevenlabs_api_key and not self.fake_tts:
+            from elevenlabs.client import ElevenLabs
+            self._elevenlabs = ElevenLabs(
+                api_key=self.elevenlabs_api_key,
+                base_url=ELEVENLABS_BASE_URL,
+                httpx_client=http_pool.client()
+            )
+        return self._elevenlabs
+
+    @property
+    def tts_voice(self):
+        """Identity of the rendered voice, used to key the audio cache"""
+        return 'fake' if self.fake_tts else self.voice_id
+
+    @property
+    def can_speak(self):
+        """True when a TTS backend is configured"""
+        return bool(self.fake_tts or (self.elevenlabs_api_key and self.voice_id))
+
+    @property
+    def can_speak_now(self):
+        """True when a TTS backend is configured and its circuit is not open"""
+        return self.can_speak and (self.fake_tts is not None or self.tts_guard.available)
+
+    def warm_fallback(self):
+        """Render the fallback message into the audio cache so it can be spoken instantly"""
+        if not self.can_speak:
+            return
+        try:
+            for _ in self.stream_speech(FALLBACK_RESPONSE):
+                pass
+        except Exception as e:
+            print(f"Error pre-rendering fallback message: {e}")
+
+    def _build_messages(self, caller_name, caller_relationship, caller_tone, status, conversation_history):
         system_prompt = f"""
 You are Moses's personal AI voice assistant. You sound EXACTLY like him.
 Your goal is to handle the call efficiently but warmly, using his mannerisms.
@@ -59,41 +183,236 @@ Instructions:
         
         if conversation_history:
             messages.extend(conversation_history)
+        return messages
+
+    @metrics.timed('generate_response')
+    def generate_response(self, caller_name="Friend", caller_relationship="unknown", 
+                         caller_tone="neutral", status="Busy", conversation_history=None, deadline=None,
+                         guard=None):
+        """
+        Generate AI response based on caller info and history.
+
+        Returns FALLBACK_RESPONSE if OpenAI fails, its circuit is open, or no
+        answer arrives before `deadline` (a resilience.Deadline). `guard`
+        replaces llm_guard, so background work can use its own breaker.
+        """
+        messages = self._build_messages(caller_name, caller_relationship, caller_tone, status, conversation_history)
+        
+        def create():
+            with metrics.dependency('openai', 'chat'):
+                return self.client.chat.completions.create(
+                    model="gpt-4o", # Faster model
+                    messages=messages,
+                    max_tokens=150,
+                    temperature=0.7
+                )
             
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o", # Faster model
-                messages=messages,
-                max_tokens=150,
-                temperature=0.7
-            )
+            response = (guard or self.llm_guard).call(create, deadline)
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error generating text response: {e}")
-            return "I'm sorry, I'm having trouble hearing you. Please leave a message."
+            return FALLBACK_RESPONSE
+
+    def stream_response(self, caller_name="Friend", caller_relationship="unknown",
+                        caller_tone="neutral", status="Busy", conversation_history=None, deadline=None):
+        """Yield response text deltas as the model produces them"""
+        messages = self._build_messages(caller_name, caller_relationship, caller_tone, status, conversation_history)
+        self.llm_guard.admit()
+        # Timed to the first event: that is the latency a caller waits on
+        try:
+            with metrics.dependency('openai', 'chat_stream'):
+                stream = iter(self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages,
+                    max_tokens=150,
+                    temperature=0.7,
+                    stream=True
+                ))
+                first = next(stream, None)
+        except Exception:
+            self.llm_guard.failed()
+            raise
+        self.llm_guard.finished(deadline)
+        if first is None:
+            return
+        for event in itertools.chain([first], stream):
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+    def stream_spoken_response(self, on_text=None, deadline=None, **prompt):
+        """
+        Yield mp3 audio for a response while the response is still being written.
+
+        The completion is streamed and cut into sentences; each sentence is
+        sent to TTS as soon as it is complete, so synthesis of one sentence
+        overlaps generation of the next. Audio is yielded strictly in sentence
+        order. `on_text(full_text)` is called once the completion has ended.
+        If the model fails before producing any text, the fallback message is
+        spoken instead; so it is when `deadline` passes before the first audio
+        is ready, in which case the rest of the completion is dropped.
+        """
+        segments = queue.Queue()
+        reported = threading.Lock()
+
+        def finish(text):
+            # Exactly one of the producer and the deadline gets to report the text
+            if not reported.acquire(blocking=False):
+                return False
+            if on_text:
+                on_text(text)
+            return True
+
+        def produce():
+            spoken = []
+            try:
+                for sentence in split_sentences(self.stream_response(deadline=deadline, **prompt)):
+                    if reported.locked():
+                        return
+                    spoken.append(sentence)
+                    # Only the first sentence is on the clock; later ones play while it is heard
+                    segment = self._speak_segment(sentence, deadline if len(spoken) == 1 else None)
+                    segments.put(self._speech_pipeline.run(metrics.carry(segment)))
+            except Exception as e:
+                print(f"Error streaming text response: {e}")
+                if not spoken:
+                    spoken.append(FALLBACK_RESPONSE)
+                    segments.put(self._speech_pipeline.run(metrics.carry(self._speak_segment(FALLBACK_RESPONSE))))
+            finally:
+                segments.put(None)
+                finish(' '.join(spoken))
+
+        threading.Thread(target=metrics.carry(produce), name='llm-stream', daemon=True).start()
+
+        started = deadline is None
+        while True:
+            segment = None
+            try:
+                if started:
+                    segment = segments.get()
+                else:
+                    segment = segments.get(timeout=deadline.remaining())
+                    if segment is not None and not segment.wait_started(deadline.remaining()):
+                        raise queue.Empty
+            except queue.Empty:
+                if finish(FALLBACK_RESPONSE):
+                    print("No audio before the deadline; speaking the fallback message")
+                    metrics.inc('fallbacks_total', stage='static')
+                    yield from self.stream_speech(FALLBACK_RESPONSE)
+                    return
+                # The completion ended just in time; play what it produced
+                if segment is None:
+                    segment = segments.get()
+            started = True
+            if segment is None:
+                return
+            yield from segment.iter_chunks()
+
+    def _speak_segment(self, text, deadline=None):
+        def produce(stream):
+            for chunk in self.stream_speech(text, deadline=deadline):
+                stream.write(chunk)
+        return produce
+
+    def stream_speech(self, text, output_format=None, deadline=None):
+        """
+        Yield audio chunks for `text`, from the audio cache when this exact
+        utterance was rendered before, otherwise from ElevenLabs while
+        filling the cache. Defaults to mp3; pass an ElevenLabs output_format
+        such as 'ulaw_8000' for telephony streams.
+        """
+        key = cache_key(self.tts_voice, TTS_MODEL, text, output_format)
+        cached = self.tts_cache.read(key)
+        if cached is not None:
+            yield from cached
+        else:
+            yield from self._render_to_cache(key, text, output_format, deadline)
+
+    def _render_to_cache(self, key, text, output_format=None, deadline=None, guard=None):
+        """Synthesize `text`, teeing the chunks into the audio cache"""
+        tmp_path = self.tts_cache.temp_path(key)
+        complete = False
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in self._synthesize(text, output_format, deadline, guard):
+                    f.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                self.tts_cache.commit(key, tmp_path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
 
-    def text_to_speech(self, text, output_path):
-        """Convert text to speech using ElevenLabs"""
-        if not self.elevenlabs or not self.voice_id:
+    def _synthesize(self, text, output_format=None, deadline=None, guard=None):
+        """Yield audio chunks as ElevenLabs synthesizes them"""
+        if self.fake_tts:
+            yield from self.fake_tts.stream(text, output_format)
+            return
+
+        options = {'output_format': output_format} if output_format else {}
+        guard = guard or self.tts_guard
+        guard.admit()
+        try:
+            audio = self._open_tts_stream(text, options)
+        except Exception:
+            guard.failed()
+            raise
+        guard.finished(deadline)
+
+        for chunk in audio:
+            if chunk:
+                yield chunk
+
+    def _open_tts_stream(self, text, options):
+        """Start an ElevenLabs stream and wait for its first chunk"""
+        with metrics.dependency('elevenlabs', 'tts_stream'):
+            if hasattr(self.elevenlabs, 'text_to_speech'):
+                audio = self.elevenlabs.text_to_speech.stream(
+                    voice_id=self.voice_id,
+                    text=text,
+                    model_id=TTS_MODEL,
+                    **options
+                )
+            else:
+                # Pre-1.0 SDK
+                audio = self.elevenlabs.generate(
+                    text=text,
+                    voice=self.voice_id,
+                    model=TTS_MODEL,
+                    stream=True,
+                    **options
+                )
+            # Timed to the first chunk, like the chat stream
+            audio = iter(audio)
+            first = next(audio, None)
+        return itertools.chain([first], audio)
+
+    @metrics.timed('text_to_speech')
+    def text_to_speech(self, text, output_path, guard=None):
+        """Convert text to speech using ElevenLabs (behind `guard` instead of tts_guard if given)"""
+        if not self.can_speak:
             return False
             
         try:
-            from elevenlabs import save
-            audio = self.elevenlabs.generate(
-                text=text,
-                voice=self.voice_id,
-                model="eleven_turbo_v2" # Low latency model
-            )
+            key = cache_key(self.tts_voice, TTS_MODEL, text)
+            if self.tts_cache.copy_to(key, output_path):
+                return True
             
-            # Save audio to file
-            save(audio, output_path)
+            # Write to a temp file first so a failed render never leaves a partial clip
+            tmp_path = output_path + '.part'
+            with open(tmp_path, 'wb') as f:
+                for chunk in self._render_to_cache(key, text, guard=guard):
+                    f.write(chunk)
+            os.replace(tmp_path, output_path)
             return True
         except Exception as e:
             print(f"Error generating audio: {e}")
+            if os.path.exists(output_path + '.part'):
+                os.remove(output_path + '.part')
             return False
 
-    def generate_summary(self, conversation_text):
-        """Generate a summary of the call for Moses"""
+    def _summary_messages(self, conversation_text):
         prompt = f"""
 Summarize this call for Moses as if you are his personal secretary giving a quick voice note.
 Focus on: Who called, what they wanted, and any action items.
@@ -102,13 +421,263 @@ Keep it under 30 seconds spoken.
 Call Transcript:
 {conversation_text}
 """
+        return [{"role": "user", "content": prompt}]
+
+    @metrics.timed('generate_summary')
+    def generate_summary(self, conversation_text):
+        """Generate a summary of the call for Moses"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=100
+            with metrics.dependency('openai', 'summary'):
+                response = self.client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=self._summary_messages(conversation_text),
+                    max_tokens=100
+                )
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Error generating summary: {e}")
+            return SUMMARY_FALLBACK
+
+    # -- async serving mode --------------------------------------------------
+    # Counterparts of the methods above for code on an event loop (src/asgi.py).
+    # They use AsyncOpenAI / AsyncElevenLabs, so a call waiting on a provider
+    # holds no thread; caching, breakers and fallbacks behave the same.
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            self._async_client = AsyncOpenAI(api_key=self.openai_api_key, base_url=OPENAI_BASE_URL,
+                                             timeout=http_pool.timeout(OPENAI_TIMEOUT_SECONDS),
+                                             http_client=http_pool.async_client())
+        return self._async_client
+
+    def _async_elevenlabs_client(self):
+        """AsyncElevenLabs client, or None with a pre-1.0 SDK"""
+        if self._async_elevenlabs is None and hasattr(self.elevenlabs, 'text_to_speech'):
+            from elevenlabs.client import AsyncElevenLabs
+            self._async_elevenlabs = AsyncElevenLabs(
+                api_key=self.elevenlabs_api_key,
+                base_url=ELEVENLABS_BASE_URL,
+                httpx_client=http_pool.async_client()
             )
+        return self._async_elevenlabs
+
+    @metrics.timed('generate_response')
+    async def agenerate_response(self, caller_name="Friend", caller_relationship="unknown",
+                                 caller_tone="neutral", status="Busy", conversation_history=None, deadline=None):
+        """generate_response() for the event loop; a hedge that loses is cancelled"""
+        messages = self._build_messages(caller_name, caller_relationship, caller_tone, status, conversation_history)
+
+        async def create():
+            with metrics.dependency('openai', 'chat'):
+                return await self.async_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages,
+                    max_tokens=150,
+                    temperature=0.7
+                )
+
+        try:
+            response = await self.llm_guard.acall(create, deadline)
+            return response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Error generating text response: {e}")
+            return FALLBACK_RESPONSE
+
+    async def astream_response(self, caller_name="Friend", caller_relationship="unknown",
+                               caller_tone="neutral", status="Busy", conversation_history=None, deadline=None):
+        """stream_response() as an async iterator"""
+        messages = self._build_messages(caller_name, caller_relationship, caller_tone, status, conversation_history)
+        self.llm_guard.admit()
+        try:
+            with metrics.dependency('openai', 'chat_stream'):
+                events = aiter(await self.async_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=messages,
+                    max_tokens=150,
+                    temperature=0.7,
+                    stream=True
+                ))
+                first = await anext(events, None)
+        except (Exception, asyncio.CancelledError):
+            # Cancelled here means abandoned at the deadline: a miss like any other
+            self.llm_guard.failed()
+            raise
+        self.llm_guard.finished(deadline)
+        if first is None:
+            return
+        if first.choices and first.choices[0].delta.content:
+            yield first.choices[0].delta.content
+        async for event in events:
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+    async def astream_spoken_response(self, on_text=None, deadline=None, **prompt):
+        """
+        stream_spoken_response() as an async iterator. Sentences are
+        synthesized by tasks (at most TTS_PIPELINE_WORKERS at once across
+        calls) instead of pool threads, `on_text` is a coroutine function,
+        and when the deadline passes the completion is cancelled rather than
+        left running.
+        """
+        if self._async_tts_slots is None:
+            self._async_tts_slots = asyncio.Semaphore(TTS_PIPELINE_WORKERS)
+        segments = asyncio.Queue()
+        reported = []
+
+        async def finish(text):
+            if reported:
+                return False
+            reported.append(text)
+            if on_text:
+                await on_text(text)
+            return True
+
+        def speak(sentence, segment_deadline=None):
+            async def render(stream):
+                async with self._async_tts_slots:
+                    async for chunk in self.astream_speech(sentence, deadline=segment_deadline):
+                        stream.write(chunk)
+            segments.put_nowait(self._speech_pipeline.run_task(render))
+
+        async def produce():
+            spoken = []
+            try:
+                async for sentence in asplit_sentences(self.astream_response(deadline=deadline, **prompt)):
+                    spoken.append(sentence)
+                    # Only the first sentence is on the clock; later ones play while it is heard
+                    speak(sentence, deadline if len(spoken) == 1 else None)
+            except Exception as e:
+                print(f"Error streaming text response: {e}")
+                if not spoken:
+                    spoken.append(FALLBACK_RESPONSE)
+                    speak(FALLBACK_RESPONSE)
+            finally:
+                segments.put_nowait(None)
+                await finish(' '.join(spoken))
+
+        producer = asyncio.create_task(produce())
+
+        started = deadline is None
+        while True:
+            segment = None
+            try:
+                if started:
+                    segment = await segments.get()
+                else:
+                    segment = await asyncio.wait_for(segments.get(), deadline.remaining())
+                    if segment is not None and not await segment.await_started(deadline.remaining()):
+                        raise asyncio.TimeoutError
+            except asyncio.TimeoutError:
+                if await finish(FALLBACK_RESPONSE):
+                    print("No audio before the deadline; speaking the fallback message")
+                    metrics.inc('fallbacks_total', stage='static')
+                    producer.cancel()
+                    async for chunk in self.astream_speech(FALLBACK_RESPONSE):
+                        yield chunk
+                    return
+                # The completion ended just in time; play what it produced
+                if segment is None:
+                    segment = await segments.get()
+            started = True
+            if segment is None:
+                return
+            async for chunk in segment.aiter_chunks():
+                yield chunk
+
+    async def astream_speech(self, text, output_format=None, deadline=None):
+        """stream_speech() as an async iterator"""
+        key = cache_key(self.tts_voice, TTS_MODEL, text, output_format)
+        cached = self.tts_cache.read(key)
+        if cached is not None:
+            for chunk in cached:
+                yield chunk
+            return
+
+        tmp_path = self.tts_cache.temp_path(key)
+        complete = False
+        try:
+            with open(tmp_path, 'wb') as f:
+                async for chunk in self._asynthesize(text, output_format, deadline):
+                    f.write(chunk)
+                    yield chunk
+            complete = True
+        finally:
+            if complete:
+                self.tts_cache.commit(key, tmp_path)
+            elif os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def _asynthesize(self, text, output_format=None, deadline=None):
+        if self.fake_tts:
+            async for chunk in self.fake_tts.astream(text, output_format):
+                yield chunk
+            return
+
+        client = self._async_elevenlabs_client()
+        if client is None:
+            # Pre-1.0 SDK: no async client, render on a thread instead
+            for chunk in await asyncio.to_thread(lambda: list(self._synthesize(text, output_format, deadline))):
+                yield chunk
+            return
+
+        options = {'output_format': output_format} if output_format else {}
+        self.tts_guard.admit()
+        try:
+            with metrics.dependency('elevenlabs', 'tts_stream'):
+                audio = aiter(client.text_to_speech.stream(
+                    voice_id=self.voice_id,
+                    text=text,
+                    model_id=TTS_MODEL,
+                    **options
+                ))
+                first = await anext(audio, None)
+        except Exception:
+            self.tts_guard.failed()
+            raise
+        self.tts_guard.finished(deadline)
+
+        if first:
+            yield first
+        async for chunk in audio:
+            if chunk:
+                yield chunk
+
+    @metrics.timed('text_to_speech')
+    async def atext_to_speech(self, text, output_path):
+        """text_to_speech() for the event loop"""
+        if not self.can_speak:
+            return False
+
+        try:
+            key = cache_key(self.tts_voice, TTS_MODEL, text)
+            if self.tts_cache.copy_to(key, output_path):
+                return True
+
+            tmp_path = output_path + '.part'
+            with open(tmp_path, 'wb') as f:
+                async for chunk in self.astream_speech(text):
+                    f.write(chunk)
+            os.replace(tmp_path, output_path)
+            return True
+        except Exception as e:
+            print(f"Error generating audio: {e}")
+            if os.path.exists(output_path + '.part'):
+                os.remove(output_path + '.part')
+            return False
+
+    @metrics.timed('generate_summary')
+    async def agenerate_summary(self, conversation_text):
+        """generate_summary() for the event loop"""
+        try:
+            with metrics.dependency('openai', 'summary'):
+                response = await self.async_client.chat.completions.create(
+                    model="gpt-4o",
+                    messages=self._summary_messages(conversation_text),
+                    max_tokens=100
+                )
             return response.choices[0].message.content.strip()
         except Exception as e:
             print(f"Error generating summary: {e}")
-            return "Could not generate summary."
\ No newline at end of file
+            return SUMMARY_FALLBACK